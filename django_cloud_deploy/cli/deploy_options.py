@@ -0,0 +1,244 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Command line options about how the Django app is run once deployed."""
+
+import argparse
+from typing import List, Optional
+
+from django_cloud_deploy.skeleton import source_generator
+
+
+def add_scaling_arguments(parser: argparse.ArgumentParser):
+    """Add the arguments controlling resources and autoscaling."""
+
+    parser.add_argument(
+        '--min-replicas',
+        dest='min_replicas',
+        type=int,
+        help='The minimum number of pods running the app on GKE.')
+
+    parser.add_argument(
+        '--max-replicas',
+        dest='max_replicas',
+        type=int,
+        help='The maximum number of pods running the app on GKE.')
+
+    parser.add_argument(
+        '--target-cpu-utilization',
+        dest='target_cpu_utilization',
+        type=int,
+        help=('The average CPU utilization of the pods, in percent of their '
+              'CPU request, the autoscaler aims for.'))
+
+    parser.add_argument('--cpu-request',
+                        dest='cpu_request',
+                        help='CPU reserved for each pod, e.g. "250m".')
+
+    parser.add_argument('--memory-request',
+                        dest='memory_request',
+                        help='Memory reserved for each pod, e.g. "256Mi".')
+
+    parser.add_argument('--cpu-limit',
+                        dest='cpu_limit',
+                        help='The maximum CPU each pod can use, e.g. "1".')
+
+    parser.add_argument(
+        '--memory-limit',
+        dest='memory_limit',
+        help='The maximum memory each pod can use, e.g. "512Mi".')
+
+    parser.add_argument(
+        '--appengine-instance-class',
+        dest='instance_class',
+        choices=source_generator.ScalingOptions.INSTANCE_CLASSES,
+        help=('The instance class running the app on App Engine. By default '
+              'the number of gunicorn workers is the one App Engine '
+              'recommends for it.'))
+
+
+# Command line flags of the settings of source_generator.ScalingOptions.
+_SCALING_FLAGS = {
+    'min_replicas': '--min-replicas',
+    'max_replicas': '--max-replicas',
+    'target_cpu_utilization': '--target-cpu-utilization',
+    'cpu_request': '--cpu-request',
+    'memory_request': '--memory-request',
+    'cpu_limit': '--cpu-limit',
+    'memory_limit': '--memory-limit',
+    'instance_class': '--appengine-instance-class',
+}
+
+
+def get_unsupported_scaling_flags(
+        scaling_options: source_generator.ScalingOptions,
+        backend: str) -> List[str]:
+    """Get the scaling flags given which do not apply to a backend.
+
+    Args:
+        scaling_options: The scaling options given on the command line.
+        backend: Where the app is deployed, "gke" or "gae".
+
+    Returns:
+        The flags of the options which are about the other backend.
+    """
+    return [
+        _SCALING_FLAGS[name]
+        for name in scaling_options.get_unsupported_settings(backend)
+    ]
+
+
+def get_scaling_options(args: argparse.Namespace
+                       ) -> Optional[source_generator.ScalingOptions]:
+    """Get the scaling options given on the command line.
+
+    Args:
+        args: The parsed command line arguments.
+
+    Returns:
+        The scaling options, or None if none of them was given.
+    """
+    values = {
+        name: getattr(args, name, None)
+        for name in source_generator.ScalingOptions.DEFAULTS
+    }
+    if all(value is None for value in values.values()):
+        return None
+    return source_generator.ScalingOptions(**values)
+
+
+def add_gunicorn_arguments(parser: argparse.ArgumentParser):
+    """Add the arguments controlling the gunicorn server of the app."""
+
+    parser.add_argument(
+        '--gunicorn-workers',
+        dest='gunicorn_workers',
+        type=int,
+        help=('The number of gunicorn worker processes. By default it is '
+              'sized from the CPU available to the app.'))
+
+    parser.add_argument(
+        '--gunicorn-threads',
+        dest='gunicorn_threads',
+        type=int,
+        help='The number of threads of each gthread gunicorn worker.')
+
+    parser.add_argument(
+        '--gunicorn-worker-class',
+        dest='gunicorn_worker_class',
+        choices=source_generator.GunicornOptions.WORKER_CLASSES,
+        help=('The type of gunicorn workers. "gevent" requires gevent to be '
+              'in the requirements of the project.'))
+
+    parser.add_argument(
+        '--gunicorn-keepalive',
+        dest='gunicorn_keepalive',
+        type=int,
+        help='Seconds gunicorn keeps idle connections open.')
+
+    parser.add_argument(
+        '--gunicorn-max-requests',
+        dest='gunicorn_max_requests',
+        type=int,
+        help=('The number of requests a gunicorn worker serves before it is '
+              'restarted. 0 disables restarts.'))
+
+    parser.add_argument(
+        '--gunicorn-max-requests-jitter',
+        dest='gunicorn_max_requests_jitter',
+        type=int,
+        help=('The maximum random number of requests added to '
+              '--gunicorn-max-requests of each worker.'))
+
+    parser.add_argument(
+        '--gunicorn-preload-app',
+        dest='gunicorn_preload_app',
+        action='store_true',
+        default=None,
+        help='Load the app before forking gunicorn workers. The default.')
+
+    parser.add_argument('--no-gunicorn-preload-app',
+                        dest='gunicorn_preload_app',
+                        action='store_false',
+                        default=None,
+                        help='Load the app in each gunicorn worker.')
+
+
+def get_gunicorn_options(args: argparse.Namespace
+                        ) -> Optional[source_generator.GunicornOptions]:
+    """Get the gunicorn options given on the command line.
+
+    Args:
+        args: The parsed command line arguments.
+
+    Returns:
+        The gunicorn options, or None if none of them was given.
+    """
+    names = ('workers', 'threads', 'worker_class', 'keepalive', 'max_requests',
+             'max_requests_jitter', 'preload_app')
+    values = {name: getattr(args, 'gunicorn_' + name, None) for name in names}
+    if all(value is None for value in values.values()):
+        return None
+    return source_generator.GunicornOptions(**values)
+
+
+def add_pgbouncer_arguments(parser: argparse.ArgumentParser):
+    """Add the arguments controlling the PgBouncer sidecar on GKE."""
+
+    parser.add_argument(
+        '--pgbouncer',
+        dest='pgbouncer',
+        action='store_true',
+        help=('Pool the database connections of each pod with a PgBouncer '
+              'sidecar when deploying on GKE.'))
+
+    parser.add_argument(
+        '--pgbouncer-pool-size',
+        dest='pgbouncer_pool_size',
+        type=int,
+        help=('The number of database connections PgBouncer opens for each '
+              'pod. Implies --pgbouncer.'))
+
+    parser.add_argument(
+        '--pgbouncer-max-client-connections',
+        dest='pgbouncer_max_client_connections',
+        type=int,
+        help=('The maximum number of connections the app in each pod can '
+              'open to PgBouncer. Implies --pgbouncer.'))
+
+    parser.add_argument(
+        '--conn-max-age',
+        dest='conn_max_age',
+        type=int,
+        help=('The number of seconds the app keeps a database connection '
+              'open to reuse it. 0 closes connections after each request.'))
+
+
+def get_pgbouncer_options(args: argparse.Namespace
+                         ) -> Optional[source_generator.PgBouncerOptions]:
+    """Get the PgBouncer options given on the command line.
+
+    Args:
+        args: The parsed command line arguments.
+
+    Returns:
+        The PgBouncer options, or None if PgBouncer should not be used.
+    """
+    values = {
+        name: getattr(args, 'pgbouncer_' + name, None)
+        for name in source_generator.PgBouncerOptions.DEFAULTS
+    }
+    if (not getattr(args, 'pgbouncer', False) and
+            all(value is None for value in values.values())):
+        return None
+    return source_generator.PgBouncerOptions(**values)
@@ -220,6 +220,41 @@ class ConsoleIO(IO):
             progress_bar.finish()
 
 
+class LineWriter(object):
+    """A file-like object passing each line written to it to IO.tell.
+
+    This is useful to show the output of code which writes to a file, for
+    example Django management commands, on the console.
+    """
+
+    def __init__(self, console_io: IO, prefix: str = ''):
+        """Constructor of the class.
+
+        Args:
+            console_io: Where to show the lines.
+            prefix: A string added at the start of each line.
+        """
+        self._console_io = console_io
+        self._prefix = prefix
+        self._buffer = ''
+
+    def write(self, s: str):
+        self._buffer += s
+        *lines, self._buffer = self._buffer.split('\n')
+        for line in lines:
+            if line.strip():
+                self._console_io.tell(self._prefix + line)
+
+    def flush(self):
+        """Lines are shown as soon as they are complete, nothing to flush."""
+
+    def close(self):
+        """Show the last line even if it does not end with a newline."""
+        if self._buffer.strip():
+            self._console_io.tell(self._prefix + self._buffer)
+        self._buffer = ''
+
+
 class TestIO(IO):
 
     def __init__(self):
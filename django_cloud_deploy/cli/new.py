@@ -17,6 +17,7 @@ import argparse
 
 from django_cloud_deploy import tool_requirements
 from django_cloud_deploy import workflow
+from django_cloud_deploy.cli import deploy_options
 from django_cloud_deploy.cli import io
 from django_cloud_deploy.cli import prompt
 from django_cloud_deploy.utils import survey
@@ -119,6 +120,10 @@ def add_arguments(parser):
         nargs='+',
         help=('App engine service name. Test only, do not use.'))
 
+    deploy_options.add_scaling_arguments(parser)
+    deploy_options.add_gunicorn_arguments(parser)
+    deploy_options.add_pgbouncer_arguments(parser)
+
 
 def main(args: argparse.Namespace, console: io.IO = io.ConsoleIO()):
     if not tool_requirements.check_and_handle_requirements(
@@ -158,7 +163,11 @@ def main(args: argparse.Namespace, console: io.IO = io.ConsoleIO()):
             required_service_accounts=actual_parameters['service_accounts'],
             appengine_service_name=actual_parameters['appengine_service_name'],
             cloud_storage_bucket_name=actual_parameters['bucket_name'],
-            backend=args.backend)
+            backend=args.backend,
+            scaling_options=deploy_options.get_scaling_options(args),
+            gunicorn_options=deploy_options.get_gunicorn_options(args),
+            pgbouncer_options=deploy_options.get_pgbouncer_options(args),
+            conn_max_age=getattr(args, 'conn_max_age', None))
     except workflow.ProjectExistsError:
         console.error('A project with id "{}" already exists'.format(
             actual_parameters['project_id']))
@@ -17,6 +17,7 @@ import argparse
 
 from django_cloud_deploy import config
 from django_cloud_deploy import tool_requirements
+from django_cloud_deploy.cli import deploy_options
 from django_cloud_deploy.cli import io
 from django_cloud_deploy.cli import prompt
 import django_cloud_deploy.workflow as workflow
@@ -63,6 +64,8 @@ def add_arguments(parser):
         help=('Name of the Cloud SQL instance used for deployment. Test only, '
               'do not use.'))
 
+    deploy_options.add_scaling_arguments(parser)
+
 
 def main(args: argparse.Namespace, console: io.IO = io.ConsoleIO()):
 
@@ -87,6 +90,16 @@ def main(args: argparse.Namespace, console: io.IO = io.ConsoleIO()):
             'Configuration file in [{}] does not contain enough '
             'information to update a Django project.'.format(django_dir))
 
+    scaling_options = deploy_options.get_scaling_options(args)
+    if scaling_options:
+        unsupported_flags = deploy_options.get_unsupported_scaling_flags(
+            scaling_options, backend)
+        if unsupported_flags:
+            console.error('{} can not be used with apps deployed on {}.'.format(
+                ', '.join(unsupported_flags),
+                'App Engine' if backend == 'gae' else 'GKE'))
+            return
+
     if not tool_requirements.check_and_handle_requirements(console, backend):
         return
 
@@ -96,7 +109,8 @@ def main(args: argparse.Namespace, console: io.IO = io.ConsoleIO()):
         django_directory_path=actual_parameters['django_directory_path_update'],
         database_password=actual_parameters['database_password'],
         cluster_name=actual_parameters['cluster_name'],
-        database_instance_name=actual_parameters['database_instance_name'])
+        database_instance_name=actual_parameters['database_instance_name'],
+        scaling_options=scaling_options)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,198 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Build discovery based clients of Google Cloud Platform APIs.
+
+Building a client needs the discovery document of its API. Fetching a dozen
+of them over the network on every run is slow, so they are cached on disk for
+a day. All clients built with the same credentials also share one authorized
+transport, which keeps its connections open between requests.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Optional
+import weakref
+
+from googleapiclient import discovery
+from googleapiclient import http as googleapiclient_http
+from googleapiclient.discovery_cache import base
+from google.auth import credentials
+import google_auth_httplib2
+
+
+class DiscoveryCache(base.Cache):
+    """Caches discovery documents in files, keyed by their url."""
+
+    # Discovery documents rarely change, so caching them for a day is safe.
+    DEFAULT_TTL = 24 * 60 * 60
+
+    def __init__(self,
+                 directory: Optional[str] = None,
+                 ttl: float = DEFAULT_TTL):
+        """Constructor of the class.
+
+        Args:
+            directory: Where to store the documents. By default it is
+                "django-cloud-deploy/discovery" in the user cache directory,
+                looked up when the cache is first used.
+            ttl: Seconds a cached document is used before it is fetched again.
+        """
+        self._directory = directory
+        self._ttl = ttl
+
+    @property
+    def directory(self) -> str:
+        """The directory storing the documents."""
+        if not self._directory:
+            cache_home = (os.environ.get('XDG_CACHE_HOME') or
+                          os.path.join(os.path.expanduser('~'), '.cache'))
+            self._directory = os.path.join(cache_home, 'django-cloud-deploy',
+                                           'discovery')
+        return self._directory
+
+    def _get_path(self, url: str) -> str:
+        file_name = hashlib.sha256(url.encode('utf-8')).hexdigest() + '.json'
+        return os.path.join(self.directory, file_name)
+
+    def get(self, url: str) -> Optional[str]:
+        """Get the cached document of the url, or None if it is not fresh."""
+        path = self._get_path(url)
+        try:
+            if time.time() - os.path.getmtime(path) > self._ttl:
+                return None
+            with open(path, encoding='utf-8') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def set(self, url: str, content: Any):
+        """Cache the document of the url.
+
+        Failing to write the cache is not an error, the document is fetched
+        again next time.
+        """
+        if isinstance(content, bytes):
+            content = content.decode('utf-8')
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            # Write to a temporary file first so that concurrent runs never
+            # read a partially written document.
+            fd, temp_path = tempfile.mkstemp(dir=self.directory)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(temp_path, self._get_path(url))
+        except OSError:
+            pass
+
+
+class ThreadLocalAuthorizedHttp(object):
+    """An authorized http object which can be shared between threads.
+
+    httplib2 is not thread-safe, so each thread gets its own authorized
+    httplib2 object the first time it makes a request, and reuses it and its
+    open connections afterwards.
+    """
+
+    def __init__(self,
+                 credentials: credentials.Credentials,
+                 user_agent: Optional[str] = None):
+        """Constructor of the class.
+
+        Args:
+            credentials: The credentials used to authorize requests.
+            user_agent: The user agent to send with requests. By default the
+                one of httplib2 is sent.
+        """
+        self._credentials = credentials
+        self._user_agent = user_agent
+        self._thread_local = threading.local()
+
+    def _get_http(self) -> google_auth_httplib2.AuthorizedHttp:
+        http = getattr(self._thread_local, 'http', None)
+        if http is None:
+            # build_http sets the default timeout and redirect handling the
+            # discovery clients expect.
+            http = google_auth_httplib2.AuthorizedHttp(
+                self._credentials, http=googleapiclient_http.build_http())
+            if self._user_agent:
+                http = googleapiclient_http.set_user_agent(
+                    http, self._user_agent)
+            self._thread_local.http = http
+        return http
+
+    def request(self, *args, **kwargs):
+        return self._get_http().request(*args, **kwargs)
+
+    def __getattr__(self, name: str) -> Any:
+        # Other attributes, like timeout, are the ones of the http object of
+        # the current thread.
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self._get_http(), name)
+
+
+_discovery_cache = DiscoveryCache()
+_shared_http = weakref.WeakKeyDictionary()
+_shared_http_lock = threading.Lock()
+
+
+def get_http(credentials: credentials.Credentials,
+             user_agent: Optional[str] = None) -> ThreadLocalAuthorizedHttp:
+    """Get the authorized http object shared by clients of the credentials.
+
+    Args:
+        credentials: The credentials used to authorize requests.
+        user_agent: The user agent to send with requests. Clients with
+            different user agents do not share http objects.
+
+    Returns:
+        The http object shared by all clients with the same credentials and
+        user agent.
+    """
+    with _shared_http_lock:
+        http_by_user_agent = _shared_http.setdefault(credentials, {})
+        http = http_by_user_agent.get(user_agent)
+        if http is None:
+            http = ThreadLocalAuthorizedHttp(credentials, user_agent)
+            http_by_user_agent[user_agent] = http
+        return http
+
+
+def build_service(service_name: str,
+                  version: str,
+                  credentials: credentials.Credentials,
+                  user_agent: Optional[str] = None,
+                  cache: Optional[base.Cache] = None) -> discovery.Resource:
+    """Build a client of a Google Cloud Platform API.
+
+    Args:
+        service_name: Name of the API, like "storage".
+        version: Version of the API, like "v1".
+        credentials: The credentials used to call the API.
+        user_agent: The user agent to send with requests.
+        cache: Where the discovery document of the API is cached. By default
+            it is a DiscoveryCache in the user cache directory.
+
+    Returns:
+        The discovery resource of the API.
+    """
+    if cache is None:
+        cache = _discovery_cache
+    return discovery.build(service_name,
+                           version,
+                           http=get_http(credentials, user_agent),
+                           cache=cache)
@@ -18,6 +18,7 @@ See https://cloud.google.com/source-repositories/
 
 from typing import Any, Dict, List
 
+from django_cloud_deploy.cloudlib import client_factory
 from googleapiclient import discovery
 from googleapiclient import errors
 from google.auth import credentials
@@ -36,10 +37,7 @@ class CloudSourceRepositoryClient(object):
     @classmethod
     def from_credentials(cls, credentials: credentials.Credentials):
         return cls(
-            discovery.build('sourcerepo',
-                            'v1',
-                            credentials=credentials,
-                            cache_discovery=False))
+            client_factory.build_service('sourcerepo', 'v1', credentials))
 
     def list_repos(self, project_id: str) -> List[Dict[str, Any]]:
         """List cloud source repositories under the given project.
@@ -18,6 +18,7 @@ See https://cloud.google.com/cloud-build/docs/running-builds/automate-builds
 
 from typing import Dict
 
+from django_cloud_deploy.cloudlib import client_factory
 from googleapiclient import discovery
 from googleapiclient import errors
 from google.auth import credentials
@@ -39,10 +40,7 @@ class CloudBuildClient(object):
     @classmethod
     def from_credentials(cls, credentials: credentials.Credentials):
         return cls(
-            discovery.build('cloudbuild',
-                            'v1',
-                            credentials=credentials,
-                            cache_discovery=False))
+            client_factory.build_service('cloudbuild', 'v1', credentials))
 
     def create_trigger(self,
                        project_id: str,
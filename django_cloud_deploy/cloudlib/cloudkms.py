@@ -19,6 +19,7 @@ See https://cloud.google.com/kms/docs/
 import base64
 from typing import Optional, List
 
+from django_cloud_deploy.cloudlib import client_factory
 from googleapiclient import discovery
 from googleapiclient import errors
 from google.auth import credentials
@@ -38,10 +39,7 @@ class CloudKmsClient(object):
     @classmethod
     def from_credentials(cls, credentials: credentials.Credentials):
         return cls(
-            discovery.build('cloudkms',
-                            'v1',
-                            credentials=credentials,
-                            cache_discovery=False))
+            client_factory.build_service('cloudkms', 'v1', credentials))
 
     def create_keyring(self,
                        project_id: str,
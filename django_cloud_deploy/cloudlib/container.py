@@ -19,23 +19,49 @@ service exposing.
 
 import atexit
 import base64
+from concurrent import futures
+import decimal
+import hashlib
 import json
 import os
+import re
 import tempfile
+import threading
 import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 
 import docker
+from docker.utils import build as docker_build
 from googleapiclient import discovery
 from googleapiclient import errors
 import jinja2
 import kubernetes
 
+from django_cloud_deploy.cloudlib import client_factory
+from django_cloud_deploy.cloudlib import operation
 from google.auth import credentials
 from google.auth.transport import requests
 
 _TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), 'data')
 _CLUSTER_TEMPLATE_NAME = 'cluster_definition.json'
 
+# Multipliers of the suffixes of kubernetes resource quantities.
+_QUANTITY_SUFFIXES = {
+    'm': decimal.Decimal('0.001'),
+    'k': 10**3,
+    'M': 10**6,
+    'G': 10**9,
+    'T': 10**12,
+    'P': 10**15,
+    'E': 10**18,
+    'Ki': 2**10,
+    'Mi': 2**20,
+    'Gi': 2**30,
+    'Ti': 2**40,
+    'Pi': 2**50,
+    'Ei': 2**60,
+}
+
 
 class ContainerCreationError(Exception):
     """Exception raised in container creation."""
@@ -47,52 +73,244 @@ class ClusterGetInfoError(Exception):
     pass
 
 
+class DeploymentRolloutError(Exception):
+    """Exception raised when a deployment fails to roll out."""
+    pass
+
+
+class DockerImageError(Exception):
+    """Exception raised when the docker daemon fails to build or push."""
+    pass
+
+
+class _BuildProgress(object):
+    """Turns the output of the docker build API into progress messages.
+
+    Each Dockerfile instruction is reported once it is done, with its duration
+    or whether its result was taken from the build cache.
+    """
+
+    def __init__(self, report: Callable[[str], Any], clock=time.monotonic):
+        self._report = report
+        self._clock = clock
+        self._start_time = clock()
+        self._step = None
+        self._step_start_time = None
+        self._step_cached = False
+        self.steps = 0
+        self.cached_steps = 0
+
+    def _finish_step(self):
+        if self._step is None:
+            return
+        if self._step_cached:
+            self._report('{} (cached)'.format(self._step))
+        else:
+            self._report('{} ({:.1f}s)'.format(
+                self._step,
+                self._clock() - self._step_start_time))
+        self._step = None
+
+    def handle(self, event: Dict[str, Any]):
+        """Handle one event of the docker build API.
+
+        Args:
+            event: A decoded event, like {"stream": "Step 1/9 : FROM python"}.
+
+        Raises:
+            DockerImageError: If the event reports a build error.
+        """
+        if 'error' in event:
+            self._finish_step()
+            raise DockerImageError('Failed to build docker image: {}'.format(
+                event['error'].strip()))
+        line = event.get('stream', '').strip()
+        if line.startswith('Step '):
+            self._finish_step()
+            self._step = line
+            self._step_start_time = self._clock()
+            self._step_cached = False
+            self.steps += 1
+        elif line == '---> Using cache':
+            self._step_cached = True
+            self.cached_steps += 1
+
+    def finish(self, tag: str):
+        self._finish_step()
+        self._report('Built {} in {:.1f}s, {} of {} steps from cache.'.format(
+            tag,
+            self._clock() - self._start_time, self.cached_steps, self.steps))
+
+
+class _PushProgress(object):
+    """Turns the output of the docker push API into progress messages.
+
+    Each layer is reported once it is pushed, with its size, duration and
+    throughput, or when the registry already has it.
+    """
+
+    def __init__(self, report: Callable[[str], Any], clock=time.monotonic):
+        self._report = report
+        self._clock = clock
+        self._start_time = clock()
+        self._layer_start_times = {}
+        self._layer_sizes = {}
+        self.pushed_bytes = 0
+
+    def handle(self, event: Dict[str, Any]):
+        """Handle one event of the docker push API.
+
+        Args:
+            event: A decoded event, like
+                {"status": "Pushing", "id": "4b8a", "progressDetail": {...}}.
+
+        Raises:
+            DockerImageError: If the event reports a push error.
+        """
+        if 'error' in event:
+            raise DockerImageError('Failed to push docker image: {}'.format(
+                event['error'].strip()))
+        layer = event.get('id')
+        status = event.get('status', '')
+        if status == 'Pushing':
+            self._layer_start_times.setdefault(layer, self._clock())
+            total = event.get('progressDetail', {}).get('total')
+            if total:
+                self._layer_sizes[layer] = total
+        elif status == 'Pushed':
+            duration = self._clock() - self._layer_start_times.pop(
+                layer, self._clock())
+            size = self._layer_sizes.pop(layer, 0)
+            self.pushed_bytes += size
+            megabytes = size / 1024 / 1024
+            if duration > 0:
+                self._report(
+                    'Layer {}: pushed {:.1f} MB in {:.1f}s ({:.1f} MB/s)'.
+                    format(layer, megabytes, duration, megabytes / duration))
+            else:
+                self._report('Layer {}: pushed {:.1f} MB'.format(
+                    layer, megabytes))
+        elif status == 'Layer already exists':
+            self._report('Layer {}: already exists'.format(layer))
+
+    def finish(self, tag: str):
+        self._report('Pushed {} in {:.1f}s, {:.1f} MB uploaded.'.format(
+            tag,
+            self._clock() - self._start_time, self.pushed_bytes / 1024 / 1024))
+
+
 class ContainerClient(object):
     """The class for deployment of a Django app to gke.
 
     We should call the methods of this class in the following order:
         1. Call create_cluster_sync to create a new cluster.
-        2. Call build_docker_image.
-        3. Call push_docker_image.
-        4. Call create_kubernetes_configuration to get a configuration object
+        2. Call build_and_push_docker_image to build the image of the app and
+           push it to the registry, unless the registry already has it.
+        3. Call create_kubernetes_configuration to get a configuration object
            to access the newly created cluster.
-        5. Call create_secret to create secret objects to hold sensitive
-           information necessary for the deployment of your Django app. These
-           information can be accessed inside pods of your Django app.
-        6. Call create_deployment.
-        7. Call create_service.
-    """
+        4. Call apply_manifests with the secrets, deployment, autoscaler and
+           service of the app. It creates them or updates the ones which
+           changed.
+        5. Call wait_for_rollout if the deployment changed.
 
-    # This class will create temporary files for cluster ca certificates.
-    # This variable is used to save the path of those temporary files and
-    # remove them after the program exists.
-    _temp_ca_files = []
+    Step 1 does not depend on step 2, so the cluster can be created while the
+    docker image is built and pushed.
+    """
 
-    def __init__(self, container_service: discovery.Resource,
-                 credentials: credentials.Credentials):
+    # Maximum number of connections kept open to the master of each cluster.
+    DEFAULT_KUBE_CONNECTION_POOL_SIZE = 8
+
+    # Name recorded as the owner of the fields set by apply_manifests.
+    _FIELD_MANAGER = 'django-cloud-deploy'
+
+    # apply_manifests applies objects of these kinds in this order, because
+    # other objects might depend on them. Objects of other kinds are applied
+    # last. Objects in the same stage are applied concurrently.
+    _APPLY_STAGES = (
+        ('Namespace',),
+        ('Secret', 'ConfigMap', 'ServiceAccount'),
+    )
+    _CLUSTER_SCOPED_KINDS = ('Namespace',)
+
+    # Names of the REST resources of the kinds apply_manifests supports.
+    _RESOURCE_NAMES = {
+        'ConfigMap': 'configmaps',
+        'Deployment': 'deployments',
+        'HorizontalPodAutoscaler': 'horizontalpodautoscalers',
+        'Namespace': 'namespaces',
+        'Secret': 'secrets',
+        'Service': 'services',
+        'ServiceAccount': 'serviceaccounts',
+    }
+
+    # Fields of containers whose values are resource quantities.
+    _QUANTITY_FIELDS = ('limits', 'requests')
+
+    # Creating a cluster usually takes 3 to 5 minutes.
+    _CREATE_CLUSTER_EXPECTED_DURATION = 240
+    _CREATE_CLUSTER_DEADLINE = 1800
+
+    # Number of hex characters of the build context digest used as image tag.
+    _IMAGE_TAG_LENGTH = 16
+
+    # Rolling out a new image usually takes about a minute.
+    _ROLLOUT_EXPECTED_DURATION = 60
+    _ROLLOUT_DEADLINE = 900
+
+    def __init__(self,
+                 container_service: discovery.Resource,
+                 credentials: credentials.Credentials,
+                 waiter: Optional[operation.OperationWaiter] = None,
+                 kube_connection_pool_size: int = (
+                     DEFAULT_KUBE_CONNECTION_POOL_SIZE)):
         self._container_service = container_service
-        self._create_docker_client(credentials)
+        self._waiter = waiter or operation.OperationWaiter()
+        self._kube_connection_pool_size = kube_connection_pool_size
+        self._credentials = credentials
+
+        # Created on first use, so that only building and pushing images needs
+        # a docker daemon.
+        self._docker_client = None
+
+        # Kubernetes api clients, keyed by the host of the cluster master. Each
+        # of them keeps a pool of connections to its cluster.
+        self._api_clients = {}
+
+        # Temporary files for cluster ca certificates. They are removed when
+        # the client is closed.
+        self._temp_ca_files = []
+        self._lock = threading.Lock()
+        self._close_registered = False
+
+        # Hosts of cluster masters which do not support server side apply.
+        self._hosts_without_apply = set()
 
-    def _create_docker_client(self, credentials: credentials.Credentials):
+    def _create_docker_client(self) -> docker.DockerClient:
         # credentials.token is a bearer token that can be used in HTTP headers
         # to make authenticated requests. When the given credentials does not
         # have token, we need to force it to get a new token.
-        if not credentials.token:
-            credentials.refresh(requests.Request())
+        if not self._credentials.token:
+            self._credentials.refresh(requests.Request())
 
         # See https://cloud.google.com/container-registry/docs/advanced-authentication
-        self._docker_client = docker.DockerClient()
-        self._docker_client.login(username='oauth2accesstoken',
-                                  password=credentials.token,
-                                  registry='https://gcr.io')
+        docker_client = docker.DockerClient()
+        docker_client.login(username='oauth2accesstoken',
+                            password=self._credentials.token,
+                            registry='https://gcr.io')
+        return docker_client
+
+    def _get_docker_client(self) -> docker.DockerClient:
+        """Get the docker client logged in to gcr.io, creating it if needed."""
+        with self._lock:
+            if self._docker_client is None:
+                self._docker_client = self._create_docker_client()
+            return self._docker_client
 
     @classmethod
     def from_credentials(cls, credentials: credentials.Credentials):
         return cls(
-            discovery.build('container',
-                            'v1',
-                            credentials=credentials,
-                            cache_discovery=False), credentials)
+            client_factory.build_service('container', 'v1', credentials),
+            credentials)
 
     @staticmethod
     def _load_cluster_definition_template():
@@ -101,13 +319,65 @@ class ContainerClient(object):
         template = template_env.get_template(_CLUSTER_TEMPLATE_NAME)
         return template
 
-    def _cleanup_temp_files(self):
-        for temp_ca_file in self._temp_ca_files:
+    def _register_close(self):
+        """Make sure close is called when the program exits."""
+        with self._lock:
+            if not self._close_registered:
+                atexit.register(self.close)
+                self._close_registered = True
+
+    def close(self):
+        """Close kubernetes api clients and remove temporary files."""
+        with self._lock:
+            api_clients = list(self._api_clients.values())
+            self._api_clients = {}
+            temp_ca_files = self._temp_ca_files
+            self._temp_ca_files = []
+        for api_client in api_clients:
+            # ApiClient.close only exists from kubernetes 11. Older versions
+            # have no thread pool to close, only connections.
+            if hasattr(api_client, 'close'):
+                api_client.close()
+            api_client.rest_client.pool_manager.clear()
+        for temp_ca_file in temp_ca_files:
             try:
                 os.remove(temp_ca_file)
             except OSError:
                 pass
-        self._temp_ca_files = []
+
+    def get_api_client(
+            self,
+            configuration: (
+                kubernetes.client.configuration.Configuration) = None
+    ) -> kubernetes.client.ApiClient:
+        """Get the shared kubernetes api client of a cluster.
+
+        Reusing a client reuses its open connections, instead of doing a new
+        TLS handshake with the cluster master for every request.
+
+        Args:
+            configuration: A Kubernetes configuration which has access to the
+                cluster. If not set, it will use the default kubernetes
+                configuration.
+
+        Returns:
+            An api client which can be passed to any kubernetes api class.
+        """
+        key = configuration.host if configuration else None
+        with self._lock:
+            api_client = self._api_clients.get(key)
+            if api_client is None:
+                if configuration is None:
+                    configuration = kubernetes.client.Configuration()
+                configuration.connection_pool_maxsize = (
+                    self._kube_connection_pool_size)
+                api_client = kubernetes.client.ApiClient(configuration)
+                self._api_clients[key] = api_client
+            elif configuration is not None:
+                # The configuration might hold a newer access token.
+                api_client.configuration.api_key.update(configuration.api_key)
+        self._register_close()
+        return api_client
 
     def _get_default_kubernetes_version(self, project_id, zone='us-west1-a'):
         name = 'projects/{}/locations/{}'.format(project_id, zone)
@@ -171,7 +441,7 @@ class ContainerClient(object):
                     ('Unexpected error when creating cluster "{}" in '
                      'project "{}"').format(cluster_name, project_id)) from e
 
-        while True:
+        def poll_cluster():
             request = self._container_service.projects().zones().clusters().get(
                 projectId=project_id, zone=zone, clusterId=cluster_name)
             response = request.execute(num_retries=5)
@@ -179,15 +449,20 @@ class ContainerClient(object):
             # Possible status:
             # https://cloud.google.com/kubernetes-engine/docs/reference/rest/v1/projects.zones.clusters#Status
             if response['status'] == 'RUNNING':
-                return
+                return response
             elif response['status'] == 'PROVISIONING':
-                time.sleep(2)
-                continue
+                return None
             else:
                 raise ContainerCreationError(
                     'Unexpected cluster status after creation: {!r}'.format(
                         response['status']))
 
+        self._waiter.wait(
+            poll_cluster,
+            'Creation of cluster "{}"'.format(cluster_name),
+            deadline=self._CREATE_CLUSTER_DEADLINE,
+            expected_duration=self._CREATE_CLUSTER_EXPECTED_DURATION)
+
     def create_kubernetes_configuration(self,
                                         credentials: credentials.Credentials,
                                         project_id: str,
@@ -213,8 +488,7 @@ class ContainerClient(object):
 
         # This function will create a temporary file for cluster ca certificate.
         # Those temporary files should be removed after the program exists.
-        if not ContainerClient._temp_ca_files:
-            atexit.register(self._cleanup_temp_files)
+        self._register_close()
 
         # credentials.token is a bearer token that can be used in HTTP headers
         # to make authenticated requests. When the given credentials does not
@@ -236,7 +510,8 @@ class ContainerClient(object):
         _, ca_file_path = tempfile.mkstemp()
         # Save temporary file path so that it can be cleaned up after the
         # program exits.
-        self._temp_ca_files.append(ca_file_path)
+        with self._lock:
+            self._temp_ca_files.append(ca_file_path)
         with open(ca_file_path, 'wb') as ca_file:
             ca_file.write(base64.standard_b64decode(ca))
         configuration = kubernetes.client.Configuration()
@@ -246,129 +521,447 @@ class ContainerClient(object):
         configuration.ssl_ca_cert = ca_file_path
         return configuration
 
-    def build_docker_image(self, tag: str, directory: str):
-        """Build docker image.
+    @staticmethod
+    def _read_dockerignore(directory: str):
+        """Return the .dockerignore patterns of a docker build context.
+
+        This parses the file the same way as "docker build".
+        """
+        dockerignore = os.path.join(directory, '.dockerignore')
+        if not os.path.exists(dockerignore):
+            return []
+        with open(dockerignore) as f:
+            lines = [line.strip() for line in f.read().splitlines()]
+        return [line for line in lines if line and not line.startswith('#')]
+
+    def compute_build_context_digest(self, directory: str) -> str:
+        """Compute a digest of the files sent to docker to build an image.
+
+        Files excluded by the .dockerignore file of the directory do not
+        affect the digest, so the digest only changes when the resulting
+        image would change.
 
         Args:
-            tag: Docker image tag. Should looks similar to
+            directory: Absolute path of the directory containing a Dockerfile.
+
+        Returns:
+            Hex encoded sha256 digest of the paths and contents of the files
+            in the build context.
+        """
+        patterns = self._read_dockerignore(directory)
+        paths = sorted(docker_build.exclude_paths(directory, patterns))
+        digest = hashlib.sha256()
+        for relative_path in paths:
+            path = os.path.join(directory, relative_path)
+            if os.path.isdir(path) and not os.path.islink(path):
+                continue
+            digest.update(relative_path.encode('utf-8') + b'\0')
+            if os.path.islink(path):
+                digest.update(os.readlink(path).encode('utf-8'))
+            else:
+                with open(path, 'rb') as f:
+                    for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                        digest.update(chunk)
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def image_exists_locally(self, tag: str) -> bool:
+        """Return whether the local docker daemon has an image with the tag."""
+        try:
+            self._get_docker_client().images.get(tag)
+            return True
+        except docker.errors.ImageNotFound:
+            return False
+
+    def image_exists_in_registry(self, tag: str) -> bool:
+        """Return whether the docker registry has an image with the tag."""
+        try:
+            self._get_docker_client().images.get_registry_data(tag)
+            return True
+        except docker.errors.APIError:
+            # Includes docker.errors.NotFound
+            return False
+
+    def build_and_push_docker_image(
+            self,
+            image_name: str,
+            directory: str,
+            progress: Optional[Callable[[str], Any]] = None) -> str:
+        """Build and push a docker image tagged with its build context digest.
+
+        The build is skipped if the local docker daemon already has the image
+        and the push is skipped if the registry already has it. So building
+        an unchanged directory again costs only a digest computation and a
+        registry lookup.
+
+        Args:
+            image_name: Docker image name without tag. Should looks similar to
                 "gcr.io/<project_id>/<image_name>"
             directory: Absolute path of the directory containing a Dockerfile.
+            progress: A function called with a message whenever the build or
+                push makes progress.
+
+        Returns:
+            The tagged image, like "gcr.io/<project_id>/<image_name>:<digest>".
+
+        Raises:
+            DockerImageError: If the docker daemon fails to build or push the
+                image.
         """
+        report = progress or (lambda message: None)
+        digest = self.compute_build_context_digest(directory)
+        tag = '{}:{}'.format(image_name, digest[:self._IMAGE_TAG_LENGTH])
+        if self.image_exists_in_registry(tag):
+            report('Image {} is already in the registry.'.format(tag))
+            return tag
+        if self.image_exists_locally(tag):
+            report('Image {} is already built.'.format(tag))
+        else:
+            self.build_docker_image(tag, directory, progress)
+        self.push_docker_image(tag, progress)
+        return tag
+
+    def build_docker_image(self,
+                           tag: str,
+                           directory: str,
+                           progress: Optional[Callable[[str], Any]] = None):
+        """Build docker image.
 
-        self._docker_client.images.build(tag=tag, path=directory)
+        Args:
+            tag: Docker image tag. Should looks similar to
+                "gcr.io/<project_id>/<image_name>"
+            directory: Absolute path of the directory containing a Dockerfile.
+            progress: A function called with a message whenever a step of the
+                Dockerfile is done.
 
-    def push_docker_image(self, tag: str):
+        Raises:
+            DockerImageError: If the docker daemon fails to build the image.
+        """
+        build_progress = _BuildProgress(progress or (lambda message: None))
+        docker_api = self._get_docker_client().api
+        for event in docker_api.build(path=directory,
+                                      tag=tag,
+                                      rm=True,
+                                      decode=True):
+            build_progress.handle(event)
+        build_progress.finish(tag)
+
+    def push_docker_image(self,
+                          tag: str,
+                          progress: Optional[Callable[[str], Any]] = None):
         """Push docker image.
 
         Args:
             tag: Docker image tag. Should looks similar to
                 "gcr.io/<project_id>/<image_name>"
+            progress: A function called with a message whenever a layer of
+                the image is pushed.
+
+        Raises:
+            DockerImageError: If the docker daemon fails to push the image.
         """
-        self._docker_client.images.push(tag)
+        push_progress = _PushProgress(progress or (lambda message: None))
+        repository, image_tag = docker.utils.parse_repository_tag(tag)
+        docker_api = self._get_docker_client().api
+        for event in docker_api.push(repository,
+                                     tag=image_tag,
+                                     stream=True,
+                                     decode=True):
+            push_progress.handle(event)
+        push_progress.finish(tag)
 
-    def create_deployment(
-            self,
-            deployment_data: kubernetes.client.V1Deployment,
-            configuration: (
-                kubernetes.client.configuration.Configuration) = None,
-            namespace: str = 'default'):
-        """Create a Kubernetes Deployment.
+    @classmethod
+    def _get_object_path(cls, manifest: Dict[str, Any], namespace: str) -> str:
+        """Get the path of the REST resource of a kubernetes object.
 
-        A Kubernetes Deployment describes a desired state of your application.
-        For example, it manages creation of Pods by means of ReplicaSets, and
-        defines what images to use for the containers.
+        Raises:
+            ValueError: If objects of the kind of the manifest are not
+                supported.
+        """
+        api_version = manifest['apiVersion']
+        kind = manifest['kind']
+        if kind not in cls._RESOURCE_NAMES:
+            raise ValueError(
+                'Kubernetes objects of kind "{}" are not supported.'.format(
+                    kind))
+        if api_version == 'v1':
+            path = '/api/v1'
+        else:
+            path = '/apis/' + api_version
+        if kind not in cls._CLUSTER_SCOPED_KINDS:
+            path += '/namespaces/' + namespace
+        return '/'.join(
+            [path, cls._RESOURCE_NAMES[kind], manifest['metadata']['name']])
+
+    @staticmethod
+    def _parse_quantity(quantity: Any) -> Optional[decimal.Decimal]:
+        """Parse a kubernetes quantity, like "500m" or "1Gi", into a number.
+
+        Returns:
+            The value of the quantity, or None if it is not a quantity.
+        """
+        match = re.fullmatch(
+            r'([+-]?(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:[eE][+-]?[0-9]+)?)'
+            r'(m|k|M|G|T|P|E|Ki|Mi|Gi|Ti|Pi|Ei)?', str(quantity))
+        if not match:
+            return None
+        number, suffix = match.groups()
+        return decimal.Decimal(number) * _QUANTITY_SUFFIXES.get(suffix, 1)
+
+    @classmethod
+    def _equal_quantities(cls, desired: Any, live: Any) -> bool:
+        """Return whether two resource quantities have the same value."""
+        desired_value = cls._parse_quantity(desired)
+        if desired_value is None:
+            return desired == live
+        return desired_value == cls._parse_quantity(live)
+
+    @classmethod
+    def _is_subset(cls,
+                   desired: Any,
+                   live: Any,
+                   key: Optional[str] = None) -> bool:
+        """Return whether the live object already has every desired field.
+
+        Fields only present in the live object, like defaults set by the
+        server or the status, are ignored. So are empty desired fields, which
+        the server fills with defaults. Resource quantities are compared by
+        value, because the server returns them in canonical form, like "500m"
+        for "0.5".
+        """
+        if desired is None:
+            return True
+        if isinstance(desired, dict):
+            if not isinstance(live, dict):
+                return False
+            if key in cls._QUANTITY_FIELDS:
+                return all(
+                    name in live and cls._equal_quantities(value, live[name])
+                    for name, value in desired.items())
+            return all(
+                name in live and cls._is_subset(value, live[name], name)
+                for name, value in desired.items())
+        if isinstance(desired, list):
+            return (isinstance(live, list) and len(desired) == len(live) and
+                    all(
+                        cls._is_subset(desired_item, live_item)
+                        for desired_item, live_item in zip(desired, live)))
+        return desired == live
+
+    @staticmethod
+    def _get_stored_form(manifest: Dict[str, Any]) -> Dict[str, Any]:
+        """Get the definition of an object as the server stores it.
+
+        The server merges the stringData of a secret into its data, base64
+        encoded, and does not return stringData.
+        """
+        if manifest['kind'] != 'Secret' or not manifest.get('stringData'):
+            return manifest
+        stored = dict(manifest)
+        data = dict(stored.pop('stringData'))
+        for name, value in data.items():
+            data[name] = base64.standard_b64encode(
+                value.encode('utf-8')).decode('utf-8')
+        stored['data'] = dict(manifest.get('data') or {}, **data)
+        return stored
+
+    def _apply_manifest(self, manifest: Dict[str, Any],
+                        api_client: kubernetes.client.ApiClient,
+                        namespace: str) -> bool:
+        """Apply a kubernetes object if it differs from the live object.
 
         Args:
-            deployment_data: Definition of the deployment.
-            configuration: A Kubernetes configuration which has access to the
-                cluster for the deployment. If not set, it will use the default
-                kubernetes configuration.
-            namespace: Namespace of the deployment.
+            manifest: Definition of the object.
+            api_client: An api client which has access to the cluster.
+            namespace: Namespace of the object.
+
+        Returns:
+            Whether the object was created or updated.
         """
-        api_client = kubernetes.client.ApiClient(configuration)
-        api_instance = kubernetes.client.ExtensionsV1beta1Api(api_client)
-        api_instance.create_namespaced_deployment(namespace=namespace,
-                                                  body=deployment_data)
+        path = self._get_object_path(manifest, namespace)
+        try:
+            live = api_client.call_api(path,
+                                       'GET',
+                                       header_params={
+                                           'Accept': 'application/json'
+                                       },
+                                       response_type='object',
+                                       auth_settings=['BearerToken'],
+                                       _return_http_data_only=True)
+        except kubernetes.client.rest.ApiException as e:
+            if e.status != 404:
+                raise
+            live = None
+        if live is not None and self._is_subset(
+                self._get_stored_form(manifest), live):
+            return False
+
+        host = api_client.configuration.host
+        with self._lock:
+            server_side_apply = host not in self._hosts_without_apply
+        if server_side_apply:
+            # Server side apply creates the object if it does not exist. It
+            # takes a yaml document, and json is valid yaml.
+            try:
+                self._call_api(api_client,
+                               path,
+                               'PATCH',
+                               json.dumps(manifest),
+                               'application/apply-patch+yaml',
+                               query_params=[('fieldManager',
+                                              self._FIELD_MANAGER),
+                                             ('force', 'true')])
+                return True
+            except kubernetes.client.rest.ApiException as e:
+                # Server side apply is only enabled by default from
+                # Kubernetes 1.16. Older masters reject its content type.
+                if e.status != 415:
+                    raise
+                with self._lock:
+                    self._hosts_without_apply.add(host)
+
+        if live is None:
+            collection_path = path.rsplit('/', 1)[0]
+            self._call_api(api_client, collection_path, 'POST', manifest,
+                           'application/json')
+        else:
+            # Like "kubectl apply", merge the definition into the live object.
+            # Unlike server side apply, fields removed from the definition
+            # are kept.
+            self._call_api(api_client, path, 'PATCH', manifest,
+                           'application/strategic-merge-patch+json')
+        return True
+
+    @staticmethod
+    def _call_api(api_client: kubernetes.client.ApiClient,
+                  path: str,
+                  method: str,
+                  body: Any,
+                  content_type: str,
+                  query_params: Optional[List[Tuple[str, str]]] = None):
+        """Send a kubernetes object to the REST resource at the path.
 
-    def update_deployment(
+        Args:
+            api_client: An api client which has access to the cluster.
+            path: Path of the REST resource.
+            method: The http method of the request.
+            body: The object to send. The api client serializes it for json
+                content types. For other content types it should be a string.
+            content_type: The content type of the body.
+            query_params: Query parameters of the request.
+        """
+        api_client.call_api(path,
+                            method,
+                            query_params=query_params or [],
+                            header_params={
+                                'Accept': 'application/json',
+                                'Content-Type': content_type
+                            },
+                            body=body,
+                            response_type='object',
+                            auth_settings=['BearerToken'],
+                            _return_http_data_only=True)
+
+    def apply_manifests(
             self,
-            deployment_data: kubernetes.client.V1Deployment,
+            manifests: Iterable[Dict[str, Any]],
             configuration: (
                 kubernetes.client.configuration.Configuration) = None,
-            namespace: str = 'default'):
-        """Update a Kubernetes Deployment.
+            namespace: str = 'default') -> List[str]:
+        """Create or update kubernetes objects to match their definitions.
 
-        A Kubernetes Deployment describes a desired state of your application.
-        For example, it manages creation of Pods by means of ReplicaSets, and
-        defines what images to use for the containers.
+        Each object is compared with the live object in the cluster and only
+        objects which differ are sent, using server side apply. So applying
+        the same definitions again only costs one request per object. On
+        clusters without server side apply, objects are created, or patched
+        with a strategic merge patch.
 
         Args:
-            deployment_data: Definition of the deployment.
+            manifests: Definitions of the objects, like the documents of a
+                yaml file loaded with yaml.load_all.
             configuration: A Kubernetes configuration which has access to the
-                cluster for the deployment. If not set, it will use the default
-                kubernetes configuration.
-            namespace: Namespace of the deployment.
-        """
+                cluster. If not set, it will use the default kubernetes
+                configuration.
+            namespace: Namespace of the objects.
+
+        Returns:
+            The objects which were created or updated, like
+            "Deployment/mysite".
 
-        api_client = kubernetes.client.ApiClient(configuration)
-        api_instance = kubernetes.client.ExtensionsV1beta1Api(api_client)
-
-        deployment_name = deployment_data['metadata']['name']
-
-        # TODO: Find a better way to do update.
-        # Right now we scale the replicas to 0 and then scale it back. This
-        # will trigger an image update.
-        replicas = deployment_data['spec']['replicas']
-        deployment_data['spec']['replicas'] = 0
-        api_instance.patch_namespaced_deployment(name=deployment_name,
-                                                 namespace=namespace,
-                                                 body=deployment_data)
-        deployment_data['spec']['replicas'] = replicas
-        api_instance.patch_namespaced_deployment(name=deployment_name,
-                                                 namespace=namespace,
-                                                 body=deployment_data)
-
-    def create_service(
+        Raises:
+            ValueError: If objects of one of the kinds are not supported.
+        """
+        api_client = self.get_api_client(configuration)
+        stages = [[] for _ in range(len(self._APPLY_STAGES) + 1)]
+        for manifest in manifests:
+            # Fail on unsupported kinds before any object is applied.
+            self._get_object_path(manifest, namespace)
+            stage = len(self._APPLY_STAGES)
+            for i, kinds in enumerate(self._APPLY_STAGES):
+                if manifest['kind'] in kinds:
+                    stage = i
+            stages[stage].append(manifest)
+
+        applied = []
+        with futures.ThreadPoolExecutor(
+                max_workers=self._kube_connection_pool_size) as executor:
+            for stage in stages:
+                results = executor.map(
+                    lambda manifest: self._apply_manifest(
+                        manifest, api_client, namespace), stage)
+                for manifest, changed in zip(stage, results):
+                    if changed:
+                        applied.append('{}/{}'.format(
+                            manifest['kind'], manifest['metadata']['name']))
+        return applied
+
+    def wait_for_rollout(
             self,
-            service_data: kubernetes.client.V1Service,
+            deployment_name: str,
             configuration: (
                 kubernetes.client.configuration.Configuration) = None,
             namespace: str = 'default'):
-        """Create a Kubernetes Dervice.
+        """Wait until every pod of a deployment runs its latest definition.
 
-        A Kubernetes Service is an abstraction which defines a logical set of
-        Pods and a policy by which to access them.
+        This checks the same conditions as "kubectl rollout status".
 
         Args:
-            service_data: Definition of the service.
+            deployment_name: Name of the deployment.
             configuration: A Kubernetes configuration which has access to the
-                cluster for the service. If not set, it will use the default
+                cluster for the deployment. If not set, it will use the default
                 kubernetes configuration.
-            namespace: Namespace of the service.
-        """
-        api_client = kubernetes.client.ApiClient(configuration)
-        api_instance = kubernetes.client.CoreV1Api(api_client)
-        api_instance.create_namespaced_service(namespace=namespace,
-                                               body=service_data)
-
-    def create_secret(self,
-                      secret_data: kubernetes.client.V1Secret,
-                      configuration: (
-                          kubernetes.client.configuration.Configuration) = None,
-                      namespace: str = 'default'):
-        """Create a Kubernetes Secret.
-
-        Kubernetes Secrets are intended to hold sensitive information. They are
-        accessible inside Pods.
+            namespace: Namespace of the deployment.
 
-        Args:
-            secret_data: Definition of the secret.
-            configuration: A Kubernetes configuration which has access to the
-                cluster for the service. If not set, it will use the default
-                kubernetes configuration.
-            namespace: Namespace of the service.
+        Raises:
+            DeploymentRolloutError: If the rollout makes no progress.
+            operation.OperationTimeoutError: If the rollout does not finish
+                before the deadline.
         """
-        api_client = kubernetes.client.ApiClient(configuration)
-        api_instance = kubernetes.client.CoreV1Api(api_client)
-        api_instance.create_namespaced_secret(namespace=namespace,
-                                              body=secret_data)
+        api_client = self.get_api_client(configuration)
+        api_instance = kubernetes.client.AppsV1Api(api_client)
+
+        def poll_rollout():
+            deployment = api_instance.read_namespaced_deployment(
+                name=deployment_name, namespace=namespace)
+            status = deployment.status
+            # The deployment controller has not seen the update yet.
+            if (status.observed_generation or 0) < (
+                    deployment.metadata.generation or 0):
+                return False
+            for condition in status.conditions or []:
+                if (condition.type == 'Progressing' and
+                        condition.reason == 'ProgressDeadlineExceeded'):
+                    raise DeploymentRolloutError(
+                        'Deployment "{}" failed to roll out: {}'.format(
+                            deployment_name, condition.message))
+            replicas = deployment.spec.replicas or 0
+            updated_replicas = status.updated_replicas or 0
+            # Old pods are still running or new pods are not available yet.
+            return (updated_replicas >= replicas and
+                    (status.replicas or 0) <= updated_replicas and
+                    (status.available_replicas or 0) >= updated_replicas)
+
+        self._waiter.wait(poll_rollout,
+                          'Rollout of deployment "{}"'.format(deployment_name),
+                          deadline=self._ROLLOUT_DEADLINE,
+                          expected_duration=self._ROLLOUT_EXPECTED_DURATION)
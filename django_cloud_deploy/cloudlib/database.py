@@ -17,17 +17,18 @@ See https://cloud.google.com/sql/docs/
 """
 
 import contextlib
+import importlib
+import io
 import os
 import signal
 import shutil
 import subprocess
-import time
-from typing import Optional
+import threading
+from typing import Any, List, Optional, TextIO
 
-import django
-from django import db
-from django.core import management
 from django_cloud_deploy import crash_handling
+from django_cloud_deploy.cloudlib import client_factory
+from django_cloud_deploy.cloudlib import operation
 
 import pexpect
 from pexpect import popen_spawn
@@ -44,16 +45,27 @@ class DatabaseError(Exception):
 class DatabaseClient(object):
     """A class for managing Google Cloud SQL objects."""
 
-    def __init__(self, sqladmin_service: discovery.Resource):
+    # Creating a Cloud SQL instance usually takes about 5 minutes.
+    _CREATE_INSTANCE_EXPECTED_DURATION = 300
+    _CREATE_INSTANCE_DEADLINE = 1800
+    _CREATE_DATABASE_EXPECTED_DURATION = 10
+    _CREATE_DATABASE_DEADLINE = 300
+
+    def __init__(self,
+                 sqladmin_service: discovery.Resource,
+                 waiter: Optional[operation.OperationWaiter] = None):
         self._sqladmin_service = sqladmin_service
+        self._waiter = waiter or operation.OperationWaiter()
+
+        # (instance connection string, port) of the Cloud SQL Proxy processes
+        # started by with_cloud_sql_proxy and still running.
+        self._proxy_sessions = set()
+        self._proxy_sessions_lock = threading.Lock()
 
     @classmethod
     def from_credentials(cls, credentials: credentials.Credentials):
         return cls(
-            discovery.build('sqladmin',
-                            'v1beta4',
-                            credentials=credentials,
-                            cache_discovery=False))
+            client_factory.build_service('sqladmin', 'v1beta4', credentials))
 
     def create_instance_sync(self,
                              project_id: str,
@@ -114,22 +126,27 @@ class DatabaseClient(object):
                 # fine because we can reuse this instance.
                 return
 
-        while True:
+        def poll_instance():
             request = self._sqladmin_service.instances().get(project=project_id,
                                                              instance=instance)
             response = request.execute(num_retries=5)
             # Response format:
             # https://cloud.google.com/sql/docs/mysql/admin-api/v1beta4/instances#resource
             if response['state'] == 'RUNNABLE':
-                return
+                return response
             elif response['state'] == 'PENDING_CREATE':
-                time.sleep(5)
-                continue
+                return None
             else:
                 raise DatabaseError(
                     'unexpected instance status after creation: {!r} [{!r}]'.
                     format(response['state'], response))
 
+        self._waiter.wait(
+            poll_instance,
+            'Creation of Cloud SQL instance "{}"'.format(instance),
+            deadline=self._CREATE_INSTANCE_DEADLINE,
+            expected_duration=self._CREATE_INSTANCE_EXPECTED_DURATION)
+
     def create_database_sync(self, project_id: str, instance: str,
                              database: str):
         """Creates a new database in a Cloud SQL instance and wait for completion.
@@ -173,12 +190,21 @@ class DatabaseClient(object):
                                                                 'name': database
                                                             })
         response = request.execute(num_retries=5)
-        while response['status'] in ['PENDING']:
-            request = self._sqladmin_service.databases().get(project=project_id,
-                                                             instance=instance,
-                                                             database=database)
-            response = request.execute(num_retries=5)
-            time.sleep(2)
+        if response['status'] in ['PENDING']:
+
+            def poll_database():
+                request = self._sqladmin_service.databases().get(
+                    project=project_id, instance=instance, database=database)
+                response = request.execute(num_retries=5)
+                if response['status'] in ['PENDING']:
+                    return None
+                return response
+
+            response = self._waiter.wait(
+                poll_database,
+                'Creation of database "{}"'.format(database),
+                deadline=self._CREATE_DATABASE_DEADLINE,
+                expected_duration=self._CREATE_DATABASE_EXPECTED_DURATION)
 
         if response['status'] not in ['DONE', 'RUNNING']:
             raise DatabaseError(
@@ -255,6 +281,11 @@ class DatabaseClient(object):
         For more information:
         https://cloud.google.com/sql/docs/postgres/sql-proxy
 
+        If a Cloud SQL Proxy for the same instance and port is already started
+        by an enclosing with_cloud_sql_proxy context, that process is reused
+        instead of starting a new one. This way several database operations
+        pay for the start up of cloud sql proxy only once.
+
         Args:
             project_id: GCP project id.
             instance_name: Name of the Cloud SQL instance cloud sql proxy
@@ -270,16 +301,27 @@ class DatabaseClient(object):
         Raises:
             DatabaseError: If cloud sql proxy failed to start after 5 seconds.
         """
+        instance_connection_string = '{0}:{1}:{2}'.format(
+            project_id, region, instance_name)
+        session_key = (instance_connection_string, port)
+        with self._proxy_sessions_lock:
+            reuse_proxy = session_key in self._proxy_sessions
+        if reuse_proxy:
+            # The enclosing context owns the process and will kill it.
+            yield
+            return
+
+        # Django is only imported when needed, it is slow to import.
+        from django import db
+        from django.core import exceptions
         try:
             db.close_old_connections()
-        except django.core.exceptions.ImproperlyConfigured:
+        except exceptions.ImproperlyConfigured:
             # The Django environment is not correctly setup. This might be
             # because we are calling Django management commands with subprocess
             # calls. In this case the subprocess we are calling will handle
             # closing of old connections.
             pass
-        instance_connection_string = '{0}:{1}:{2}'.format(
-            project_id, region, instance_name)
         instance_flag = '-instances={}=tcp:{}'.format(
             instance_connection_string, port)
         if cloud_sql_proxy_path is None:
@@ -289,6 +331,8 @@ class DatabaseClient(object):
         try:
             # Make sure cloud sql proxy is started before doing the real work
             process.expect('Ready for new connections', timeout=60)
+            with self._proxy_sessions_lock:
+                self._proxy_sessions.add(session_key)
             yield
         except pexpect.exceptions.TIMEOUT:
             raise DatabaseError(
@@ -299,15 +343,151 @@ class DatabaseClient(object):
                 ('Cloud SQL Proxy exited unexpectedly. Output of '
                  'cloud_sql_proxy: \n{}').format(process.before))
         finally:
+            with self._proxy_sessions_lock:
+                self._proxy_sessions.discard(session_key)
             process.kill(signal.SIGTERM)
 
+    def get_pending_migrations(self,
+                               project_id: Optional[str] = None,
+                               instance_name: Optional[str] = None,
+                               cloud_sql_proxy_path: str = 'cloud_sql_proxy',
+                               region: str = 'us-west1',
+                               port: Optional[int] = 5432) -> List[str]:
+        """Get the migrations migrate_database would apply.
+
+        The migration plan is computed in the current process from the
+        migrations recorded in the Cloud SQL database. Model changes without
+        migration files are included as the migrations "makemigrations" would
+        generate for them. Nothing is written to the database or to the
+        project directory.
+
+        This function has the same prerequisites as migrate_database.
+
+        Args:
+            project_id: GCP project id. If project_id or instance_name is not
+                given, no cloud sql proxy is started, and the database must
+                already be reachable, like inside a with_cloud_sql_proxy
+                context.
+            instance_name: Name of the Cloud SQL instance where the database you
+                want to migrate is in.
+            cloud_sql_proxy_path: The command to run your cloud sql proxy.
+            region: Where the Cloud SQL instance is in.
+            port: The port being forwarded by cloud sql proxy.
+
+        Returns:
+            Names of the pending migrations, like "polls.0002_question_text".
+
+        Raises:
+            crash_handling.UserError: If the migration plan could not be
+                computed.
+        """
+        from django import db
+        # These can only be imported after django.setup() is called
+        from django.db.migrations import executor
+
+        with self._with_cloud_sql_proxy_if_needed(project_id, instance_name,
+                                                  cloud_sql_proxy_path, region,
+                                                  port):
+            try:
+                migration_executor = executor.MigrationExecutor(db.connection)
+                loader = migration_executor.loader
+                plan = migration_executor.migration_plan(
+                    loader.graph.leaf_nodes())
+                pending = [
+                    '{}.{}'.format(migration.app_label, migration.name)
+                    for migration, _ in plan
+                ]
+                return pending + self._get_unmade_migrations(loader)
+            except Exception as e:
+                raise crash_handling.UserError(
+                    'Not able to compute the migration plan.') from e
+
+    @classmethod
+    def get_latest_migrations(cls) -> List[str]:
+        """Get the latest migrations of the Django project.
+
+        These are the last migration of each app, and the migrations
+        "makemigrations" would generate for model changes without migration
+        files. Unlike get_pending_migrations, the database is not needed. So
+        when the latest migrations are the ones applied by the last
+        migration, there is nothing to migrate and no cloud sql proxy needs
+        to be started.
+
+        This function has the same prerequisites as migrate_database.
+
+        Returns:
+            Names of the latest migrations, like "polls.0002_question_text".
+
+        Raises:
+            crash_handling.UserError: If the migration files could not be
+                loaded.
+        """
+        # This can only be imported after django.setup() is called
+        from django.db.migrations import loader
+
+        try:
+            # Without a connection only the migration files are loaded.
+            migration_loader = loader.MigrationLoader(None)
+            latest = sorted('{}.{}'.format(app_label, name) for app_label, name
+                            in migration_loader.graph.leaf_nodes())
+            return latest + cls._get_unmade_migrations(migration_loader)
+        except Exception as e:
+            raise crash_handling.UserError(
+                'Not able to load the migration files.') from e
+
+    @staticmethod
+    def _get_unmade_migrations(migration_loader: Any) -> List[str]:
+        """Get the migrations "makemigrations" would generate.
+
+        Args:
+            migration_loader: A django.db.migrations.loader.MigrationLoader
+                which loaded the migration files of the project.
+
+        Returns:
+            Names of the migrations, like "polls.0003_auto".
+        """
+        from django.apps import apps
+        from django.db.migrations import autodetector
+        from django.db.migrations import questioner
+        from django.db.migrations import state
+
+        # Same as a dry run of "makemigrations".
+        changes = autodetector.MigrationAutodetector(
+            migration_loader.project_state(),
+            state.ProjectState.from_apps(apps),
+            questioner.NonInteractiveMigrationQuestioner(
+                specified_apps=set(),
+                dry_run=True)).changes(graph=migration_loader.graph)
+        unmade = []
+        for app_label, migrations in sorted(changes.items()):
+            unmade.extend('{}.{}'.format(app_label, migration.name)
+                          for migration in migrations)
+        return unmade
+
+    def _with_cloud_sql_proxy_if_needed(self, project_id: Optional[str],
+                                        instance_name: Optional[str],
+                                        cloud_sql_proxy_path: str, region: str,
+                                        port: int):
+        """Start cloud sql proxy unless the database is already reachable.
+
+        Without project_id or instance_name the caller provides access to the
+        database, like with an enclosing with_cloud_sql_proxy context, and
+        nothing is started.
+        """
+        if not project_id or not instance_name:
+            return contextlib.ExitStack()
+        return self.with_cloud_sql_proxy(project_id, instance_name,
+                                         cloud_sql_proxy_path, region, port)
+
     def migrate_database(self,
                          project_dir: str,
-                         project_id: str,
-                         instance_name: str,
+                         project_id: Optional[str] = None,
+                         instance_name: Optional[str] = None,
                          cloud_sql_proxy_path: str = 'cloud_sql_proxy',
                          region: str = 'us-west1',
-                         port: Optional[int] = 5432):
+                         port: Optional[int] = 5432,
+                         in_process: bool = False,
+                         stdout: Optional[TextIO] = None):
         """Migrate to Cloud SQL database.
 
         This function should be called after we do the following:
@@ -318,42 +498,105 @@ class DatabaseClient(object):
 
         Args:
             project_dir: Absolute path of the Django project directory.
-            project_id: GCP project id.
+            project_id: GCP project id. If project_id or instance_name is not
+                given, no cloud sql proxy is started, and the database must
+                already be reachable, like inside a with_cloud_sql_proxy
+                context.
             instance_name: Name of the Cloud SQL instance where the database you
                 want to migrate is in.
             cloud_sql_proxy_path: The command to run your cloud sql proxy.
             region: Where the Cloud SQL instance is in.
             port: The port being forwarded by cloud sql proxy.
+            in_process: Whether to run the migration commands in the current
+                process with the already set up Django environment, instead of
+                running "django-admin" subprocesses which import the project
+                again.
+            stdout: The file to write the output of the migration commands
+                to. By default the output is discarded.
+
+        Raises:
+            crash_handling.UserError: If the migration failed.
         """
-        with self.with_cloud_sql_proxy(project_id, instance_name,
-                                       cloud_sql_proxy_path, region, port):
-            try:
-                # The environment variable must exist. This is the prerequisite
-                # of calling this function
-                settings_module = os.environ['DJANGO_SETTINGS_MODULE']
-
-                # "makemigrations" will generate migration files based on
-                # definitions in models.py.
-                makemigrations_args = [
-                    'django-admin', 'makemigrations',
-                    '='.join(['--pythonpath', project_dir]),
-                    '='.join(['--settings', settings_module])
-                ]
-                subprocess.check_call(makemigrations_args,
-                                      stdout=subprocess.DEVNULL,
-                                      stderr=subprocess.DEVNULL)
-                # "migrate" will modify cloud sql database.
-                migrate_args = [
-                    'django-admin', 'migrate',
+        with self._with_cloud_sql_proxy_if_needed(project_id, instance_name,
+                                                  cloud_sql_proxy_path, region,
+                                                  port):
+            if in_process:
+                self._migrate_database_in_process(stdout)
+            else:
+                self._migrate_database_in_subprocess(project_dir, stdout)
+
+    @staticmethod
+    def _migrate_database_in_process(stdout: Optional[TextIO] = None):
+        """Run "makemigrations" and "migrate" with the current Django setup.
+
+        Args:
+            stdout: The file to write the output of the migration commands
+                to. By default the output is discarded.
+
+        Raises:
+            crash_handling.UserError: If the migration failed.
+        """
+        from django.core import management
+
+        stdout = stdout or io.StringIO()
+        try:
+            # "makemigrations" will generate migration files based on
+            # definitions in models.py.
+            management.call_command('makemigrations',
+                                    interactive=False,
+                                    stdout=stdout,
+                                    stderr=stdout)
+            # Make sure the migration files just written can be imported.
+            importlib.invalidate_caches()
+            # "migrate" will modify cloud sql database.
+            management.call_command('migrate',
+                                    interactive=False,
+                                    stdout=stdout,
+                                    stderr=stdout)
+        except Exception as e:
+            raise crash_handling.UserError(
+                'Not able to migrate database.') from e
+
+    @staticmethod
+    def _migrate_database_in_subprocess(project_dir: str,
+                                        stdout: Optional[TextIO] = None):
+        """Run "makemigrations" and "migrate" with "django-admin".
+
+        Args:
+            project_dir: Absolute path of the Django project directory.
+            stdout: The file to write the output of the migration commands
+                to. By default the output is only shown if the migration
+                failed.
+
+        Raises:
+            crash_handling.UserError: If the migration failed.
+        """
+        try:
+            # The environment variable must exist. This is the prerequisite
+            # of calling this function
+            settings_module = os.environ['DJANGO_SETTINGS_MODULE']
+            for command in ('makemigrations', 'migrate'):
+                args = [
+                    'django-admin', command,
                     '='.join(['--pythonpath', project_dir]),
                     '='.join(['--settings', settings_module])
                 ]
-                subprocess.check_call(migrate_args,
-                                      stdout=subprocess.DEVNULL,
-                                      stderr=subprocess.DEVNULL)
-            except Exception as e:
-                raise crash_handling.UserError(
-                    'Not able to migrate database.') from e
+                result = subprocess.run(args,
+                                        stdout=subprocess.PIPE,
+                                        stderr=subprocess.STDOUT,
+                                        universal_newlines=True)
+                if stdout:
+                    stdout.write(result.stdout)
+                if result.returncode != 0:
+                    raise crash_handling.UserError(
+                        ('Not able to migrate database. Output of '
+                         '"django-admin {}": \n{}').format(
+                             command, result.stdout))
+        except crash_handling.UserError:
+            raise
+        except Exception as e:
+            raise crash_handling.UserError(
+                'Not able to migrate database.') from e
 
     def create_super_user(self,
                           superuser_name: str,
@@ -12,13 +12,15 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import time
+from typing import List, Optional, Set
 
 from googleapiclient import discovery
 from googleapiclient import errors
 from google.auth import credentials
 
 from django_cloud_deploy import crash_handling
+from django_cloud_deploy.cloudlib import client_factory
+from django_cloud_deploy.cloudlib import operation
 
 
 class EnableServiceError(Exception):
@@ -28,34 +30,41 @@ class EnableServiceError(Exception):
 class EnableServiceClient(object):
     """A class for enabling GCP apis."""
 
-    def __init__(self, service_usage_service: discovery.Resource):
+    _ENABLE_SERVICE_EXPECTED_DURATION = 20
+    _ENABLE_SERVICE_DEADLINE = 600
+
+    # See
+    # https://cloud.google.com/service-usage/docs/reference/rest/v1/services/batchEnable
+    _BATCH_ENABLE_MAX_SERVICES = 20
+    _LIST_PAGE_SIZE = 200
+
+    def __init__(self,
+                 service_usage_service: discovery.Resource,
+                 waiter: Optional[operation.OperationWaiter] = None):
         self._service_usage_service = service_usage_service
+        self._waiter = waiter or operation.OperationWaiter()
 
     @classmethod
     def from_credentials(cls, credentials: credentials.Credentials):
         return cls(
-            discovery.build('serviceusage',
-                            'v1',
-                            credentials=credentials,
-                            cache_discovery=False))
+            client_factory.build_service('serviceusage', 'v1', credentials))
 
-    def enable_service_sync(self, project_id: str, service: str):
-        """Enable a service for the given project.
+    @staticmethod
+    def _execute_enable_request(request):
+        """Execute a request enabling services.
 
         Args:
-            project_id: GCP project id.
-            service: Name of the service to be enabled. For example,
-                "drive.googleapis.com"
+            request: A services().enable or services().batchEnable request.
+
+        Returns:
+            The response of the request.
 
         Raises:
-            EnableServiceError: When it fails to enable a service.
+            crash_handling.UserError: When the terms of service of Google Cloud
+                Platform are not accepted yet.
         """
-
-        service_name = '/'.join(['projects', project_id, 'services', service])
-        request = self._service_usage_service.services().enable(
-            name=service_name)
         try:
-            response = request.execute(num_retries=5)
+            return request.execute(num_retries=5)
         except errors.HttpError as e:
             if e.resp.status == 400:
                 tos = 'terms of service'
@@ -67,6 +76,116 @@ class EnableServiceClient(object):
             # For all errors that are not related to ToS we want to raise
             raise e
 
+    def list_enabled_services(self, project_id: str) -> Set[str]:
+        """List the services already enabled for the given project.
+
+        Args:
+            project_id: GCP project id.
+
+        Returns:
+            Names of the enabled services. For example,
+            {"drive.googleapis.com", "compute.googleapis.com"}
+        """
+        parent = '/'.join(['projects', project_id])
+        enabled_services = set()
+        page_token = None
+        while True:
+            request = self._service_usage_service.services().list(
+                parent=parent,
+                filter='state:ENABLED',
+                pageSize=self._LIST_PAGE_SIZE,
+                pageToken=page_token)
+            response = request.execute(num_retries=5)
+            # Response format:
+            # https://cloud.google.com/service-usage/docs/reference/rest/v1/services/list
+            for service in response.get('services', []):
+                enabled_services.add(service['config']['name'])
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                return enabled_services
+
+    def enable_services_sync(self, project_id: str, services: List[str]):
+        """Enable several services for the given project at once.
+
+        The services are enabled with the batchEnable endpoint, so all of them
+        are enabled by a few long running operations which are polled together.
+
+        Args:
+            project_id: GCP project id.
+            services: Names of the services to be enabled. For example,
+                ["drive.googleapis.com", "compute.googleapis.com"]
+
+        Raises:
+            EnableServiceError: When it fails to enable the services.
+        """
+        parent = '/'.join(['projects', project_id])
+        polls = {}
+        for i in range(0, len(services), self._BATCH_ENABLE_MAX_SERVICES):
+            service_ids = services[i:i + self._BATCH_ENABLE_MAX_SERVICES]
+            request = self._service_usage_service.services().batchEnable(
+                parent=parent, body={'serviceIds': service_ids})
+            response = self._execute_enable_request(request)
+
+            # When the api call succeed, the response is an Operation object.
+            # See
+            # https://cloud.google.com/service-usage/docs/reference/rest/v1/operations
+            if 'name' not in response:
+                raise EnableServiceError(
+                    'unexpected response enabling services {}: {}'.format(
+                        service_ids, response))
+            description = 'Enabling services {}'.format(', '.join(service_ids))
+            polls[description] = self._create_operation_poll(
+                response['name'], service_ids)
+
+        self._waiter.wait_all(
+            polls,
+            deadline=self._ENABLE_SERVICE_DEADLINE,
+            expected_duration=self._ENABLE_SERVICE_EXPECTED_DURATION)
+
+    def _create_operation_poll(self, operation_name: str,
+                               service_ids: List[str]):
+        """Create a function polling a batchEnable operation.
+
+        Args:
+            operation_name: Name of the operation to poll.
+            service_ids: The services the operation enables. Used in error
+                messages.
+
+        Returns:
+            A poll function usable by operation.OperationWaiter.
+        """
+
+        def poll_operation():
+            request = self._service_usage_service.operations().get(
+                name=operation_name)
+            response = request.execute(num_retries=5)
+            if 'error' in response:
+                raise EnableServiceError(
+                    'failed to enable services {}: {}'.format(
+                        service_ids, response['error']))
+            if response.get('done'):
+                return response
+            return None
+
+        return poll_operation
+
+    def enable_service_sync(self, project_id: str, service: str):
+        """Enable a service for the given project.
+
+        Args:
+            project_id: GCP project id.
+            service: Name of the service to be enabled. For example,
+                "drive.googleapis.com"
+
+        Raises:
+            EnableServiceError: When it fails to enable a service.
+        """
+
+        service_name = '/'.join(['projects', project_id, 'services', service])
+        request = self._service_usage_service.services().enable(
+            name=service_name)
+        response = self._execute_enable_request(request)
+
         # When the api call succeed, the response is a Service object.
         # See
         # https://cloud.google.com/service-usage/docs/reference/rest/v1/services/get
@@ -75,19 +194,24 @@ class EnableServiceClient(object):
                 'unexpected response enabling service "{}": {}'.format(
                     service_name, response))
 
-        while True:
+        def poll_service():
             request = self._service_usage_service.services().get(
                 name=service_name)
             response = request.execute(num_retries=5)
             # Response format:
             # https://cloud.google.com/service-usage/docs/reference/rest/v1/Service
             if response['state'] == 'ENABLED':
-                return
+                return response
             elif response['state'] == 'DISABLED':
-                time.sleep(2)
-                continue
+                return None
             else:
                 # In 'STATE_UNSPECIFIED' state.
                 raise EnableServiceError(
                     'unexpected service status after enabling: {!r}: [{!r}]'.
-                    format(response['status'], response))
+                    format(response['state'], response))
+
+        self._waiter.wait(
+            poll_service,
+            'Enabling service "{}"'.format(service),
+            deadline=self._ENABLE_SERVICE_DEADLINE,
+            expected_duration=self._ENABLE_SERVICE_EXPECTED_DURATION)
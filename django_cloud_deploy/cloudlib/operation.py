@@ -0,0 +1,163 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Wait for long running operations of Google Cloud Platform APIs.
+
+Many admin APIs return immediately and leave the caller to poll until a
+resource is ready. Polling at a fixed short interval wastes quota on slow
+operations, so this module polls with jittered exponential backoff instead.
+"""
+
+import random
+import time
+from typing import Any, Callable, Dict, Optional
+
+
+class OperationTimeoutError(Exception):
+    """Raised when an operation does not finish before its deadline."""
+
+
+class OperationWaiter(object):
+    """Polls long running operations until they finish.
+
+    An operation is represented by a poll function. The poll function returns
+    a falsey value while the operation is still running and a non-falsey value
+    once it is done. It should raise an exception if the operation failed.
+    """
+
+    def __init__(self,
+                 initial_delay: float = 1.0,
+                 max_delay: float = 30.0,
+                 multiplier: float = 2.0,
+                 jitter: float = 0.5,
+                 sleep: Callable[[float], Any] = time.sleep,
+                 clock: Callable[[], float] = time.monotonic):
+        """Constructor of the class.
+
+        Args:
+            initial_delay: Seconds to wait after the first poll.
+            max_delay: The maximum number of seconds between two polls when
+                no expected duration is given.
+            multiplier: How much the delay grows after each poll.
+            jitter: The fraction of each delay which is randomized. 0 means
+                no randomization, 1 means any value between 0 and the delay.
+            sleep: The function used to sleep. Useful in tests.
+            clock: The function used to get the current time in seconds.
+                Useful in tests.
+        """
+        self._initial_delay = initial_delay
+        self._max_delay = max_delay
+        self._multiplier = multiplier
+        self._jitter = jitter
+        self._sleep = sleep
+        self._clock = clock
+
+    def _delays(self, expected_duration: Optional[float] = None):
+        """Yields the delays between polls.
+
+        Args:
+            expected_duration: How long the operation usually takes in seconds.
+                Operations expected to be slow are polled less often.
+
+        Yields:
+            Seconds to wait before the next poll.
+        """
+        max_delay = self._max_delay
+        if expected_duration:
+            max_delay = max(self._initial_delay, expected_duration / 10)
+        delay = self._initial_delay
+        while True:
+            delay = min(delay, max_delay)
+            yield delay * (1 - self._jitter * random.random())
+            delay *= self._multiplier
+
+    def wait(self,
+             poll: Callable[[], Any],
+             description: str = 'operation',
+             deadline: Optional[float] = None,
+             expected_duration: Optional[float] = None) -> Any:
+        """Poll a single operation until it is done.
+
+        Args:
+            poll: A function returning a falsey value while the operation is
+                running and a non-falsey value when it is done.
+            description: What the operation is about. Used in error messages.
+            deadline: Seconds to wait before giving up. By default wait
+                forever.
+            expected_duration: How long the operation usually takes in seconds.
+
+        Returns:
+            The first non-falsey value returned by the poll function.
+
+        Raises:
+            OperationTimeoutError: If the operation is not done before the
+                deadline.
+        """
+        results = self.wait_all({description: poll}, deadline,
+                                expected_duration)
+        return results[description]
+
+    def wait_all(self,
+                 polls: Dict[str, Callable[[], Any]],
+                 deadline: Optional[float] = None,
+                 expected_duration: Optional[float] = None) -> Dict[str, Any]:
+        """Poll several operations in a single loop until all of them are done.
+
+        Args:
+            polls: Poll functions of the operations, keyed by a description of
+                each operation. See wait() for the contract of poll functions.
+            deadline: Seconds to wait for each operation before giving up,
+                counted from the first poll of that operation. Operations
+                polled late in a batch get as much time as the first one. By
+                default wait forever.
+            expected_duration: How long the slowest operation usually takes in
+                seconds.
+
+        Returns:
+            The first non-falsey value returned by each poll function, keyed
+            by the same descriptions as the input.
+
+        Raises:
+            OperationTimeoutError: If some operations are not done before
+                their deadline.
+        """
+        pending = dict(polls)
+        start_times = {}
+        results = {}
+        delays = self._delays(expected_duration)
+        while True:
+            for description, poll in list(pending.items()):
+                start_times.setdefault(description, self._clock())
+                result = poll()
+                if result:
+                    results[description] = result
+                    del pending[description]
+            if not pending:
+                return results
+
+            delay = next(delays)
+            if deadline is not None:
+                now = self._clock()
+                remaining = {
+                    description: deadline - (now - start_times[description])
+                    for description in pending
+                }
+                expired = sorted(description
+                                 for description, seconds in remaining.items()
+                                 if seconds <= 0)
+                if expired:
+                    raise OperationTimeoutError(
+                        '{} not done after {} seconds.'.format(
+                            ', '.join(expired), deadline))
+                delay = min(delay, min(remaining.values()))
+            self._sleep(delay)
@@ -17,13 +17,12 @@ See https://gcloud-python.readthedocs.io/en/latest/resource-manager/api.html
 """
 
 from django_cloud_deploy import __version__
+from django_cloud_deploy.cloudlib import client_factory
 from typing import Any, Dict, List
 
 import backoff
-import google_auth_httplib2
 
 from googleapiclient import discovery
-from googleapiclient import http
 from google.auth import credentials
 from googleapiclient import errors
 
@@ -51,14 +50,10 @@ class ProjectClient(object):
 
     @classmethod
     def from_credentials(cls, credentials: credentials.Credentials):
-        auth_http = google_auth_httplib2.AuthorizedHttp(credentials)
         user_agent = '/'.join(['django-cloud-deploy', __version__.__version__])
-        http.set_user_agent(auth_http, user_agent)
         return cls(
-            discovery.build('cloudresourcemanager',
-                            'v1',
-                            http=auth_http,
-                            cache_discovery=False))
+            client_factory.build_service('cloudresourcemanager', 'v1',
+                                         credentials, user_agent))
 
     def project_exists(self, project_id: str) -> bool:
         """Returns True if the given project id exists."""
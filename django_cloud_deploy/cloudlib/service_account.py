@@ -22,6 +22,7 @@ import base64
 from typing import Any, Dict, List
 
 import backoff
+from django_cloud_deploy.cloudlib import client_factory
 from googleapiclient import discovery
 from googleapiclient import errors
 
@@ -51,14 +52,9 @@ class ServiceAccountClient(object):
     @classmethod
     def from_credentials(cls, credentials: credentials.Credentials):
         return cls(
-            discovery.build('iam',
-                            'v1',
-                            credentials=credentials,
-                            cache_discovery=False),
-            discovery.build('cloudresourcemanager',
-                            'v1',
-                            credentials=credentials,
-                            cache_discovery=False))
+            client_factory.build_service('iam', 'v1', credentials),
+            client_factory.build_service('cloudresourcemanager', 'v1',
+                                         credentials))
 
     def _get_iam_policy(self, project_id):
         request = self._cloudresourcemanager_service.projects().getIamPolicy(
@@ -95,29 +91,34 @@ class ServiceAccountClient(object):
                           errors.HttpError,
                           max_tries=5,
                           giveup=_not_conflict_code)
-    def _update_iam_policy_with_retry(self, project_id: str, member: str,
-                                      roles: List[str]) -> Dict[str, Any]:
+    def _update_iam_policy_bindings_with_retry(
+            self, project_id: str,
+            roles_by_member: Dict[str, List[str]]) -> Dict[str, Any]:
         """Try updating iam policy for at most 5 times.
 
         This function is used when changing iam policy. Most likely
         errors.HttpError with error code 409 happens when concurrent changes are
-        made to iam policy change. We might be able to make this iam change when
-        trying again. When giveup event happens, the exception is reraised.
+        made to iam policy change. The policy sent back contains the etag of the
+        policy read, so such changes are never overwritten. We might be able to
+        make this iam change when trying again. When giveup event happens, the
+        exception is reraised.
 
         Args:
             project_id: GCP project id.
-            member: Identifier for a service account in the following format:
+            roles_by_member: Roles each member should have, keyed by members
+                in the following format:
                 'serviceAccount:<service_account_id>@<project_id>.iam.gserviceaccount.com'
-            roles: Roles the service account should have. Valid roles can be
-                found on https://cloud.google.com/iam/docs/understanding-roles
+                Valid roles can be found on
+                https://cloud.google.com/iam/docs/understanding-roles
 
         Returns:
             A valid iam policy object.
         """
 
         policy = self._get_iam_policy(project_id)
-        for role in roles:
-            policy = self._generate_updated_iam_policy(policy, member, role)
+        for member, roles in roles_by_member.items():
+            for role in roles:
+                policy = self._generate_updated_iam_policy(policy, member, role)
 
         body = {'policy': policy}
         request = self._cloudresourcemanager_service.projects().setIamPolicy(
@@ -125,6 +126,23 @@ class ServiceAccountClient(object):
 
         return request.execute(num_retries=5)
 
+    def _update_iam_policy_with_retry(self, project_id: str, member: str,
+                                      roles: List[str]) -> Dict[str, Any]:
+        """Try updating iam policy of a single member for at most 5 times.
+
+        Args:
+            project_id: GCP project id.
+            member: Identifier for a service account in the following format:
+                'serviceAccount:<service_account_id>@<project_id>.iam.gserviceaccount.com'
+            roles: Roles the service account should have. Valid roles can be
+                found on https://cloud.google.com/iam/docs/understanding-roles
+
+        Returns:
+            A valid iam policy object.
+        """
+        return self._update_iam_policy_bindings_with_retry(
+            project_id, {member: roles})
+
     def create_service_account(self, project_id: str, service_account_id: str,
                                service_account_name: str, roles: List[str]):
         """Create a service account and assign it with the given roles.
@@ -143,7 +161,30 @@ class ServiceAccountClient(object):
                 account.
         """
 
-        # Create a service account without any roles
+        self.create_service_account_without_roles(project_id,
+                                                  service_account_id,
+                                                  service_account_name)
+
+        # Bind the newly created service account with given roles
+        self.grant_roles(project_id, {service_account_id: roles})
+
+    def create_service_account_without_roles(self, project_id: str,
+                                             service_account_id: str,
+                                             service_account_name: str):
+        """Create a service account, or do nothing if it already exists.
+
+        Args:
+            project_id: GCP project id.
+            service_account_id: Id of your service account. For example, a
+                service account should be in the following format:
+                <service_account_id>@<project_id>.iam.gserviceaccount.com
+            service_account_name: Display name of your service account.
+
+        Raises:
+            ServiceAccountCreationError: When it fails to create a service
+                account.
+        """
+
         resource_name = '/'.join(['projects', project_id])
         body = {
             'accountId': service_account_id,
@@ -174,18 +215,35 @@ class ServiceAccountClient(object):
                     'Service account id {} is invalid'.format(
                         service_account_id))
 
-        # Bind the newly created service account with given roles
-        member = ('serviceAccount:{}@{}.iam.gserviceaccount.com'.format(
-            service_account_id, project_id))
-        response = self._update_iam_policy_with_retry(project_id, member, roles)
+    def grant_roles(self, project_id: str,
+                    roles_by_service_account: Dict[str, List[str]]):
+        """Grant roles to service accounts with a single iam policy update.
+
+        Args:
+            project_id: GCP project id.
+            roles_by_service_account: Roles each service account should have,
+                keyed by service account id. Valid roles can be found on
+                https://cloud.google.com/iam/docs/understanding-roles
+
+        Raises:
+            ServiceAccountCreationError: When it fails to grant the roles.
+        """
+        roles_by_member = {
+            'serviceAccount:{}@{}.iam.gserviceaccount.com'.format(
+                service_account_id, project_id): roles
+            for service_account_id, roles in roles_by_service_account.items()
+        }
+        response = self._update_iam_policy_bindings_with_retry(
+            project_id, roles_by_member)
 
         # When the api call succeed, the response is a Policy object.
         # See
         # https://cloud.google.com/resource-manager/reference/rest/v1/projects/setIamPolicy
         if 'bindings' not in response:
             raise ServiceAccountCreationError(
-                ('unexpected response granting roles to service account "{}":{}'
-                 .format(service_account_id, response)))
+                ('unexpected response granting roles to service accounts '
+                 '"{}":{}'.format(', '.join(sorted(roles_by_service_account)),
+                                  response)))
 
     def create_key(self, project_id: str, service_account_id: str) -> str:
         """Create a new key of the given service account.
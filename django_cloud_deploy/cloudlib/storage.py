@@ -13,13 +13,19 @@
 # limitations under the License.
 """Manages resources of Google Cloud Storage."""
 
+import base64
+from concurrent import futures
+import hashlib
+import io
 import os
 import pathlib
-from typing import Any, Dict
+from typing import Any, Dict, List, Optional, Tuple
 
 from django.conf import settings
 from django.core import management
+from django.test import utils as test_utils
 from django_cloud_deploy import crash_handling
+from django_cloud_deploy.cloudlib import client_factory
 
 from googleapiclient import discovery
 from googleapiclient import errors
@@ -35,16 +41,26 @@ class CloudStorageError(Exception):
 class StorageClient(object):
     """A class for serving static contents for Django projects."""
 
+    # How many files are uploaded at the same time by default.
+    DEFAULT_UPLOAD_CONCURRENCY = 16
+
+    # How many failed files are listed in the error message of an upload.
+    _MAX_REPORTED_UPLOAD_ERRORS = 10
+
     def __init__(self, storage_service: discovery.Resource):
+        """Constructor of the class.
+
+        Args:
+            storage_service: The discovery resource of the storage api. Files
+                are uploaded from several threads, so its http object should
+                be thread-safe, like the ones of client_factory.
+        """
         self._storage_service = storage_service
 
     @classmethod
     def from_credentials(cls, credentials: credentials.Credentials):
         return cls(
-            discovery.build('storage',
-                            'v1',
-                            credentials=credentials,
-                            cache_discovery=False))
+            client_factory.build_service('storage', 'v1', credentials))
 
     def _bucket_exist(self, project_id: str, bucket_name: str) -> bool:
         """Returns whether the given bucket exists under the given project.
@@ -208,10 +224,19 @@ class StorageClient(object):
                     'Unexpected error setting iam policy of bucket "{}"'.format(
                         bucket_name)) from e
 
-    def _upload_file_to_object(self, local_file_path: str, bucket_name: str,
-                               object_name: str):
-        """Upload the contents of a local file to an object in a GCS bucket."""
-        media_body = http.MediaFileUpload(local_file_path)
+    def _insert_object(self, media_body: http.MediaUpload, bucket_name: str,
+                       object_name: str, source: str):
+        """Upload the content of a media upload to an object in a GCS bucket.
+
+        Args:
+            media_body: The content to upload.
+            bucket_name: Name of the bucket to upload to.
+            object_name: Name of the object to create or overwrite.
+            source: Where the content comes from. Used in error messages.
+
+        Raises:
+            CloudStorageError: When failed to upload the content.
+        """
         body = {'name': object_name}
         request = self._storage_service.objects().insert(bucket=bucket_name,
                                                          body=body,
@@ -220,8 +245,8 @@ class StorageClient(object):
             response = request.execute(num_retries=5)
             if 'name' not in response:
                 raise CloudStorageError(
-                    'Unexpected responses when uploading file "{}" to '
-                    'bucket "{}"'.format(local_file_path, bucket_name))
+                    'Unexpected responses when uploading {} to '
+                    'bucket "{}"'.format(source, bucket_name))
         except errors.HttpError as e:
             if e.resp.status == 403:
                 raise CloudStorageError(
@@ -232,34 +257,64 @@ class StorageClient(object):
                     'Bucket "{}" not found.'.format(bucket_name))
             else:
                 raise CloudStorageError(
-                    'Unexpected error when uploading file "{}" to '
-                    'bucket "{}"'.format(local_file_path, bucket_name)) from e
-
-        # http.MediaFileUpload opens a file but never closes it. So we
-        # need to manually close the file to avoid "ResourceWarning:
-        # unclosed file".
-        # TODO: Remove this line when
-        # https://github.com/googleapis/google-api-python-client/issues/575
-        # is resolved.
-        media_body.stream().close()
-
-    def upload_content(self, bucket_name: str, source_dir_path: str,
-                       gcs_dir_name: str):
-        """Upload content in the given directory to a GCS bucket.
+                    'Unexpected error when uploading {} to '
+                    'bucket "{}"'.format(source, bucket_name)) from e
+
+    def _upload_file_to_object(self, local_file_path: str, bucket_name: str,
+                               object_name: str):
+        """Upload the contents of a local file to an object in a GCS bucket."""
+        media_body = http.MediaFileUpload(local_file_path)
+        try:
+            self._insert_object(media_body, bucket_name, object_name,
+                                'file "{}"'.format(local_file_path))
+        finally:
+            # http.MediaFileUpload opens a file but never closes it. So we
+            # need to manually close the file to avoid "ResourceWarning:
+            # unclosed file".
+            # TODO: Remove this line when
+            # https://github.com/googleapis/google-api-python-client/issues/575
+            # is resolved.
+            media_body.stream().close()
+
+    def upload_string(self,
+                      bucket_name: str,
+                      object_name: str,
+                      content: str,
+                      mimetype: str = 'application/octet-stream'):
+        """Upload a string to an object in a GCS bucket.
+
+        Unlike upload_content, the content does not need to be written to a
+        local file first.
+
+        Args:
+            bucket_name: Name of the bucket you want to upload the string to.
+            object_name: Name of the object to create or overwrite, like
+                "secrets/credentials.json".
+            content: The content of the object.
+            mimetype: The content type of the object.
+
+        Raises:
+            CloudStorageError: When failed to upload the string.
+        """
+        media_body = http.MediaIoBaseUpload(io.BytesIO(content.encode('utf-8')),
+                                            mimetype=mimetype)
+        self._insert_object(media_body, bucket_name, object_name,
+                            'object "{}"'.format(object_name))
+
+    @staticmethod
+    def _list_files_to_upload(source_dir_path: str,
+                              gcs_dir_name: str) -> List[Tuple[str, str]]:
+        """List the files in the given directory and their GCS object names.
 
         Args:
-            bucket_name: Name of the bucket you want to upload static content
-                to.
             source_dir_path: Absolute path of the directory containing the
                 files you want to upload.
             gcs_dir_name: Name of root folder for files in GCS bucket.
 
-        Raises:
-            CloudStorageError: When failed to upload files.
+        Returns:
+            A list of (local absolute path, GCS object name) pairs.
         """
-
-        # The api only supports uploading a single file. So we need to iterate
-        # all files in the given directory.
+        files_to_upload = []
         for directory_absolute_path, _, files in os.walk(source_dir_path):
             directory_relative_path = os.path.relpath(directory_absolute_path,
                                                       source_dir_path)
@@ -275,8 +330,212 @@ class StorageClient(object):
                 # Local absolute path of the file
                 local_file_path = os.path.join(directory_absolute_path,
                                                filename)
-                self._upload_file_to_object(local_file_path, bucket_name,
-                                            str(gcs_object_path))
+                files_to_upload.append((local_file_path, str(gcs_object_path)))
+        return files_to_upload
+
+    def _upload_files(self,
+                      bucket_name: str,
+                      files_to_upload: List[Tuple[str, str]],
+                      concurrency: int = DEFAULT_UPLOAD_CONCURRENCY):
+        """Upload files to a GCS bucket with a pool of threads.
+
+        Args:
+            bucket_name: Name of the bucket you want to upload files to.
+            files_to_upload: A list of (local absolute path, GCS object name)
+                pairs.
+            concurrency: The maximum number of files uploaded at the same
+                time.
+
+        Raises:
+            CloudStorageError: When failed to upload files. If every failure
+                has the same cause, for example missing permission on the
+                bucket, the error of the first failed file is raised as is.
+                Otherwise the error lists the files which failed.
+        """
+        upload_errors = []
+        with futures.ThreadPoolExecutor(
+                max_workers=max(concurrency, 1)) as executor:
+            upload_futures = {
+                executor.submit(self._upload_file_to_object, local_file_path,
+                                bucket_name, object_name): local_file_path
+                for local_file_path, object_name in files_to_upload
+            }
+            for future in futures.as_completed(upload_futures):
+                try:
+                    future.result()
+                except CloudStorageError as e:
+                    upload_errors.append((upload_futures[future], e))
+
+        if not upload_errors:
+            return
+        _, first_error = upload_errors[0]
+        if len({str(e) for _, e in upload_errors}) == 1:
+            raise first_error
+        failures = '\n'.join(
+            '    {}: {}'.format(path, e)
+            for path, e in upload_errors[:self._MAX_REPORTED_UPLOAD_ERRORS])
+        raise CloudStorageError(
+            'Failed to upload {} files to bucket "{}":\n{}'.format(
+                len(upload_errors), bucket_name, failures)) from first_error
+
+    def upload_content(self,
+                       bucket_name: str,
+                       source_dir_path: str,
+                       gcs_dir_name: str,
+                       concurrency: int = DEFAULT_UPLOAD_CONCURRENCY):
+        """Upload content in the given directory to a GCS bucket.
+
+        Args:
+            bucket_name: Name of the bucket you want to upload static content
+                to.
+            source_dir_path: Absolute path of the directory containing the
+                files you want to upload.
+            gcs_dir_name: Name of root folder for files in GCS bucket.
+            concurrency: The maximum number of files uploaded at the same
+                time.
+
+        Raises:
+            CloudStorageError: When failed to upload files.
+        """
+
+        # The api only supports uploading a single file. So we upload the
+        # files in the given directory concurrently.
+        files_to_upload = self._list_files_to_upload(source_dir_path,
+                                                     gcs_dir_name)
+        self._upload_files(bucket_name, files_to_upload, concurrency)
+
+    @staticmethod
+    def _md5_hash(file_path: str) -> str:
+        """Returns the MD5 hash of a file in the format used by GCS.
+
+        Args:
+            file_path: Absolute path of the file to hash.
+
+        Returns:
+            The base64 encoded MD5 digest of the file content.
+        """
+        md5 = hashlib.md5()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(64 * 1024), b''):
+                md5.update(chunk)
+        return base64.standard_b64encode(md5.digest()).decode('utf-8')
+
+    def _list_object_hashes(self, bucket_name: str,
+                            prefix: str) -> Dict[str, Optional[str]]:
+        """List objects under the given prefix with their MD5 hashes.
+
+        Args:
+            bucket_name: Name of the bucket to list objects in.
+            prefix: Only objects whose names start with this prefix are
+                listed.
+
+        Returns:
+            A dictionary mapping object names to their base64 encoded MD5
+            hashes. Composite objects do not have an MD5 hash, in which case
+            the value is None.
+
+        Raises:
+            CloudStorageError: When it fails to list objects of the bucket.
+        """
+        object_hashes = {}
+        page_token = None
+        while True:
+            request = self._storage_service.objects().list(
+                bucket=bucket_name,
+                prefix=prefix,
+                fields='items(name,md5Hash),nextPageToken',
+                pageToken=page_token)
+            try:
+                response = request.execute(num_retries=5)
+            except errors.HttpError as e:
+                if e.resp.status == 403:
+                    raise CloudStorageError(
+                        'You do not have permission to list files in '
+                        'bucket "{}"'.format(bucket_name))
+                elif e.resp.status == 404:
+                    raise CloudStorageError(
+                        'Bucket "{}" not found.'.format(bucket_name))
+                else:
+                    raise CloudStorageError(
+                        'Unexpected error when listing files in bucket "{}"'.
+                        format(bucket_name)) from e
+            # Response format:
+            # https://cloud.google.com/storage/docs/json_api/v1/objects/list
+            for item in response.get('items', []):
+                object_hashes[item['name']] = item.get('md5Hash')
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                return object_hashes
+
+    def _delete_object(self, bucket_name: str, object_name: str):
+        """Delete an object in a GCS bucket."""
+        request = self._storage_service.objects().delete(bucket=bucket_name,
+                                                         object=object_name)
+        try:
+            request.execute(num_retries=5)
+        except errors.HttpError as e:
+            if e.resp.status == 404:
+                # The object is already gone. This is what we want.
+                return
+            raise CloudStorageError(
+                'Unexpected error when deleting file "{}" in bucket "{}"'.
+                format(object_name, bucket_name)) from e
+
+    def sync_content(self,
+                     bucket_name: str,
+                     source_dir_path: str,
+                     gcs_dir_name: str,
+                     delete_stale: bool = False,
+                     concurrency: int = DEFAULT_UPLOAD_CONCURRENCY
+                    ) -> Tuple[int, int]:
+        """Make a GCS folder match the given directory, uploading only changes.
+
+        The MD5 hash of each local file is compared with the hash GCS keeps
+        for the object with the same name. Only new files and files whose
+        content changed are uploaded.
+
+        Args:
+            bucket_name: Name of the bucket you want to sync static content
+                to.
+            source_dir_path: Absolute path of the directory containing the
+                files you want to sync.
+            gcs_dir_name: Name of root folder for files in GCS bucket.
+            delete_stale: Whether to delete objects in the GCS folder which do
+                not exist in the local directory anymore.
+            concurrency: The maximum number of files uploaded or deleted at the
+                same time.
+
+        Returns:
+            The number of uploaded files and the number of deleted files.
+
+        Raises:
+            CloudStorageError: When failed to sync files.
+        """
+        files_to_upload = self._list_files_to_upload(source_dir_path,
+                                                     gcs_dir_name)
+        remote_hashes = self._list_object_hashes(bucket_name,
+                                                 gcs_dir_name + '/')
+        changed_files = [
+            (local_file_path, object_name)
+            for local_file_path, object_name in files_to_upload
+            if remote_hashes.get(object_name) != self._md5_hash(local_file_path)
+        ]
+        self._upload_files(bucket_name, changed_files, concurrency)
+
+        stale_objects = set()
+        if delete_stale:
+            local_objects = {object_name for _, object_name in files_to_upload}
+            stale_objects = set(remote_hashes) - local_objects
+            with futures.ThreadPoolExecutor(
+                    max_workers=max(concurrency, 1)) as executor:
+                delete_futures = [
+                    executor.submit(self._delete_object, bucket_name,
+                                    object_name)
+                    for object_name in stale_objects
+                ]
+            for future in delete_futures:
+                future.result()
+        return len(changed_files), len(stale_objects)
 
     def collect_static_content(self):
         """Collect static content of the provided Django project.
@@ -286,26 +545,29 @@ class StorageClient(object):
         Raises:
             CloudStorageError: If Django environment is not correctly
                 setup.
+            crash_handling.UserError: If the static files of the project
+                cannot be collected.
         """
 
         if not settings.configured:
             raise CloudStorageError(
                 'Django environment is not setup correctly or the settings '
                 'module is invalid. We cannot collect static files.')
-        cwd = os.getcwd()
-        # Change directory to the Django project directory. If we do not do
-        # this, static content will be collected in your current directory.
-        # This is not expected.
-        os.chdir(settings.BASE_DIR)
+        # A relative STATIC_ROOT is relative to the Django project directory.
+        # It is made absolute rather than changing the working directory,
+        # which would affect the steps running in other threads.
+        static_root = settings.STATIC_ROOT
+        if static_root and not os.path.isabs(static_root):
+            static_root = os.path.join(str(settings.BASE_DIR),
+                                       os.fspath(static_root))
         try:
-            management.call_command('collectstatic',
-                                    verbosity=0,
-                                    interactive=False)
+            with test_utils.override_settings(STATIC_ROOT=static_root):
+                management.call_command('collectstatic',
+                                        verbosity=0,
+                                        interactive=False)
         except Exception as e:
             raise crash_handling.UserError(
                 'Not able to collect static files.') from e
-        finally:
-            os.chdir(cwd)
 
     def set_cors_policy(self, bucket_name: str, origin: str):
         """Make the given bucket able to serve fonts to the given origins.
@@ -12,55 +12,82 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+"""The entry point of the django-cloud-deploy command.
+
+Importing the module of a subcommand pulls in the Cloud API clients, Django
+and Kubernetes, which takes around a second. So modules are only imported for
+the subcommand being run, and "django-cloud-deploy --help" stays fast.
+"""
+
 import argparse
 import sys
+from typing import List, Optional
 import warnings
 
-import django_cloud_deploy.crash_handling
-from django_cloud_deploy.cli import cloudify
-from django_cloud_deploy.cli import manage
-from django_cloud_deploy.cli import new
-from django_cloud_deploy.cli import update
+
+def _handle_crash(err: Exception, command: str):
+    from django_cloud_deploy import crash_handling
+    crash_handling.handle_crash(err, command)
 
 
 def _update(args):
     """Update the Django project on GKE."""
+    from django_cloud_deploy.cli import update
     try:
         update.main(args)
     except Exception as e:
-        django_cloud_deploy.crash_handling.handle_crash(
-            e, 'django-cloud-deploy update')
+        _handle_crash(e, 'django-cloud-deploy update')
 
 
 def _new(args):
     """Create a new Django GKE project."""
+    from django_cloud_deploy.cli import new
     try:
         new.main(args)
     except Exception as e:
-        django_cloud_deploy.crash_handling.handle_crash(
-            e, 'django-cloud-deploy new')
+        _handle_crash(e, 'django-cloud-deploy new')
 
 
 def _cloudify(args):
     """Deploy an existing Django project."""
+    from django_cloud_deploy.cli import cloudify
     try:
         cloudify.main(args)
     except Exception as e:
-        django_cloud_deploy.crash_handling.handle_crash(
-            e, 'django-cloud-deploy cloudify')
+        _handle_crash(e, 'django-cloud-deploy cloudify')
 
 
 def _manage(args):
     """Run Django management commands."""
+    from django_cloud_deploy.cli import manage
     manage.main(args)
 
 
+def _get_subcommand(argv: List[str]) -> Optional[str]:
+    """Get the subcommand in the command line arguments.
+
+    Args:
+        argv: The command line arguments, without the program name.
+
+    Returns:
+        The first argument which is not an option, or None if there is no
+        such argument.
+    """
+    for arg in argv:
+        if not arg.startswith('-'):
+            return arg
+    return None
+
+
 def main():
     warnings.filterwarnings(
         'ignore',
         ('Your application has authenticated using end user credentials from '
          'Google Cloud SDK.'))
 
+    # Only the arguments of the subcommand being run are added to its parser,
+    # so that the modules of the other subcommands are not imported.
+    subcommand = _get_subcommand(sys.argv[1:])
     parser = argparse.ArgumentParser(description='')
     subparsers = parser.add_subparsers(title='subcommands')
     new_parser = subparsers.add_parser(
@@ -68,19 +95,25 @@ def main():
         description=('Create a new Django project and deploy it to Google '
                      'Kubernetes Engine.'))
     new_parser.set_defaults(func=_new)
-    new.add_arguments(new_parser)
+    if subcommand == 'new':
+        from django_cloud_deploy.cli import new
+        new.add_arguments(new_parser)
     update_parser = subparsers.add_parser(
         'update',
         description=('Deploys an Django project, previously created with '
                      'django_cloud_deploy, on Google Kubernetes Engine.'))
     update_parser.set_defaults(func=_update)
-    update.add_arguments(update_parser)
+    if subcommand == 'update':
+        from django_cloud_deploy.cli import update
+        update.add_arguments(update_parser)
     cloudify_parser = subparsers.add_parser(
         'cloudify',
         description=('Modifies the settings for an existing Django projects'
                      'and deploys it to the cloud.'))
     cloudify_parser.set_defaults(func=_cloudify)
-    cloudify.add_arguments(cloudify_parser)
+    if subcommand == 'cloudify':
+        from django_cloud_deploy.cli import cloudify
+        cloudify.add_arguments(cloudify_parser)
     manage_parser = subparsers.add_parser(
         'manage',
         description=('Modifies the settings for an existing Django projects'
@@ -15,7 +15,7 @@
 
 import os
 import re
-from typing import Set
+from typing import List, Set
 
 
 def parse_line(line: str) -> str:
@@ -74,3 +74,32 @@ def parse(path: str) -> Set[str]:
             else:
                 results.add(parse_line(line))
     return results
+
+
+def find_requirements_files(path: str) -> List[str]:
+    """Find a requirements.txt and all requirements files it includes.
+
+    Args:
+        path: Absolute path of a requirements.txt.
+
+    Returns:
+        Absolute paths of the given "requirements.txt" and of every existing
+        file it includes with "-r", recursively. Each path appears once.
+    """
+
+    results = []
+    pending = [path]
+    while pending:
+        path = os.path.normpath(pending.pop(0))
+        if path in results or not os.path.exists(path):
+            continue
+        results.append(path)
+        dir_path = os.path.dirname(path)
+        with open(path) as requirements_file:
+            for line in requirements_file.read().splitlines():
+                line = line.strip()
+                if line.startswith('-r'):
+                    sub_requirements_path = line.split(' ')[-1]
+                    pending.append(os.path.join(dir_path,
+                                                sub_requirements_path))
+    return results
@@ -13,6 +13,7 @@
 # limitations under the License.
 """Generate source files of a django app ready to be deployed to GKE."""
 
+import json
 import os
 import re
 import shutil
@@ -21,6 +22,8 @@ import sys
 from typing import Any, Dict, List, Optional, Set
 
 import django
+import yaml
+from django.conf import settings
 from django.core.management import utils as django_utils
 from django.utils import version
 from django_cloud_deploy import crash_handling
@@ -259,6 +262,10 @@ class _SettingsFileGenerator(_Jinja2FileGenerator):
 
     _SETTINGS_TEMPLATE_DIRECTORY = 'settings_template'
 
+    # Seconds the deployed app keeps database connections open. Connecting
+    # through the Cloud SQL proxy for every request adds noticeable latency.
+    DEFAULT_CONN_MAX_AGE = 60
+
     def generate_new(self,
                      project_id: str,
                      project_name: str,
@@ -266,7 +273,8 @@ class _SettingsFileGenerator(_Jinja2FileGenerator):
                      cloud_sql_connection: str,
                      database_name: Optional[str] = None,
                      cloud_storage_bucket_name: Optional[str] = None,
-                     file_storage_bucket_name: Optional[str] = None):
+                     file_storage_bucket_name: Optional[str] = None,
+                     conn_max_age: Optional[int] = None):
         """Create Django settings file using our template.
 
         Args:
@@ -280,8 +288,12 @@ class _SettingsFileGenerator(_Jinja2FileGenerator):
                 serve static content.
             file_storage_bucket_name: Name of the Google Cloud Storage Bucket
                 used to store files by the Django app.
+            conn_max_age: Seconds the deployed app keeps database connections
+                open to reuse them. By default DEFAULT_CONN_MAX_AGE is used.
         """
         database_name = database_name or project_name + '-db'
+        if conn_max_age is None:
+            conn_max_age = self.DEFAULT_CONN_MAX_AGE
         destination = os.path.join(
             os.path.abspath(os.path.expanduser(project_dir)), project_name)
         cloud_storage_bucket_name = cloud_storage_bucket_name or project_id
@@ -296,7 +308,8 @@ class _SettingsFileGenerator(_Jinja2FileGenerator):
             'database_name': database_name,
             'bucket_name': cloud_storage_bucket_name,
             'file_bucket_name': file_storage_bucket_name,
-            'cloud_sql_connection': cloud_sql_connection
+            'cloud_sql_connection': cloud_sql_connection,
+            'conn_max_age': conn_max_age
         }
         self._render_directory(settings_templates_dir,
                                destination,
@@ -309,7 +322,8 @@ class _SettingsFileGenerator(_Jinja2FileGenerator):
                                settings_path: str,
                                database_name: Optional[str] = None,
                                cloud_storage_bucket_name: Optional[str] = None,
-                               file_storage_bucket_name: Optional[str] = None):
+                               file_storage_bucket_name: Optional[str] = None,
+                               conn_max_age: Optional[int] = None):
         """Create Django settings file from an existing settings file.
 
         This is achieved by creating "cloud_settings.py" from our templates, and
@@ -328,8 +342,12 @@ class _SettingsFileGenerator(_Jinja2FileGenerator):
                 serve static content.
             file_storage_bucket_name: Name of the Google Cloud Storage Bucket
                 used to store files by the Django app.
+            conn_max_age: Seconds the deployed app keeps database connections
+                open to reuse them. By default DEFAULT_CONN_MAX_AGE is used.
         """
         database_name = database_name or project_name + '-db'
+        if conn_max_age is None:
+            conn_max_age = self.DEFAULT_CONN_MAX_AGE
         cloud_storage_bucket_name = cloud_storage_bucket_name or project_id
 
         cloud_settings_template = os.path.join(
@@ -349,7 +367,8 @@ class _SettingsFileGenerator(_Jinja2FileGenerator):
             'database_name': database_name,
             'bucket_name': cloud_storage_bucket_name,
             'file_bucket_name': file_storage_bucket_name,
-            'cloud_sql_connection': cloud_sql_connection
+            'cloud_sql_connection': cloud_sql_connection,
+            'conn_max_age': conn_max_age
         }
 
         settings_output_path = os.path.join(settings_dir, 'cloud_settings.py')
@@ -357,59 +376,361 @@ class _SettingsFileGenerator(_Jinja2FileGenerator):
                           settings_output_path,
                           options=options)
 
+        # cloud_settings.py installs the health check middleware defined next
+        # to it.
+        healthz_template = os.path.join(self._get_template_folder_path(),
+                                        self._SETTINGS_TEMPLATE_DIRECTORY,
+                                        'healthz.py-tpl')
+        self._render_file(healthz_template,
+                          os.path.join(settings_dir, 'healthz.py'),
+                          options=options)
+
+
+class GunicornOptions(object):
+    """Settings of the gunicorn server running the Django app.
+
+    Settings left as None take a default value, where the number of workers
+    is sized from the CPU available to the app.
+    """
+
+    WORKER_CLASSES = ('gthread', 'gevent', 'sync')
+
+    DEFAULTS = {
+        'worker_class': 'gthread',
+        'threads': 4,
+        'keepalive': 5,
+        'max_requests': 1000,
+        'max_requests_jitter': 100,
+        'preload_app': True,
+    }
+
+    def __init__(self,
+                 workers: Optional[int] = None,
+                 threads: Optional[int] = None,
+                 worker_class: Optional[str] = None,
+                 keepalive: Optional[int] = None,
+                 max_requests: Optional[int] = None,
+                 max_requests_jitter: Optional[int] = None,
+                 preload_app: Optional[bool] = None):
+        """Constructor of the class.
+
+        Args:
+            workers: The number of worker processes.
+            threads: The number of threads of each worker. Only used by the
+                "gthread" worker class.
+            worker_class: One of WORKER_CLASSES. "gevent" requires gevent to
+                be in the requirements of the project.
+            keepalive: Seconds to keep idle connections open.
+            max_requests: The number of requests a worker serves before it is
+                restarted. 0 disables restarts.
+            max_requests_jitter: The maximum random number of requests added to
+                max_requests of each worker.
+            preload_app: Whether the app is loaded before forking workers.
+        """
+        self.workers = workers
+        self.threads = threads
+        self.worker_class = worker_class
+        self.keepalive = keepalive
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.preload_app = preload_app
+
+    @staticmethod
+    def parse_cpu(quantity: str) -> float:
+        """Convert a kubernetes CPU quantity like "500m" into cores."""
+        quantity = str(quantity)
+        if quantity.endswith('m'):
+            return float(quantity[:-1]) / 1000
+        return float(quantity)
+
+    def with_defaults(self, cpus: float) -> 'GunicornOptions':
+        """Return a copy where settings left as None take the default value.
+
+        Args:
+            cpus: The number of CPU cores available to the app. The default
+                number of workers is 2 per core plus 1, as recommended by
+                gunicorn.
+
+        Returns:
+            The settings with every value set.
+        """
+        values = dict(vars(self))
+        for name, default in self.DEFAULTS.items():
+            if values[name] is None:
+                values[name] = default
+        if values['workers'] is None:
+            values['workers'] = max(2, int(2 * cpus + 1))
+        return GunicornOptions(**values)
+
+
+class _GunicornConfigGenerator(_Jinja2FileGenerator):
+    """Generate the gunicorn configuration of the Django project."""
+
+    def _generate_gunicorn_config(self, project_name: str, project_dir: str,
+                                  file_name: str, platform: str, cpus: float,
+                                  gunicorn_options: Optional[GunicornOptions]):
+        """Generate a gunicorn configuration file.
+
+        Args:
+            project_name: The name of your Django project.
+            project_dir: The destination directory path to put the file.
+            file_name: Name of the configuration file.
+            platform: Where the app is run with this configuration. Used in
+                the documentation of the file.
+            cpus: The number of CPU cores available to the app.
+            gunicorn_options: Settings of gunicorn. Settings left as None
+                take the default value.
+        """
+        gunicorn_options = gunicorn_options or GunicornOptions()
+        options = {
+            'project_name': project_name,
+            'platform': platform,
+            'cpus': '{:g}'.format(cpus),
+            'gunicorn': gunicorn_options.with_defaults(cpus)
+        }
+        template_path = os.path.join(self._get_template_folder_path(),
+                                     'gunicorn.conf.py-tpl')
+        output_path = os.path.join(project_dir, file_name)
+        self._render_file(template_path, output_path, options)
+
 
-class _DockerfileGenerator(_Jinja2FileGenerator):
+class _DockerfileGenerator(_GunicornConfigGenerator):
     """Generate Dockerfile to build image for the Django project."""
 
     _FILES = ('Dockerfile', '.dockerignore')
 
-    def generate_new(self, project_name: str, project_dir: str):
-        """Generate Dockerfile and .dockerignore.
+    # Requirements files generated by _DependencyFileGenerator for a new
+    # project.
+    _REQUIREMENTS_FILES = ('requirements.txt', 'requirements-google.txt')
+
+    GUNICORN_CONFIG = 'gunicorn.conf.py'
+
+    # The CPU limit of the app container used to size gunicorn when none is
+    # given. Matches ScalingOptions.DEFAULTS.
+    _DEFAULT_CPU_LIMIT = '1'
+
+    def generate_new(self,
+                     project_name: str,
+                     project_dir: str,
+                     requirements_files: Optional[List[str]] = None,
+                     gunicorn_options: Optional[GunicornOptions] = None,
+                     cpu_limit: Optional[str] = None):
+        """Generate Dockerfile, .dockerignore and gunicorn.conf.py.
 
         Args:
             project_name: The name of your Django project.
             project_dir: The destination directory path to put Dockerfile.
+            requirements_files: Paths of all requirements files needed to
+                install the dependencies of the project, relative to
+                project_dir. They are copied into the image before the source
+                code, so that dependencies are only installed again when they
+                change.
+            gunicorn_options: Settings of the gunicorn server in the image.
+            cpu_limit: The CPU limit of the app container, like "500m". Used
+                to size the number of gunicorn workers.
         """
         file_names = ('Dockerfile', '.dockerignore')
-        options = {'project_name': project_name}
+        options = {
+            'project_name': project_name,
+            'requirements_files': (requirements_files or
+                                   self._REQUIREMENTS_FILES)
+        }
         for file_name in file_names:
             template_path = os.path.join(self._get_template_folder_path(),
                                          file_name)
             output_path = os.path.join(project_dir, file_name)
             self._render_file(template_path, output_path, options)
+        cpus = GunicornOptions.parse_cpu(cpu_limit or self._DEFAULT_CPU_LIMIT)
+        self._generate_gunicorn_config(project_name, project_dir,
+                                       self.GUNICORN_CONFIG, 'GKE', cpus,
+                                       gunicorn_options)
+
+    def generate_from_existing(self,
+                               project_name: str,
+                               project_dir: str,
+                               gunicorn_options: Optional[
+                                   GunicornOptions] = None,
+                               cpu_limit: Optional[str] = None):
+        """Generate Dockerfile and .dockerignore for an existing project.
 
-    def generate_from_existing(self, project_name: str, project_dir: str):
+        This should be called after requirements.txt is generated.
+
+        Args:
+            project_name: The name of your Django project.
+            project_dir: The destination directory path to put Dockerfile.
+            gunicorn_options: Settings of the gunicorn server in the image.
+            cpu_limit: The CPU limit of the app container, like "500m". Used
+                to size the number of gunicorn workers.
+        """
         # TODO: Handle generation based on existing Dockerfile.
-        self.generate_new(project_name, project_dir)
+        requirements_paths = requirements_parser.find_requirements_files(
+            os.path.join(project_dir, 'requirements.txt'))
+
+        # Files outside of the project directory are not part of the docker
+        # build context and can not be copied into the image.
+        relative_paths = [
+            os.path.relpath(path, project_dir) for path in requirements_paths
+        ]
+        requirements_files = [
+            path.replace(os.sep, '/')
+            for path in relative_paths
+            if not path.startswith(os.pardir)
+        ]
+        self.generate_new(project_name, project_dir, requirements_files,
+                          gunicorn_options, cpu_limit)
+
+    def update_cpu_limit(self,
+                         project_name: str,
+                         project_dir: str,
+                         cpu_limit: str,
+                         gunicorn_options: Optional[GunicornOptions] = None):
+        """Generate gunicorn.conf.py again for a new CPU limit.
+
+        Args:
+            project_name: The name of your Django project.
+            project_dir: The directory containing gunicorn.conf.py.
+            cpu_limit: The new CPU limit of the app container, like "500m".
+            gunicorn_options: Settings of the gunicorn server in the image.
+        """
+        self._generate_gunicorn_config(project_name, project_dir,
+                                       self.GUNICORN_CONFIG, 'GKE',
+                                       GunicornOptions.parse_cpu(cpu_limit),
+                                       gunicorn_options)
 
 
-class _AppEngineFileGenerator(_Jinja2FileGenerator):
+class _AppEngineFileGenerator(_GunicornConfigGenerator):
     """Generate App Engine Files for the Django project."""
 
     _FILES = ('.gcloudignore', 'app.yaml')
 
+    GUNICORN_CONFIG = 'gunicorn-appengine.conf.py'
+
+    # The instance class used when none is given. Matches
+    # ScalingOptions.DEFAULTS.
+    _DEFAULT_INSTANCE_CLASS = 'F2'
+
+    # CPU of App Engine standard instance classes, relative to the 1.2 GHz
+    # CPU of F2 instances. See
+    # https://cloud.google.com/appengine/docs/standard/#instance_classes
+    INSTANCE_CLASS_CPUS = {
+        'F1': 0.5,
+        'F2': 1,
+        'F4': 2,
+        'F4_1G': 2,
+    }
+
+    # The number of gunicorn workers recommended by App Engine for each
+    # instance class. Used unless a number of workers is given. See
+    # https://cloud.google.com/appengine/docs/standard/python3/runtime#entrypoint_best_practices
+    INSTANCE_CLASS_WORKERS = {
+        'F1': 2,
+        'F2': 4,
+        'F4': 8,
+        'F4_1G': 8,
+    }
+
     def generate_new(self,
                      project_name: str,
                      project_dir: str,
-                     service_name: Optional[str] = 'default'):
-        """Generate app.yaml and .gcloudignore.
+                     service_name: Optional[str] = 'default',
+                     gunicorn_options: Optional[GunicornOptions] = None,
+                     instance_class: Optional[str] = None):
+        """Generate app.yaml, .gcloudignore and the gunicorn configuration.
 
         Args:
             project_name: The name of your Django project.
             project_dir: The destination directory path to put Dockerfile.
             service_name: Name of App engine services.
                 See https://cloud.google.com/appengine/docs/standard/python/an-overview-of-app-engine#services
+            gunicorn_options: Settings of the gunicorn server of the app.
+            instance_class: The App Engine instance class running the app,
+                one of INSTANCE_CLASS_CPUS. Also used to size the number of
+                gunicorn workers.
+
+        Raises:
+            ValueError: If the instance class is not supported.
         """
+        instance_class = instance_class or self._DEFAULT_INSTANCE_CLASS
+        self._check_instance_class(instance_class)
         self._generate_ignore(project_dir)
-        self._generate_yaml(project_dir, project_name, service_name)
+        self._generate_yaml(project_dir, project_name, service_name,
+                            instance_class)
         self._generate_main(project_dir, project_name)
+        self._generate_instance_gunicorn_config(project_name, project_dir,
+                                                instance_class,
+                                                gunicorn_options)
 
     def generate_from_existing(self,
                                project_name: str,
                                project_dir: str,
-                               service_name: Optional[str] = 'default'):
+                               service_name: Optional[str] = 'default',
+                               gunicorn_options: Optional[
+                                   GunicornOptions] = None,
+                               instance_class: Optional[str] = None):
         # TODO: Handle generation based on existing app.yaml
-        self.generate_new(project_name, project_dir, service_name)
+        self.generate_new(project_name, project_dir, service_name,
+                          gunicorn_options, instance_class)
+
+    def update_instance_class(
+            self,
+            project_name: str,
+            project_dir: str,
+            instance_class: str,
+            gunicorn_options: Optional[GunicornOptions] = None):
+        """Change the instance class of a generated app.yaml.
+
+        Only the instance class of app.yaml is changed, so other edits of the
+        file are kept. The gunicorn configuration is generated again to size
+        the workers for the new instance class.
+
+        Args:
+            project_name: The name of your Django project.
+            project_dir: The directory containing app.yaml.
+            instance_class: The new instance class, one of
+                INSTANCE_CLASS_CPUS.
+            gunicorn_options: Settings of the gunicorn server of the app.
+
+        Raises:
+            ValueError: If the instance class is not supported.
+        """
+        self._check_instance_class(instance_class)
+        app_yaml_path = os.path.join(project_dir, 'app.yaml')
+        with open(app_yaml_path) as app_yaml:
+            content = app_yaml.read()
+        line = 'instance_class: ' + instance_class
+        content, count = re.subn(r'^instance_class:.*$',
+                                 line,
+                                 content,
+                                 flags=re.MULTILINE)
+        if not count:
+            content = line + '\n' + content
+        with open(app_yaml_path, 'w') as app_yaml:
+            app_yaml.write(content)
+        self._generate_instance_gunicorn_config(project_name, project_dir,
+                                                instance_class,
+                                                gunicorn_options)
+
+    def _check_instance_class(self, instance_class: str):
+        if instance_class not in self.INSTANCE_CLASS_CPUS:
+            raise ValueError(
+                'Unsupported App Engine instance class "{}". Supported '
+                'instance classes are: {}'.format(
+                    instance_class, ', '.join(sorted(
+                        self.INSTANCE_CLASS_CPUS))))
+
+    def _generate_instance_gunicorn_config(
+            self, project_name: str, project_dir: str, instance_class: str,
+            gunicorn_options: Optional[GunicornOptions]):
+        """Generate the gunicorn configuration sized for an instance class."""
+        gunicorn_options = gunicorn_options or GunicornOptions()
+        if gunicorn_options.workers is None:
+            values = dict(vars(gunicorn_options))
+            values['workers'] = self.INSTANCE_CLASS_WORKERS[instance_class]
+            gunicorn_options = GunicornOptions(**values)
+        self._generate_gunicorn_config(
+            project_name, project_dir, self.GUNICORN_CONFIG,
+            'App Engine instance class ' + instance_class,
+            self.INSTANCE_CLASS_CPUS[instance_class], gunicorn_options)
 
     def _generate_main(self, project_dir: str, project_name: str):
         file_name = 'main.py-tpl'
@@ -428,10 +749,15 @@ class _AppEngineFileGenerator(_Jinja2FileGenerator):
         self._render_file(template_path, output_path)
 
     def _generate_yaml(self, project_dir: str, project_name: str,
-                       service_name: str):
+                       service_name: str, instance_class: str):
         """Generate a yaml file to define how to deploy a Django app to GAE."""
         file_name = 'app.yaml'
-        options = {'project_name': project_name, 'service_name': service_name}
+        options = {
+            'project_name': project_name,
+            'service_name': service_name,
+            'instance_class': instance_class,
+            'gunicorn_config': self.GUNICORN_CONFIG
+        }
         template_path = os.path.join(self._get_template_folder_path(),
                                      file_name)
         output_path = os.path.join(project_dir, file_name)
@@ -567,9 +893,256 @@ class _DependencyFileGenerator(_Jinja2FileGenerator):
                           options={'requirements_path': requirements_path})
 
 
+class ScalingOptions(object):
+    """Resources and autoscaling settings of a deployed Django app.
+
+    Settings left as None take the default value when generating a new yaml
+    file, and are left unchanged when updating an existing one. All settings
+    but instance_class are about GKE.
+    """
+
+    INSTANCE_CLASSES = tuple(
+        sorted(_AppEngineFileGenerator.INSTANCE_CLASS_CPUS))
+
+    # Settings about App Engine. All others are about GKE.
+    APP_ENGINE_SETTINGS = ('instance_class',)
+
+    DEFAULTS = {
+        'min_replicas': 1,
+        'max_replicas': 3,
+        'target_cpu_utilization': 70,
+        'cpu_request': '250m',
+        'memory_request': '256Mi',
+        'cpu_limit': '1',
+        'memory_limit': '512Mi',
+        'instance_class': 'F2',
+    }
+
+    def __init__(self,
+                 min_replicas: Optional[int] = None,
+                 max_replicas: Optional[int] = None,
+                 target_cpu_utilization: Optional[int] = None,
+                 cpu_request: Optional[str] = None,
+                 memory_request: Optional[str] = None,
+                 cpu_limit: Optional[str] = None,
+                 memory_limit: Optional[str] = None,
+                 instance_class: Optional[str] = None):
+        """Constructor of the class.
+
+        Args:
+            min_replicas: The minimum number of pods running the app.
+            max_replicas: The maximum number of pods running the app.
+            target_cpu_utilization: The average CPU utilization of the pods,
+                in percent of the requested CPU, the autoscaler aims for.
+            cpu_request: CPU reserved for each pod of the app, like "250m".
+            memory_request: Memory reserved for each pod of the app, like
+                "256Mi".
+            cpu_limit: The maximum CPU each pod of the app can use.
+            memory_limit: The maximum memory each pod of the app can use.
+            instance_class: The instance class running the app on App Engine,
+                one of INSTANCE_CLASSES.
+        """
+        self.min_replicas = min_replicas
+        self.max_replicas = max_replicas
+        self.target_cpu_utilization = target_cpu_utilization
+        self.cpu_request = cpu_request
+        self.memory_request = memory_request
+        self.cpu_limit = cpu_limit
+        self.memory_limit = memory_limit
+        self.instance_class = instance_class
+
+    def with_defaults(self) -> 'ScalingOptions':
+        """Return a copy where settings left as None take the default value.
+        """
+        values = {
+            name: default if getattr(self, name) is None else getattr(
+                self, name) for name, default in self.DEFAULTS.items()
+        }
+        return ScalingOptions(**values)
+
+    def get_unsupported_settings(self, backend: str) -> List[str]:
+        """Get the settings given which do not apply to a backend.
+
+        Args:
+            backend: Where the app is deployed, "gke" or "gae".
+
+        Returns:
+            Names of the settings which are not None but are about the other
+            backend.
+        """
+        on_app_engine = backend == 'gae'
+        return [
+            name for name in self.DEFAULTS
+            if getattr(self, name) is not None and
+            (name in self.APP_ENGINE_SETTINGS) != on_app_engine
+        ]
+
+
+class PgBouncerOptions(object):
+    """Settings of the PgBouncer sidecar pooling database connections on GKE.
+
+    Settings left as None take the default value.
+    """
+
+    DEFAULTS = {
+        'pool_size': 20,
+        'max_client_connections': 100,
+    }
+
+    # Port PgBouncer listens on in the pod. The Cloud SQL proxy uses 5432.
+    PORT = 6432
+
+    def __init__(self,
+                 pool_size: Optional[int] = None,
+                 max_client_connections: Optional[int] = None):
+        """Constructor of the class.
+
+        Args:
+            pool_size: The number of database connections PgBouncer opens
+                for each pod.
+            max_client_connections: The maximum number of connections the app
+                in each pod can open to PgBouncer.
+        """
+        self.pool_size = pool_size
+        self.max_client_connections = max_client_connections
+
+    def with_defaults(self) -> 'PgBouncerOptions':
+        """Return a copy where settings left as None take the default value.
+        """
+        values = {
+            name: default if getattr(self, name) is None else getattr(
+                self, name) for name, default in self.DEFAULTS.items()
+        }
+        return PgBouncerOptions(**values)
+
+
+class _YAMLTextEditor(object):
+    """Changes values in the text of a yaml file.
+
+    Only the text of the changed values is replaced, so comments, the order
+    of keys and the formatting of the rest of the file are kept. Edits are
+    recorded against the original text and applied by get_content.
+    """
+
+    def __init__(self, content: str):
+        self._content = content
+        # (start index, end index, replacement) in the original text.
+        self._edits = []
+        self._appended = []
+
+    def get_documents(self) -> List[yaml.MappingNode]:
+        """Get the mapping documents of the yaml file, as composed nodes."""
+        return [
+            document for document in yaml.compose_all(self._content,
+                                                       Loader=yaml.SafeLoader)
+            if isinstance(document, yaml.MappingNode)
+        ]
+
+    @staticmethod
+    def get_node(node: yaml.Node, *keys: str) -> Optional[yaml.Node]:
+        """Get the node at a path of keys, or None if it does not exist."""
+        for key in keys:
+            if not isinstance(node, yaml.MappingNode):
+                return None
+            for key_node, value_node in node.value:
+                if key_node.value == key:
+                    node = value_node
+                    break
+            else:
+                return None
+        return node
+
+    def set_value(self, node: yaml.MappingNode, key: str, value: Any):
+        """Set the value of a key of a mapping.
+
+        A dict value is merged into an existing block mapping key by key.
+        Missing keys are inserted with the indentation of the mapping.
+
+        Args:
+            node: The mapping to change.
+            key: The key to set.
+            value: The new value.
+        """
+        value_node = self.get_node(node, key)
+        if (isinstance(value, dict) and
+                isinstance(value_node, yaml.MappingNode) and
+                value_node.value and not value_node.flow_style):
+            for name, item in value.items():
+                self.set_value(value_node, name, item)
+        elif value_node is not None:
+            if (isinstance(value_node, yaml.ScalarNode) and
+                    not isinstance(value, dict) and
+                    value_node.value == str(value)):
+                return
+            self._edits.append(
+                (value_node.start_mark.index, value_node.end_mark.index,
+                 self._format_scalar(value, value_node.style)))
+        else:
+            self._insert_key(node, key, value)
+
+    @staticmethod
+    def _format_scalar(value: Any, style: Optional[str]) -> str:
+        """Format a value, keeping the value it replaces unquoted if it was.
+        """
+        if (not style and isinstance(value, str) and
+                yaml.safe_load(value) == value):
+            return value
+        return json.dumps(value)
+
+    def _insert_key(self, node: yaml.MappingNode, key: str, value: Any):
+        """Insert a key into a block mapping."""
+        column = node.value[0][0].start_mark.column
+        lines = yaml.safe_dump({key: value},
+                               default_flow_style=False).splitlines()
+        text = ''.join(' ' * column + line + '\n' for line in lines)
+        # Insert before a key which starts its own line. The first key of a
+        # mapping in a list shares its line with the "-".
+        for key_node, _ in node.value:
+            line_start = key_node.start_mark.index - column
+            if not self._content[line_start:key_node.start_mark.index].strip():
+                # Keep the comments above the key together with it.
+                while line_start:
+                    previous_start = self._content.rfind(
+                        '\n', 0, line_start - 1) + 1
+                    previous_line = self._content[previous_start:line_start]
+                    if not previous_line.strip().startswith('#'):
+                        break
+                    line_start = previous_start
+                self._edits.append((line_start, line_start, text))
+                return
+        # The mapping only has a key on the line of the "-", so insert after
+        # its value.
+        end = node.value[-1][1].end_mark.index
+        self._edits.append((end, end, '\n' + text.rstrip('\n')))
+
+    def append_document(self, text: str):
+        """Add a document at the end of the yaml file."""
+        self._appended.append(text)
+
+    def get_content(self) -> str:
+        """Get the text of the yaml file with every change applied."""
+        parts = []
+        position = 0
+        for start, end, replacement in sorted(self._edits,
+                                              key=lambda edit: edit[0]):
+            parts.append(self._content[position:start])
+            parts.append(replacement)
+            position = max(position, end)
+        parts.append(self._content[position:])
+        content = ''.join(parts)
+        for text in self._appended:
+            content = content.rstrip('\n') + '\n\n---\n\n' + text
+        return content
+
+
 class _YAMLFileGenerator(_Jinja2FileGenerator):
     """Generate YAML file which defines Kubernete deployment and service."""
 
+    # The API group and version of deployments. Clusters from Kubernetes 1.16
+    # do not serve deployments of "extensions/v1beta1", which older versions
+    # of this tool generated.
+    _DEPLOYMENT_API_VERSION = 'apps/v1'
+
     def generate_new(self,
                      project_dir: str,
                      project_name: str,
@@ -578,7 +1151,9 @@ class _YAMLFileGenerator(_Jinja2FileGenerator):
                      region: Optional[str] = 'us-west1',
                      image_tag: Optional[str] = None,
                      cloudsql_secrets: Optional[List[str]] = None,
-                     django_secrets: Optional[List[str]] = None):
+                     django_secrets: Optional[List[str]] = None,
+                     scaling_options: Optional[ScalingOptions] = None,
+                     pgbouncer_options: Optional[PgBouncerOptions] = None):
         """Generate YAML file which defines Kubernete deployment and service.
 
         Args:
@@ -596,6 +1171,10 @@ class _YAMLFileGenerator(_Jinja2FileGenerator):
                 container.
             django_secrets: A list of secrets needed by Django app
                 container.
+            scaling_options: Resources and autoscaling settings of the app.
+            pgbouncer_options: Settings of a PgBouncer sidecar pooling the
+                database connections of each pod. No PgBouncer is used if not
+                set.
         """
         file_name = 'project_name.yaml'
         image_tag = image_tag or '/'.join(['gcr.io', project_id, project_name])
@@ -614,7 +1193,11 @@ class _YAMLFileGenerator(_Jinja2FileGenerator):
             'cloud_sql_connection_string': cloud_sql_connection_string,
             'image_tag': image_tag,
             'cloudsql_secrets': cloudsql_secrets,
-            'django_secrets': django_secrets
+            'django_secrets': django_secrets,
+            'scaling': (scaling_options or ScalingOptions()).with_defaults(),
+            'pgbouncer': (pgbouncer_options and
+                          pgbouncer_options.with_defaults()),
+            'pgbouncer_port': PgBouncerOptions.PORT
         }
         template_path = os.path.join(self._get_template_folder_path(),
                                      file_name)
@@ -629,10 +1212,130 @@ class _YAMLFileGenerator(_Jinja2FileGenerator):
                                region: Optional[str] = 'us-west1',
                                image_tag: Optional[str] = None,
                                cloudsql_secrets: Optional[List[str]] = None,
-                               django_secrets: Optional[List[str]] = None):
+                               django_secrets: Optional[List[str]] = None,
+                               scaling_options: Optional[
+                                   ScalingOptions] = None,
+                               pgbouncer_options: Optional[
+                                   PgBouncerOptions] = None):
         # Handle generation based on existing yaml files
         self.generate_new(project_dir, project_name, project_id, instance_name,
-                          region, image_tag, cloudsql_secrets, django_secrets)
+                          region, image_tag, cloudsql_secrets, django_secrets,
+                          scaling_options, pgbouncer_options)
+
+    def update_scaling(self, project_dir: str, project_name: str,
+                       scaling_options: ScalingOptions):
+        """Change resources and autoscaling settings of a generated yaml file.
+
+        Only the changed settings are edited, so comments and other edits of
+        the file are kept. Settings of scaling_options left as None are not
+        changed. An autoscaler is added if the file does not define one yet,
+        and deployments generated for the "extensions/v1beta1" api are moved
+        to "apps/v1".
+
+        Args:
+            project_dir: The directory containing the yaml file.
+            project_name: Name of your Django project.
+            scaling_options: The settings to change.
+        """
+        path = os.path.join(project_dir, project_name + '.yaml')
+        with open(path) as yaml_file:
+            editor = _YAMLTextEditor(yaml_file.read())
+        deployment_name = None
+        has_autoscaler = False
+        for document in editor.get_documents():
+            kind = editor.get_node(document, 'kind')
+            kind = kind.value if kind is not None else None
+            if kind == 'Deployment':
+                deployment_name = editor.get_node(document, 'metadata',
+                                                  'name').value
+                self._upgrade_deployment_api_version(editor, document)
+                self._update_container_resources(editor, document,
+                                                 deployment_name,
+                                                 scaling_options)
+            elif kind == 'HorizontalPodAutoscaler':
+                has_autoscaler = True
+                target = editor.get_node(document, 'spec', 'scaleTargetRef')
+                target_kind = editor.get_node(target, 'kind')
+                if target_kind is not None and (target_kind.value
+                                                == 'Deployment'):
+                    editor.set_value(target, 'apiVersion',
+                                     self._DEPLOYMENT_API_VERSION)
+                spec = editor.get_node(document, 'spec')
+                for key, value in (
+                    ('minReplicas', scaling_options.min_replicas),
+                    ('maxReplicas', scaling_options.max_replicas),
+                    ('targetCPUUtilizationPercentage',
+                     scaling_options.target_cpu_utilization)):
+                    if value is not None:
+                        editor.set_value(spec, key, value)
+
+        if not has_autoscaler and deployment_name:
+            editor.append_document(
+                self._render_autoscaler(deployment_name,
+                                        scaling_options.with_defaults()))
+        with open(path, 'w') as yaml_file:
+            yaml_file.write(editor.get_content())
+
+    def _render_autoscaler(self, deployment_name: str,
+                           scaling_options: ScalingOptions) -> str:
+        """Render the autoscaler section of the yaml template."""
+        template_path = os.path.join(self._get_template_folder_path(),
+                                     'project_name.yaml')
+        with open(template_path) as template_file:
+            template = self._template_env.from_string(template_file.read())
+        content = template.render({
+            'project_name': deployment_name,
+            'scaling': scaling_options
+        })
+        return re.search(
+            r'^# \[START horizontal_pod_autoscaler\]$.*?'
+            r'^# \[END horizontal_pod_autoscaler\]$\n', content,
+            re.MULTILINE | re.DOTALL).group(0)
+
+    @classmethod
+    def _upgrade_deployment_api_version(cls, editor: _YAMLTextEditor,
+                                        deployment: yaml.MappingNode):
+        """Move a deployment to the api version served by current clusters.
+
+        Unlike "extensions/v1beta1", "apps/v1" requires a selector. The
+        default selector of "extensions/v1beta1" is the labels of the pod
+        template, so the same one is set.
+        """
+        api_version = editor.get_node(deployment, 'apiVersion')
+        if api_version.value == cls._DEPLOYMENT_API_VERSION:
+            return
+        editor.set_value(deployment, 'apiVersion', cls._DEPLOYMENT_API_VERSION)
+        spec = editor.get_node(deployment, 'spec')
+        if editor.get_node(spec, 'selector') is None:
+            labels = yaml.safe_load(
+                yaml.serialize(
+                    editor.get_node(spec, 'template', 'metadata', 'labels')))
+            editor.set_value(spec, 'selector', {'matchLabels': labels})
+
+    @staticmethod
+    def _update_container_resources(editor: _YAMLTextEditor,
+                                    deployment: yaml.MappingNode,
+                                    deployment_name: str,
+                                    scaling_options: ScalingOptions):
+        """Change the resources of the Django app container of a deployment.
+        """
+        resources = {}
+        for section, key, value in (
+            ('requests', 'cpu', scaling_options.cpu_request),
+            ('requests', 'memory', scaling_options.memory_request),
+            ('limits', 'cpu', scaling_options.cpu_limit),
+            ('limits', 'memory', scaling_options.memory_limit)):
+            if value is not None:
+                resources.setdefault(section, {})[key] = value
+        if not resources:
+            return
+        app_container_name = deployment_name + '-app'
+        containers = editor.get_node(deployment, 'spec', 'template', 'spec',
+                                     'containers')
+        for container in containers.value:
+            name = editor.get_node(container, 'name')
+            if name is not None and name.value == app_container_name:
+                editor.set_value(container, 'resources', resources)
 
 
 class DjangoSourceFileGenerator(_FileGenerator):
@@ -682,6 +1385,10 @@ class DjangoSourceFileGenerator(_FileGenerator):
         except Exception as e:
             raise crash_handling.UserError(
                 'Not able to import Django settings file.') from e
+        # Commands run in this process reach the database through a Cloud SQL
+        # proxy that is stopped afterwards, so connections are not kept open.
+        for database in settings.DATABASES.values():
+            database['CONN_MAX_AGE'] = 0
 
     def install_requirements(self, project_dir: str):
         """Install packages to the current environment.
@@ -720,7 +1427,11 @@ class DjangoSourceFileGenerator(_FileGenerator):
                      database_name: Optional[str] = None,
                      region: Optional[str] = 'us-west1',
                      image_tag: Optional[str] = None,
-                     service_name: Optional[str] = None):
+                     service_name: Optional[str] = None,
+                     scaling_options: Optional[ScalingOptions] = None,
+                     gunicorn_options: Optional[GunicornOptions] = None,
+                     pgbouncer_options: Optional[PgBouncerOptions] = None,
+                     conn_max_age: Optional[int] = None):
         """Generate all source files of a Django app to be deployed to GCP.
 
         Args:
@@ -750,6 +1461,14 @@ class DjangoSourceFileGenerator(_FileGenerator):
             image_tag: A customized docker image tag used in integration tests.
             service_name: Name of App engine services. This is helpful in e2e
                 test. See https://cloud.google.com/appengine/docs/standard/python/an-overview-of-app-engine#services
+            scaling_options: Resources and autoscaling settings of the app,
+                including the App Engine instance class.
+            gunicorn_options: Settings of the gunicorn server running the
+                app.
+            pgbouncer_options: Settings of a PgBouncer sidecar pooling
+                database connections on GKE. No PgBouncer is used if not set.
+            conn_max_age: Seconds the deployed app keeps database connections
+                open to reuse them.
         """
 
         project_dir = os.path.abspath(os.path.expanduser(project_dir))
@@ -767,15 +1486,24 @@ class DjangoSourceFileGenerator(_FileGenerator):
         self.django_app_generator.generate_new(app_name, project_dir)
         self.settings_file_generator.generate_new(
             project_id, project_name, project_dir, cloud_sql_connection_string,
-            database_name, cloud_storage_bucket_name, file_storage_bucket_name)
-        self.docker_file_generator.generate_new(project_name, project_dir)
+            database_name, cloud_storage_bucket_name, file_storage_bucket_name,
+            conn_max_age)
+        scaling = (scaling_options or ScalingOptions()).with_defaults()
+        self.docker_file_generator.generate_new(
+            project_name,
+            project_dir,
+            gunicorn_options=gunicorn_options,
+            cpu_limit=scaling.cpu_limit)
         self.dependency_file_generator.generate_new(project_dir)
         self.yaml_file_generator.generate_new(project_dir, project_name,
                                               project_id, instance_name, region,
                                               image_tag, cloudsql_secrets,
-                                              django_secrets)
+                                              django_secrets, scaling_options,
+                                              pgbouncer_options)
         self.app_engine_file_generator.generate_new(project_name, project_dir,
-                                                    service_name)
+                                                    service_name,
+                                                    gunicorn_options,
+                                                    scaling.instance_class)
         django_settings_path = os.path.join(project_dir, project_name,
                                             'cloud_settings.py')
         self.install_requirements(project_dir)
@@ -802,7 +1530,14 @@ class DjangoSourceFileGenerator(_FileGenerator):
                                database_name: Optional[str] = None,
                                region: Optional[str] = 'us-west1',
                                image_tag: Optional[str] = None,
-                               service_name: Optional[str] = None):
+                               service_name: Optional[str] = None,
+                               scaling_options: Optional[
+                                   ScalingOptions] = None,
+                               gunicorn_options: Optional[
+                                   GunicornOptions] = None,
+                               pgbouncer_options: Optional[
+                                   PgBouncerOptions] = None,
+                               conn_max_age: Optional[int] = None):
         """Generate all source files of a Django app to be deployed to GCP.
 
         Args:
@@ -833,6 +1568,14 @@ class DjangoSourceFileGenerator(_FileGenerator):
             image_tag: A customized docker image tag used in integration tests.
             service_name: Name of App engine services. This is helpful in e2e
                 test. See https://cloud.google.com/appengine/docs/standard/python/an-overview-of-app-engine#services
+            scaling_options: Resources and autoscaling settings of the app,
+                including the App Engine instance class.
+            gunicorn_options: Settings of the gunicorn server running the
+                app.
+            pgbouncer_options: Settings of a PgBouncer sidecar pooling
+                database connections on GKE. No PgBouncer is used if not set.
+            conn_max_age: Seconds the deployed app keeps database connections
+                open to reuse them.
         """
         project_dir = os.path.abspath(os.path.expanduser(project_dir))
         instance_name = instance_name or project_name + '-instance'
@@ -845,19 +1588,66 @@ class DjangoSourceFileGenerator(_FileGenerator):
         self.settings_file_generator.generate_from_existing(
             project_id, project_name, cloud_sql_connection_string,
             django_settings_path, database_name, cloud_storage_bucket_name,
-            file_storage_bucket_name)
-        self.docker_file_generator.generate_from_existing(
-            project_name, project_dir)
+            file_storage_bucket_name, conn_max_age)
         self.dependency_file_generator.generate_from_existing(
             project_dir, django_requirements_path)
+        scaling = (scaling_options or ScalingOptions()).with_defaults()
+        self.docker_file_generator.generate_from_existing(
+            project_name, project_dir, gunicorn_options, scaling.cpu_limit)
         self.yaml_file_generator.generate_from_existing(
             project_dir, project_name, project_id, instance_name, region,
-            image_tag, cloudsql_secrets, django_secrets)
+            image_tag, cloudsql_secrets, django_secrets, scaling_options,
+            pgbouncer_options)
         self.app_engine_file_generator.generate_from_existing(
-            project_name, project_dir, service_name)
+            project_name, project_dir, service_name, gunicorn_options,
+            scaling.instance_class)
         self.install_requirements(project_dir)
         self.setup_django_environment(project_dir=project_dir,
                                       database_user=database_user,
                                       database_password=database_password,
                                       django_settings_path=django_settings_path,
                                       cloud_sql_proxy_port=cloud_sql_proxy_port)
+
+    def update_scaling(self,
+                       project_dir: str,
+                       project_name: str,
+                       backend: str,
+                       scaling_options: ScalingOptions,
+                       gunicorn_options: Optional[GunicornOptions] = None):
+        """Change resources and autoscaling settings of a generated project.
+
+        On GKE the yaml file is updated, and gunicorn.conf.py is generated
+        again when the CPU limit changes. On App Engine app.yaml and
+        gunicorn-appengine.conf.py are updated when the instance class
+        changes.
+
+        Args:
+            project_dir: The directory containing the Django project.
+            project_name: Name of your Django project.
+            backend: Where the app is deployed, "gke" or "gae".
+            scaling_options: The settings to change. Settings left as None are
+                not changed.
+            gunicorn_options: Settings of the gunicorn server the app was
+                generated with. The gunicorn configuration is generated again
+                with them.
+
+        Raises:
+            ValueError: If some settings do not apply to the backend.
+        """
+        unsupported_settings = scaling_options.get_unsupported_settings(
+            backend)
+        if unsupported_settings:
+            raise ValueError(
+                'Settings {} do not apply to apps deployed on "{}".'.format(
+                    ', '.join(unsupported_settings), backend))
+        if backend == 'gke':
+            self.yaml_file_generator.update_scaling(project_dir, project_name,
+                                                    scaling_options)
+            if scaling_options.cpu_limit is not None:
+                self.docker_file_generator.update_cpu_limit(
+                    project_name, project_dir, scaling_options.cpu_limit,
+                    gunicorn_options)
+        elif scaling_options.instance_class is not None:
+            self.app_engine_file_generator.update_instance_class(
+                project_name, project_dir, scaling_options.instance_class,
+                gunicorn_options)
@@ -0,0 +1,44 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for the cli.io module."""
+
+from absl.testing import absltest
+
+from django_cloud_deploy.cli import io
+
+
+class LineWriterTest(absltest.TestCase):
+    """Test case for io.LineWriter."""
+
+    def setUp(self):
+        self._test_io = io.TestIO()
+
+    def test_partial_lines_are_joined(self):
+        writer = io.LineWriter(self._test_io, prefix='> ')
+        writer.write('  Applying auth.0001_initial...')
+        self.assertEqual(self._test_io.tell_calls, [])
+        writer.write(' OK\n')
+        self.assertEqual(self._test_io.tell_calls,
+                         [('>   Applying auth.0001_initial... OK',)])
+
+    def test_several_lines_and_blank_lines(self):
+        writer = io.LineWriter(self._test_io)
+        writer.write('first\n\nsecond\nthird')
+        writer.close()
+        self.assertEqual(self._test_io.tell_calls, [('first',), ('second',),
+                                                    ('third',)])
+
+
+if __name__ == '__main__':
+    absltest.main()
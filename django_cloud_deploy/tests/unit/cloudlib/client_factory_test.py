@@ -0,0 +1,137 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for the cloudlib.client_factory module."""
+
+import os
+import shutil
+import tempfile
+import threading
+from unittest import mock
+
+from absl.testing import absltest
+
+from django_cloud_deploy.cloudlib import client_factory
+
+DISCOVERY_URL = ('https://www.googleapis.com/discovery/v1/apis/storage/v1/'
+                 'rest')
+
+
+class DiscoveryCacheTest(absltest.TestCase):
+
+    def setUp(self):
+        self._directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self._directory)
+        self._cache = client_factory.DiscoveryCache(self._directory, ttl=60)
+
+    def test_get_missing(self):
+        self.assertIsNone(self._cache.get(DISCOVERY_URL))
+
+    def test_set_and_get(self):
+        self._cache.set(DISCOVERY_URL, '{"name": "storage"}')
+        self.assertEqual(self._cache.get(DISCOVERY_URL), '{"name": "storage"}')
+        self.assertIsNone(self._cache.get(DISCOVERY_URL + '?version=v2'))
+
+    def test_set_bytes(self):
+        self._cache.set(DISCOVERY_URL, b'{"name": "storage"}')
+        self.assertEqual(self._cache.get(DISCOVERY_URL), '{"name": "storage"}')
+
+    def test_expired(self):
+        self._cache.set(DISCOVERY_URL, '{"name": "storage"}')
+        (path,) = [
+            os.path.join(self._directory, name)
+            for name in os.listdir(self._directory)
+        ]
+        stale_time = os.path.getmtime(path) - 120
+        os.utime(path, (stale_time, stale_time))
+        self.assertIsNone(self._cache.get(DISCOVERY_URL))
+
+    def test_set_ignores_write_errors(self):
+        cache = client_factory.DiscoveryCache(
+            os.path.join(self._directory, 'file', 'discovery'))
+        with open(os.path.join(self._directory, 'file'), 'w') as f:
+            f.write('not a directory')
+        cache.set(DISCOVERY_URL, '{}')
+        self.assertIsNone(cache.get(DISCOVERY_URL))
+
+    def test_default_directory(self):
+        cache = client_factory.DiscoveryCache()
+        with mock.patch.dict(os.environ, {'XDG_CACHE_HOME': self._directory}):
+            cache.set(DISCOVERY_URL, '{"name": "storage"}')
+        self.assertEqual(
+            cache.directory,
+            os.path.join(self._directory, 'django-cloud-deploy', 'discovery'))
+        self.assertEqual(cache.get(DISCOVERY_URL), '{"name": "storage"}')
+
+
+class SharedHttpTest(absltest.TestCase):
+
+    def test_same_http_for_same_credentials(self):
+        credentials = mock.Mock()
+        self.assertIs(client_factory.get_http(credentials),
+                      client_factory.get_http(credentials))
+        self.assertIsNot(client_factory.get_http(credentials),
+                         client_factory.get_http(mock.Mock()))
+        self.assertIsNot(client_factory.get_http(credentials),
+                         client_factory.get_http(credentials, 'agent/1.0'))
+
+    def test_one_http_per_thread(self):
+        shared_http = client_factory.ThreadLocalAuthorizedHttp(mock.Mock())
+        main_http = shared_http._get_http()
+        self.assertIs(shared_http._get_http(), main_http)
+
+        thread_https = []
+        thread = threading.Thread(
+            target=lambda: thread_https.append(shared_http._get_http()))
+        thread.start()
+        thread.join()
+        self.assertIsNot(thread_https[0], main_http)
+
+    @mock.patch('googleapiclient.http.build_http')
+    def test_http_is_built_by_api_client(self, mock_build_http):
+        shared_http = client_factory.ThreadLocalAuthorizedHttp(mock.Mock())
+        self.assertIs(shared_http._get_http().http,
+                      mock_build_http.return_value)
+
+    def test_request_uses_http_of_thread(self):
+        shared_http = client_factory.ThreadLocalAuthorizedHttp(mock.Mock())
+        with mock.patch('google_auth_httplib2.AuthorizedHttp') as mock_http:
+            shared_http.request('https://storage.googleapis.com', 'GET')
+        mock_http.return_value.request.assert_called_once_with(
+            'https://storage.googleapis.com', 'GET')
+
+
+class BuildServiceTest(absltest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self._cache = client_factory.DiscoveryCache(directory)
+
+    @mock.patch('googleapiclient.discovery.build')
+    def test_build_with_cache(self, mock_build):
+        credentials = mock.Mock()
+        service = client_factory.build_service('storage',
+                                               'v1',
+                                               credentials,
+                                               cache=self._cache)
+        self.assertIs(service, mock_build.return_value)
+        mock_build.assert_called_once_with(
+            'storage',
+            'v1',
+            http=client_factory.get_http(credentials),
+            cache=self._cache)
+
+
+if __name__ == '__main__':
+    absltest.main()
@@ -15,11 +15,20 @@
 
 import base64
 import json
+import os
+import shutil
+import tempfile
+import threading
 from unittest import mock
 
 from absl.testing import absltest
+import docker
+import kubernetes
+import yaml
 
 from django_cloud_deploy.cloudlib import container
+from django_cloud_deploy.cloudlib import operation
+from django_cloud_deploy.skeleton import source_generator
 from django_cloud_deploy.tests.unit.cloudlib.lib import http_fake
 import google
 
@@ -164,6 +173,44 @@ class ContainerClientTestCase(absltest.TestCase):
             self.assertEqual(ca_file.read(), FAKE_CA)
         self.assertEqual(kube_config.api_key_prefix['authorization'], 'Bearer')
 
+    @mock.patch('google.auth.credentials.Credentials', autoSpec=True)
+    def test_close_removes_ca_files(self, mock_credentials):
+        mock_credentials.token = 'fake_token'
+        kube_config = self._container_client.create_kubernetes_configuration(
+            mock_credentials, PROJECT_ID, CLUSTER_NAME)
+        self.assertTrue(os.path.exists(kube_config.ssl_ca_cert))
+        self._container_client.close()
+        self.assertFalse(os.path.exists(kube_config.ssl_ca_cert))
+
+    def test_api_client_shared_per_cluster(self):
+        config1 = kubernetes.client.Configuration()
+        config1.host = 'https://12.34.56.78'
+        config2 = kubernetes.client.Configuration()
+        config2.host = 'https://12.34.56.78'
+        config2.api_key['authorization'] = 'new_token'
+        other_config = kubernetes.client.Configuration()
+        other_config.host = 'https://87.65.43.21'
+        api_client = self._container_client.get_api_client(config1)
+        self.assertIs(self._container_client.get_api_client(config2),
+                      api_client)
+        self.assertEqual(api_client.configuration.api_key['authorization'],
+                         'new_token')
+        self.assertIsNot(self._container_client.get_api_client(other_config),
+                         api_client)
+        self.assertEqual(
+            api_client.configuration.connection_pool_maxsize,
+            container.ContainerClient.DEFAULT_KUBE_CONNECTION_POOL_SIZE)
+        self._container_client.close()
+        self.assertIsNot(self._container_client.get_api_client(config1),
+                         api_client)
+
+    def test_close_api_client_without_close(self):
+        # ApiClient of kubernetes < 11 has no close method.
+        api_client = mock.Mock(spec=['rest_client'])
+        self._container_client._api_clients['https://12.34.56.78'] = api_client
+        self._container_client.close()
+        api_client.rest_client.pool_manager.clear.assert_called_once_with()
+
     @mock.patch('google.auth.credentials.Credentials', autoSpec=True)
     def test_create_kubernetes_configuration_fail(self, mock_credentials):
         mock_credentials.token = 'fake_token'
@@ -171,3 +218,456 @@ class ContainerClientTestCase(absltest.TestCase):
         with self.assertRaises(container.ClusterGetInfoError):
             self._container_client.create_kubernetes_configuration(
                 mock_credentials, PROJECT_ID, cluster_name)
+
+
+class DockerImageTest(absltest.TestCase):
+    """Test case for the docker image methods of container.ContainerClient."""
+
+    def setUp(self):
+        mock_credentials = mock.Mock(spec=google.auth.credentials.Credentials)
+        patcher = mock.patch('django_cloud_deploy.cloudlib.container.'
+                             'ContainerClient._create_docker_client')
+        self.addCleanup(patcher.stop)
+        self._create_docker_client = patcher.start()
+        self._container_client = container.ContainerClient(
+            ContainerServiceFake(), mock_credentials)
+        self._docker_client = mock.Mock()
+        self._docker_client.api.build.return_value = []
+        self._docker_client.api.push.return_value = []
+        self._container_client._docker_client = self._docker_client
+        self._build_context = tempfile.mkdtemp()
+        self._write_file('Dockerfile', 'FROM python:3')
+        self._write_file('.dockerignore', '# Comment\n**/*.pyc\n')
+        self._write_file(os.path.join('mysite', 'views.py'), 'print(1)')
+
+    def _write_file(self, relative_path, content):
+        path = os.path.join(self._build_context, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def test_docker_client_created_on_first_use(self):
+        container_client = container.ContainerClient(ContainerServiceFake(),
+                                                     mock.Mock())
+        self._create_docker_client.assert_not_called()
+
+        container_client.image_exists_locally('gcr.io/project/mysite:tag')
+        container_client.image_exists_locally('gcr.io/project/mysite:tag')
+        self._create_docker_client.assert_called_once_with()
+        docker_client = self._create_docker_client.return_value
+        self.assertEqual(docker_client.images.get.call_count, 2)
+
+    def test_digest_ignores_excluded_files(self):
+        digest = self._container_client.compute_build_context_digest(
+            self._build_context)
+        self._write_file(os.path.join('mysite', 'views.pyc'), 'bytecode')
+        self.assertEqual(
+            self._container_client.compute_build_context_digest(
+                self._build_context), digest)
+
+    def test_digest_changes_with_source(self):
+        digest = self._container_client.compute_build_context_digest(
+            self._build_context)
+        self._write_file(os.path.join('mysite', 'views.py'), 'print(2)')
+        self.assertNotEqual(
+            self._container_client.compute_build_context_digest(
+                self._build_context), digest)
+
+    def test_build_and_push_new_image(self):
+        self._docker_client.images.get_registry_data.side_effect = (
+            docker.errors.NotFound('not found'))
+        self._docker_client.images.get.side_effect = (
+            docker.errors.ImageNotFound('not found'))
+        tag = self._container_client.build_and_push_docker_image(
+            'gcr.io/project/mysite', self._build_context)
+        self.assertRegex(tag, r'^gcr.io/project/mysite:[0-9a-f]{16}$')
+        self._docker_client.api.build.assert_called_once_with(
+            path=self._build_context, tag=tag, rm=True, decode=True)
+        self._docker_client.api.push.assert_called_once_with(
+            'gcr.io/project/mysite',
+            tag=tag.split(':')[1],
+            stream=True,
+            decode=True)
+
+    def test_build_and_push_image_in_registry(self):
+        tag = self._container_client.build_and_push_docker_image(
+            'gcr.io/project/mysite', self._build_context)
+        self._docker_client.images.get_registry_data.assert_called_once_with(
+            tag)
+        self._docker_client.api.build.assert_not_called()
+        self._docker_client.api.push.assert_not_called()
+
+    def test_push_image_built_locally(self):
+        self._docker_client.images.get_registry_data.side_effect = (
+            docker.errors.NotFound('not found'))
+        tag = self._container_client.build_and_push_docker_image(
+            'gcr.io/project/mysite', self._build_context)
+        self._docker_client.api.build.assert_not_called()
+        self._docker_client.api.push.assert_called_once()
+
+    def test_build_reports_steps(self):
+        self._docker_client.api.build.return_value = [
+            {'stream': 'Step 1/2 : FROM python:3'},
+            {'stream': '\n'},
+            {'stream': ' ---> Using cache'},
+            {'stream': 'Step 2/2 : ADD . /app'},
+            {'stream': ' ---> 4b8a0c2f3f0e'},
+        ]
+        messages = []
+        self._container_client.build_docker_image('gcr.io/project/mysite',
+                                                  self._build_context,
+                                                  messages.append)
+        self.assertEqual(messages[0], 'Step 1/2 : FROM python:3 (cached)')
+        self.assertRegex(messages[1], r'^Step 2/2 : ADD . /app \(\d+.\ds\)$')
+        self.assertIn('1 of 2 steps from cache', messages[2])
+
+    def test_build_error(self):
+        self._docker_client.api.build.return_value = [
+            {'stream': 'Step 1/1 : RUN false'},
+            {'error': 'The command returned a non-zero code: 1'},
+        ]
+        with self.assertRaisesRegex(container.DockerImageError,
+                                    'non-zero code'):
+            self._container_client.build_docker_image(
+                'gcr.io/project/mysite', self._build_context)
+
+    def test_push_reports_layers(self):
+        self._docker_client.api.push.return_value = [
+            {'status': 'Preparing', 'id': 'aaa'},
+            {'status': 'Layer already exists', 'id': 'aaa'},
+            {
+                'status': 'Pushing',
+                'id': 'bbb',
+                'progressDetail': {
+                    'current': 512,
+                    'total': 2 * 1024 * 1024
+                }
+            },
+            {'status': 'Pushed', 'id': 'bbb'},
+        ]
+        messages = []
+        self._container_client.push_docker_image('gcr.io/project/mysite:abc',
+                                                 messages.append)
+        self.assertEqual(messages[0], 'Layer aaa: already exists')
+        self.assertTrue(messages[1].startswith('Layer bbb: pushed 2.0 MB'))
+        self.assertIn('2.0 MB uploaded', messages[2])
+
+    def test_push_error(self):
+        self._docker_client.api.push.return_value = [
+            {'error': 'denied: Token exchange failed'},
+        ]
+        with self.assertRaisesRegex(container.DockerImageError, 'denied'):
+            self._container_client.push_docker_image(
+                'gcr.io/project/mysite:abc')
+
+
+class DeploymentRolloutTest(absltest.TestCase):
+    """Test case for rolling updates of container.ContainerClient."""
+
+    def setUp(self):
+        mock_credentials = mock.Mock(spec=google.auth.credentials.Credentials)
+        patcher = mock.patch('django_cloud_deploy.cloudlib.container.'
+                             'ContainerClient._create_docker_client')
+        self.addCleanup(patcher.stop)
+        patcher.start()
+        patcher = mock.patch('kubernetes.client.AppsV1Api')
+        self.addCleanup(patcher.stop)
+        self._api = patcher.start().return_value
+        self._container_client = container.ContainerClient(
+            ContainerServiceFake(),
+            mock_credentials,
+            waiter=operation.OperationWaiter(sleep=lambda seconds: None))
+
+    @staticmethod
+    def _deployment(generation=2,
+                    observed_generation=2,
+                    replicas=2,
+                    updated_replicas=2,
+                    current_replicas=2,
+                    available_replicas=2,
+                    conditions=None):
+        deployment = mock.Mock()
+        deployment.metadata.generation = generation
+        deployment.spec.replicas = replicas
+        deployment.status.observed_generation = observed_generation
+        deployment.status.updated_replicas = updated_replicas
+        deployment.status.replicas = current_replicas
+        deployment.status.available_replicas = available_replicas
+        deployment.status.conditions = conditions
+        return deployment
+
+    def test_wait_for_rollout(self):
+        self._api.read_namespaced_deployment.side_effect = [
+            self._deployment(observed_generation=1),
+            self._deployment(updated_replicas=1, current_replicas=3),
+            self._deployment(current_replicas=3),
+            self._deployment(available_replicas=1),
+            self._deployment(),
+        ]
+        self._container_client.wait_for_rollout('mysite')
+        self.assertEqual(self._api.read_namespaced_deployment.call_count, 5)
+
+    def test_wait_for_rollout_progress_deadline_exceeded(self):
+        condition = mock.Mock(type='Progressing',
+                              reason='ProgressDeadlineExceeded',
+                              message='ReplicaSet has timed out progressing.')
+        self._api.read_namespaced_deployment.return_value = self._deployment(
+            updated_replicas=1, conditions=[condition])
+        with self.assertRaises(container.DeploymentRolloutError):
+            self._container_client.wait_for_rollout('mysite')
+
+
+class FakeKubernetesApiClient(object):
+    """A fake kubernetes.client.ApiClient storing objects by path."""
+
+    def __init__(self, server_side_apply=True):
+        self.configuration = kubernetes.client.Configuration()
+        self.configuration.host = 'https://12.34.56.78'
+        self.objects = {}
+        self.patched_paths = []
+        self.requests = []
+        self._server_side_apply = server_side_apply
+        self._lock = threading.Lock()
+
+    def call_api(self, path, method, body=None, header_params=None,
+                 **unused_kwargs):
+        with self._lock:
+            content_type = (header_params or {}).get('Content-Type')
+            self.requests.append((method, path, content_type))
+            if method == 'GET':
+                if path not in self.objects:
+                    raise kubernetes.client.rest.ApiException(status=404)
+                return self.objects[path]
+            if content_type == 'application/apply-patch+yaml':
+                if not self._server_side_apply:
+                    raise kubernetes.client.rest.ApiException(status=415)
+            else:
+                # The api client serializes bodies with json content types.
+                body = json.dumps(body)
+            body = json.loads(body)
+            if method == 'POST':
+                path = '/'.join([path, body['metadata']['name']])
+            elif method == 'PATCH':
+                self.patched_paths.append(path)
+            live = dict(self.objects.get(path, {}), **body)
+            # The server fills defaults and status.
+            live['status'] = {}
+            self.objects[path] = live
+            return live
+
+
+class ApplyManifestsTest(absltest.TestCase):
+    """Test case for container.ContainerClient.apply_manifests."""
+
+    def setUp(self):
+        mock_credentials = mock.Mock(spec=google.auth.credentials.Credentials)
+        patcher = mock.patch('django_cloud_deploy.cloudlib.container.'
+                             'ContainerClient._create_docker_client')
+        self.addCleanup(patcher.stop)
+        patcher.start()
+        self._container_client = container.ContainerClient(
+            ContainerServiceFake(), mock_credentials)
+        self._api_client = FakeKubernetesApiClient()
+        patcher = mock.patch.object(self._container_client,
+                                    'get_api_client',
+                                    return_value=self._api_client)
+        self.addCleanup(patcher.stop)
+        patcher.start()
+        self._manifests = [
+            {
+                'apiVersion': 'apps/v1',
+                'kind': 'Deployment',
+                'metadata': {
+                    'name': 'mysite'
+                },
+                'spec': {
+                    'replicas': 1,
+                    'template': {
+                        'spec': {
+                            'volumes': [{
+                                'name': 'cloudsql',
+                                'emptyDir': None
+                            }]
+                        }
+                    }
+                }
+            },
+            {
+                'apiVersion': 'v1',
+                'kind': 'Service',
+                'metadata': {
+                    'name': 'mysite'
+                },
+                'spec': {
+                    'type': 'LoadBalancer'
+                }
+            },
+            {
+                'apiVersion': 'v1',
+                'kind': 'Secret',
+                'metadata': {
+                    'name': 'cloudsql'
+                },
+                'data': {
+                    'username': 'cG9zdGdyZXM='
+                }
+            },
+        ]
+
+    def test_apply_new_objects(self):
+        applied = self._container_client.apply_manifests(self._manifests)
+        self.assertCountEqual(
+            applied, ['Deployment/mysite', 'Service/mysite', 'Secret/cloudsql'])
+        # Secrets are applied before the objects using them.
+        self.assertEqual(self._api_client.patched_paths[0],
+                         '/api/v1/namespaces/default/secrets/cloudsql')
+        self.assertIn(
+            '/apis/apps/v1/namespaces/default/deployments/mysite',
+            self._api_client.patched_paths)
+        self.assertIn('/api/v1/namespaces/default/services/mysite',
+                      self._api_client.patched_paths)
+
+    def test_apply_again_is_noop(self):
+        self._container_client.apply_manifests(self._manifests)
+        self._api_client.patched_paths = []
+        applied = self._container_client.apply_manifests(self._manifests)
+        self.assertEqual(applied, [])
+        self.assertEqual(self._api_client.patched_paths, [])
+
+    def test_apply_only_changed_objects(self):
+        self._container_client.apply_manifests(self._manifests)
+        self._api_client.patched_paths = []
+        self._manifests[0]['spec']['replicas'] = 3
+        applied = self._container_client.apply_manifests(self._manifests)
+        self.assertEqual(applied, ['Deployment/mysite'])
+
+    def test_apply_without_server_side_apply(self):
+        self._api_client = FakeKubernetesApiClient(server_side_apply=False)
+        self._container_client.get_api_client.return_value = self._api_client
+        applied = self._container_client.apply_manifests(self._manifests)
+        self.assertCountEqual(
+            applied, ['Deployment/mysite', 'Service/mysite', 'Secret/cloudsql'])
+        self.assertIn(('POST', '/apis/apps/v1/namespaces/default/deployments',
+                       'application/json'), self._api_client.requests)
+
+        self._api_client.requests = []
+        self._manifests[0]['spec']['replicas'] = 3
+        applied = self._container_client.apply_manifests(self._manifests)
+        self.assertEqual(applied, ['Deployment/mysite'])
+        # Server side apply is not tried again on the same cluster.
+        self.assertIn(('PATCH',
+                       '/apis/apps/v1/namespaces/default/deployments/mysite',
+                       'application/strategic-merge-patch+json'),
+                      self._api_client.requests)
+        self.assertNotIn('application/apply-patch+yaml', [
+            content_type for _, _, content_type in self._api_client.requests
+        ])
+
+
+    def test_apply_again_with_canonical_quantities(self):
+        self._manifests[0]['spec']['template']['spec']['containers'] = [{
+            'name': 'mysite-app',
+            'resources': {
+                'requests': {
+                    'cpu': '0.5',
+                    'memory': '0.5Gi'
+                },
+                'limits': {
+                    'cpu': '1000m',
+                    'memory': '1Gi'
+                }
+            }
+        }]
+        self._container_client.apply_manifests(self._manifests)
+        path = '/apis/apps/v1/namespaces/default/deployments/mysite'
+        live_container = self._api_client.objects[path]['spec']['template'][
+            'spec']['containers'][0]
+        # The server returns quantities in canonical form.
+        live_container['resources'] = {
+            'requests': {
+                'cpu': '500m',
+                'memory': '512Mi'
+            },
+            'limits': {
+                'cpu': '1',
+                'memory': '1Gi'
+            }
+        }
+        applied = self._container_client.apply_manifests(self._manifests)
+        self.assertEqual(applied, [])
+
+        self._manifests[0]['spec']['template']['spec']['containers'][0][
+            'resources']['limits']['cpu'] = '2'
+        applied = self._container_client.apply_manifests(self._manifests)
+        self.assertEqual(applied, ['Deployment/mysite'])
+
+    def test_apply_again_with_secret_string_data(self):
+        self._manifests[2]['stringData'] = {'password': 'secret'}
+        self._container_client.apply_manifests(self._manifests)
+        path = '/api/v1/namespaces/default/secrets/cloudsql'
+        # The server stores stringData base64 encoded in data.
+        live = self._api_client.objects[path]
+        del live['stringData']
+        live['data']['password'] = 'c2VjcmV0'
+        applied = self._container_client.apply_manifests(self._manifests)
+        self.assertEqual(applied, [])
+
+        self._manifests[2]['stringData'] = {'password': 'changed'}
+        applied = self._container_client.apply_manifests(self._manifests)
+        self.assertEqual(applied, ['Secret/cloudsql'])
+
+    def test_apply_unsupported_kind(self):
+        self._manifests.append({
+            'apiVersion': 'networking.k8s.io/v1',
+            'kind': 'Ingress',
+            'metadata': {
+                'name': 'mysite'
+            }
+        })
+        with self.assertRaisesRegex(ValueError, 'Ingress'):
+            self._container_client.apply_manifests(self._manifests)
+        self.assertEqual(self._api_client.requests, [])
+
+class GeneratedManifestsTest(absltest.TestCase):
+    """Test the objects of generated yaml files are sent to served apis."""
+
+    def setUp(self):
+        self._project_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self._project_dir)
+        source_generator._YAMLFileGenerator().generate_new(
+            self._project_dir, 'mysite', PROJECT_ID)
+        with open(os.path.join(self._project_dir, 'mysite.yaml')) as f:
+            self._manifests = {
+                manifest['kind']: manifest
+                for manifest in yaml.load_all(f, Loader=yaml.FullLoader)
+                if manifest
+            }
+
+    def test_object_paths(self):
+        paths = {
+            kind: container.ContainerClient._get_object_path(
+                manifest, 'default')
+            for kind, manifest in self._manifests.items()
+        }
+        self.assertEqual(
+            paths, {
+                'Deployment':
+                '/apis/apps/v1/namespaces/default/deployments/mysite',
+                'HorizontalPodAutoscaler':
+                ('/apis/autoscaling/v1/namespaces/default/'
+                 'horizontalpodautoscalers/mysite'),
+                'Service':
+                '/api/v1/namespaces/default/services/mysite',
+            })
+
+    def test_autoscaler_targets_deployment_api(self):
+        target = self._manifests['HorizontalPodAutoscaler']['spec'][
+            'scaleTargetRef']
+        self.assertEqual(target['apiVersion'],
+                         self._manifests['Deployment']['apiVersion'])
+        self.assertEqual(target['kind'], 'Deployment')
+
+    def test_deployment_selects_its_pods(self):
+        spec = self._manifests['Deployment']['spec']
+        self.assertEqual(spec['selector']['matchLabels'],
+                         spec['template']['metadata']['labels'])
@@ -0,0 +1,202 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for the cloudlib.database module."""
+
+import io
+import subprocess
+from unittest import mock
+
+from absl.testing import absltest
+
+from django_cloud_deploy import crash_handling
+from django_cloud_deploy.cloudlib import database
+
+PROJECT_ID = 'fake-project-id'
+INSTANCE_NAME = 'fake-instance'
+REGION = 'us-west1'
+
+
+class WithCloudSqlProxyTest(absltest.TestCase):
+    """Test case for DatabaseClient.with_cloud_sql_proxy."""
+
+    def setUp(self):
+        self._database_client = database.DatabaseClient(
+            sqladmin_service=mock.Mock())
+
+    @mock.patch('pexpect.popen_spawn.PopenSpawn')
+    def test_nested_contexts_share_process(self, mock_spawn):
+        with self._database_client.with_cloud_sql_proxy(
+                PROJECT_ID, INSTANCE_NAME, 'cloud_sql_proxy', REGION):
+            with self._database_client.with_cloud_sql_proxy(
+                    PROJECT_ID, INSTANCE_NAME, 'cloud_sql_proxy', REGION):
+                pass
+            mock_spawn.return_value.kill.assert_not_called()
+        self.assertEqual(mock_spawn.call_count, 1)
+        mock_spawn.return_value.kill.assert_called_once()
+
+    @mock.patch('pexpect.popen_spawn.PopenSpawn')
+    def test_sequential_contexts_start_new_process(self, mock_spawn):
+        for _ in range(2):
+            with self._database_client.with_cloud_sql_proxy(
+                    PROJECT_ID, INSTANCE_NAME, 'cloud_sql_proxy', REGION):
+                pass
+        self.assertEqual(mock_spawn.call_count, 2)
+
+    @mock.patch('pexpect.popen_spawn.PopenSpawn')
+    def test_different_ports_start_new_process(self, mock_spawn):
+        with self._database_client.with_cloud_sql_proxy(
+                PROJECT_ID, INSTANCE_NAME, 'cloud_sql_proxy', REGION, 5432):
+            with self._database_client.with_cloud_sql_proxy(
+                    PROJECT_ID, INSTANCE_NAME, 'cloud_sql_proxy', REGION,
+                    5433):
+                pass
+        self.assertEqual(mock_spawn.call_count, 2)
+
+
+class MigrateDatabaseTest(absltest.TestCase):
+    """Test case for DatabaseClient.migrate_database."""
+
+    def setUp(self):
+        self._database_client = database.DatabaseClient(
+            sqladmin_service=mock.Mock())
+
+    @mock.patch('django.core.management.call_command')
+    @mock.patch('subprocess.run')
+    @mock.patch('pexpect.popen_spawn.PopenSpawn')
+    def test_migrate_in_process(self, unused_mock_spawn, mock_run,
+                                mock_call_command):
+        stdout = io.StringIO()
+        self._database_client.migrate_database('project_dir',
+                                               PROJECT_ID,
+                                               INSTANCE_NAME,
+                                               in_process=True,
+                                               stdout=stdout)
+        mock_run.assert_not_called()
+        self.assertEqual(mock_call_command.call_args_list, [
+            mock.call('makemigrations',
+                      interactive=False,
+                      stdout=stdout,
+                      stderr=stdout),
+            mock.call('migrate', interactive=False, stdout=stdout,
+                      stderr=stdout)
+        ])
+
+    @mock.patch('django.core.management.call_command')
+    @mock.patch('pexpect.popen_spawn.PopenSpawn')
+    def test_migrate_in_running_proxy_session(self, mock_spawn,
+                                              mock_call_command):
+        self._database_client.migrate_database('project_dir', in_process=True)
+        mock_spawn.assert_not_called()
+        self.assertEqual(mock_call_command.call_count, 2)
+
+    @mock.patch('django.core.management.call_command')
+    @mock.patch('pexpect.popen_spawn.PopenSpawn')
+    def test_migrate_in_process_failed(self, unused_mock_spawn,
+                                       mock_call_command):
+        mock_call_command.side_effect = ValueError('bad migration')
+        with self.assertRaises(crash_handling.UserError):
+            self._database_client.migrate_database('project_dir',
+                                                   PROJECT_ID,
+                                                   INSTANCE_NAME,
+                                                   in_process=True)
+
+    @mock.patch('django.db.close_old_connections')
+    @mock.patch.dict('os.environ',
+                     {'DJANGO_SETTINGS_MODULE': 'mysite.settings'})
+    @mock.patch('subprocess.run')
+    @mock.patch('pexpect.popen_spawn.PopenSpawn')
+    def test_migrate_in_subprocess_failed(self, unused_mock_spawn, mock_run,
+                                          unused_mock_close):
+        mock_run.return_value = subprocess.CompletedProcess(
+            args=[], returncode=1, stdout='No module named mysite')
+        with self.assertRaisesRegex(crash_handling.UserError,
+                                    'No module named mysite'):
+            self._database_client.migrate_database('project_dir', PROJECT_ID,
+                                                   INSTANCE_NAME)
+
+
+class GetPendingMigrationsTest(absltest.TestCase):
+    """Test case for DatabaseClient.get_pending_migrations."""
+
+    def setUp(self):
+        self._database_client = database.DatabaseClient(
+            sqladmin_service=mock.Mock())
+
+    @mock.patch('django.db.migrations.state.ProjectState.from_apps')
+    @mock.patch('django.db.migrations.autodetector.MigrationAutodetector')
+    @mock.patch('django.db.migrations.executor.MigrationExecutor')
+    @mock.patch('pexpect.popen_spawn.PopenSpawn')
+    def test_pending_migrations(self, unused_mock_spawn, mock_executor,
+                                mock_autodetector, unused_mock_from_apps):
+        applied = mock.Mock(app_label='polls')
+        applied.name = '0002_choice'
+        mock_executor.return_value.migration_plan.return_value = [(applied,
+                                                                   False)]
+        generated = mock.Mock()
+        generated.name = '0003_auto'
+        mock_autodetector.return_value.changes.return_value = {
+            'polls': [generated]
+        }
+        pending = self._database_client.get_pending_migrations(
+            PROJECT_ID, INSTANCE_NAME)
+        self.assertEqual(pending, ['polls.0002_choice', 'polls.0003_auto'])
+
+    @mock.patch('django.db.migrations.state.ProjectState.from_apps')
+    @mock.patch('django.db.migrations.autodetector.MigrationAutodetector')
+    @mock.patch('django.db.migrations.executor.MigrationExecutor')
+    @mock.patch('pexpect.popen_spawn.PopenSpawn')
+    def test_no_pending_migrations(self, unused_mock_spawn, mock_executor,
+                                   mock_autodetector, unused_mock_from_apps):
+        mock_executor.return_value.migration_plan.return_value = []
+        mock_autodetector.return_value.changes.return_value = {}
+        pending = self._database_client.get_pending_migrations(
+            PROJECT_ID, INSTANCE_NAME)
+        self.assertEqual(pending, [])
+
+
+class GetLatestMigrationsTest(absltest.TestCase):
+    """Test case for DatabaseClient.get_latest_migrations."""
+
+    @mock.patch('django.db.migrations.state.ProjectState.from_apps')
+    @mock.patch('django.db.migrations.autodetector.MigrationAutodetector')
+    @mock.patch('django.db.migrations.loader.MigrationLoader')
+    @mock.patch('pexpect.popen_spawn.PopenSpawn')
+    def test_latest_migrations(self, mock_spawn, mock_loader,
+                               mock_autodetector, unused_mock_from_apps):
+        mock_loader.return_value.graph.leaf_nodes.return_value = [
+            ('polls', '0002_choice'), ('auth', '0009_alter_user_last_name')
+        ]
+        generated = mock.Mock()
+        generated.name = '0003_auto'
+        mock_autodetector.return_value.changes.return_value = {
+            'polls': [generated]
+        }
+        latest = database.DatabaseClient.get_latest_migrations()
+        self.assertEqual(latest, [
+            'auth.0009_alter_user_last_name', 'polls.0002_choice',
+            'polls.0003_auto'
+        ])
+        # The migration files are loaded without a database connection.
+        mock_loader.assert_called_once_with(None)
+        mock_spawn.assert_not_called()
+
+    @mock.patch('django.db.migrations.loader.MigrationLoader')
+    def test_latest_migrations_failed(self, mock_loader):
+        mock_loader.side_effect = ImportError('No module named polls')
+        with self.assertRaises(crash_handling.UserError):
+            database.DatabaseClient.get_latest_migrations()
+
+
+if __name__ == '__main__':
+    absltest.main()
@@ -34,11 +34,36 @@ DISABLED_SERVICE_RESPONSE = {
 
 class ServicesFake(object):
 
-    def __init__(self, query_times=1):
+    def __init__(self, query_times=1, enabled_services=()):
         self.service_to_get_count = {}
+        self.batch_enable_calls = []
+        self.enabled_services = list(enabled_services)
         self._query_times = query_times
         self._get_times = 0
 
+    def list(self, parent, filter, pageSize, pageToken=None):
+        del parent, filter
+        # Return one service per page to exercise pagination.
+        page = int(pageToken or 0)
+        response = {
+            'services': [{
+                'config': {
+                    'name': name
+                },
+                'state': 'ENABLED'
+            } for name in self.enabled_services[page:page + 1]]
+        }
+        if page + 1 < len(self.enabled_services):
+            response['nextPageToken'] = str(page + 1)
+        return http_fake.HttpRequestFake(response)
+
+    def batchEnable(self, parent, body):
+        del parent
+        self.batch_enable_calls.append(body['serviceIds'])
+        return http_fake.HttpRequestFake({
+            'name': 'operations/batch{}'.format(len(self.batch_enable_calls))
+        })
+
     def enable(self, name):
         self.service_to_get_count.setdefault(name, 0)
         return http_fake.HttpRequestFake(
@@ -54,14 +79,31 @@ class ServicesFake(object):
             return http_fake.HttpRequestFake(DISABLED_SERVICE_RESPONSE)
 
 
-class ServiceUsageFake(object):
+class OperationsFake(object):
 
     def __init__(self, query_times=1):
-        self.services_fake = ServicesFake(query_times)
+        self.operation_to_get_count = {}
+        self._query_times = query_times
+
+    def get(self, name):
+        self.operation_to_get_count[name] = (
+            self.operation_to_get_count.get(name, 0) + 1)
+        done = self.operation_to_get_count[name] >= self._query_times
+        return http_fake.HttpRequestFake({'name': name, 'done': done})
+
+
+class ServiceUsageFake(object):
+
+    def __init__(self, query_times=1, enabled_services=()):
+        self.services_fake = ServicesFake(query_times, enabled_services)
+        self.operations_fake = OperationsFake(query_times)
 
     def services(self):
         return self.services_fake
 
+    def operations(self):
+        return self.operations_fake
+
 
 class EnableServiceClientTestCase(absltest.TestCase):
     """Test case for project.ProjectClient."""
@@ -87,3 +129,33 @@ class EnableServiceClientTestCase(absltest.TestCase):
                       mock_service.services_fake.service_to_get_count)
         self.assertEqual(
             2, mock_service.services_fake.service_to_get_count[service_name])
+
+    def test_list_enabled_services(self):
+        mock_service = ServiceUsageFake(
+            enabled_services=['a.googleapis.com', 'b.googleapis.com'])
+        enable_service_client = enable_service.EnableServiceClient(mock_service)
+
+        self.assertEqual(
+            enable_service_client.list_enabled_services(PROJECT_ID),
+            {'a.googleapis.com', 'b.googleapis.com'})
+
+    def test_enable_services_in_one_batch(self):
+        services = ['a.googleapis.com', 'b.googleapis.com']
+        mock_service = ServiceUsageFake(query_times=2)
+        enable_service_client = enable_service.EnableServiceClient(mock_service)
+
+        enable_service_client.enable_services_sync(PROJECT_ID, services)
+        self.assertEqual(mock_service.services_fake.batch_enable_calls,
+                         [services])
+        self.assertEqual(
+            mock_service.operations_fake.operation_to_get_count,
+            {'operations/batch1': 2})
+
+    def test_enable_services_split_in_batches(self):
+        services = ['service{}.googleapis.com'.format(i) for i in range(25)]
+        mock_service = ServiceUsageFake()
+        enable_service_client = enable_service.EnableServiceClient(mock_service)
+
+        enable_service_client.enable_services_sync(PROJECT_ID, services)
+        self.assertEqual(mock_service.services_fake.batch_enable_calls,
+                         [services[:20], services[20:]])
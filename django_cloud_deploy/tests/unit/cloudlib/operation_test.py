@@ -0,0 +1,139 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for the cloudlib.operation module."""
+
+from absl.testing import absltest
+
+from django_cloud_deploy.cloudlib import operation
+
+
+class FakeClock(object):
+    """A clock which only advances when sleep is called."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class FakeOperation(object):
+    """An operation which is done after being polled a number of times."""
+
+    def __init__(self, polls_until_done, result='done'):
+        self.polls = 0
+        self._polls_until_done = polls_until_done
+        self._result = result
+
+    def poll(self):
+        self.polls += 1
+        if self.polls >= self._polls_until_done:
+            return self._result
+        return None
+
+
+class OperationWaiterTest(absltest.TestCase):
+    """Test case for operation.OperationWaiter."""
+
+    def setUp(self):
+        self._clock = FakeClock()
+        self._waiter = operation.OperationWaiter(initial_delay=1,
+                                                 max_delay=8,
+                                                 jitter=0,
+                                                 sleep=self._clock.sleep,
+                                                 clock=self._clock.time)
+
+    def test_wait_done_immediately(self):
+        fake_operation = FakeOperation(1)
+        self.assertEqual(self._waiter.wait(fake_operation.poll), 'done')
+        self.assertEqual(self._clock.sleeps, [])
+
+    def test_wait_exponential_backoff(self):
+        fake_operation = FakeOperation(7)
+        self._waiter.wait(fake_operation.poll)
+        self.assertEqual(fake_operation.polls, 7)
+        self.assertEqual(self._clock.sleeps, [1, 2, 4, 8, 8, 8])
+
+    def test_wait_expected_duration_raises_max_delay(self):
+        fake_operation = FakeOperation(8)
+        self._waiter.wait(fake_operation.poll, expected_duration=300)
+        self.assertEqual(self._clock.sleeps, [1, 2, 4, 8, 16, 30, 30])
+
+    def test_wait_jitter(self):
+        waiter = operation.OperationWaiter(initial_delay=4,
+                                           jitter=0.5,
+                                           sleep=self._clock.sleep,
+                                           clock=self._clock.time)
+        waiter.wait(FakeOperation(10).poll)
+        for sleep in self._clock.sleeps:
+            self.assertBetween(sleep, 2, 30)
+
+    def test_wait_deadline(self):
+        fake_operation = FakeOperation(100)
+        with self.assertRaises(operation.OperationTimeoutError):
+            self._waiter.wait(fake_operation.poll, deadline=20)
+        self.assertLessEqual(self._clock.now, 20)
+
+    def test_wait_error(self):
+
+        def poll():
+            raise ValueError('failed')
+
+        with self.assertRaises(ValueError):
+            self._waiter.wait(poll)
+
+    def test_wait_all(self):
+        fast_operation = FakeOperation(1, 'fast')
+        slow_operation = FakeOperation(3, 'slow')
+        results = self._waiter.wait_all({
+            'fast': fast_operation.poll,
+            'slow': slow_operation.poll
+        })
+        self.assertEqual(results, {'fast': 'fast', 'slow': 'slow'})
+        # Done operations are not polled again.
+        self.assertEqual(fast_operation.polls, 1)
+        self.assertEqual(slow_operation.polls, 3)
+        self.assertEqual(self._clock.sleeps, [1, 2])
+
+    def test_wait_all_deadline_per_operation(self):
+        early_polls = []
+
+        # The first poll of this operation takes 15 seconds, so the other
+        # operation is first polled 15 seconds after the call.
+        def slow_poll():
+            early_polls.append(self._clock.now)
+            if len(early_polls) == 1:
+                self._clock.now += 15
+                return None
+            return 'early'
+
+        late_operation = FakeOperation(5, 'late')
+        results = self._waiter.wait_all(
+            {
+                'early': slow_poll,
+                'late': late_operation.poll
+            }, deadline=20)
+        self.assertEqual(results, {'early': 'early', 'late': 'late'})
+        # The late operation is done 30 seconds after the call, which is
+        # within 20 seconds of its first poll.
+        self.assertEqual(self._clock.now, 30)
+
+
+if __name__ == '__main__':
+    absltest.main()
@@ -14,6 +14,7 @@
 """Tests for the cloudlib.service_account module."""
 
 import base64
+import copy
 from unittest import mock
 
 from absl.testing import absltest
@@ -189,6 +190,43 @@ class ServiceAccountClientTestCase(absltest.TestCase):
         policy = self._cloudresourcemanager_fake.projects_fake.iam_policy
         self.assertIn(member, policy['bindings'][0]['members'])
 
+    def test_create_service_account_without_roles(self):
+        service_account_id = 'test_create_service_account_without_roles'
+        with mock.patch.object(self._cloudresourcemanager_fake.projects_fake,
+                               'setIamPolicy') as set_iam_policy:
+            self._service_account_client.create_service_account_without_roles(
+                PROJECT_ID, service_account_id, 'Test Service Account')
+
+        all_service_accounts = (self._iam_service_fake.projects_fake.
+                                service_accounts_fake.service_accounts)
+        self.assertIn(service_account_id, all_service_accounts)
+        set_iam_policy.assert_not_called()
+
+    def test_grant_roles_single_policy_update(self):
+        new_role = 'roles/new_fake_role'
+        projects_fake = self._cloudresourcemanager_fake.projects_fake
+        projects_fake.iam_policy = copy.deepcopy(FAKE_IAM_POLICY)
+        with mock.patch.object(projects_fake,
+                               'setIamPolicy',
+                               wraps=projects_fake.setIamPolicy) as set_policy:
+            self._service_account_client.grant_roles(PROJECT_ID, {
+                'account1': [FAKE_ROLE],
+                'account2': [FAKE_ROLE, new_role],
+            })
+        self.assertEqual(set_policy.call_count, 1)
+
+        members = {
+            binding['role']: binding['members']
+            for binding in projects_fake.iam_policy['bindings']
+        }
+        member1 = 'serviceAccount:account1@{}.iam.gserviceaccount.com'.format(
+            PROJECT_ID)
+        member2 = 'serviceAccount:account2@{}.iam.gserviceaccount.com'.format(
+            PROJECT_ID)
+        self.assertIn(member1, members[FAKE_ROLE])
+        self.assertIn(member2, members[FAKE_ROLE])
+        self.assertEqual(members[new_role], [member2])
+
     def test_create_service_account_invalid_arguments(self):
         service_account_id = 'invalid'
         service_account_name = 'Invalid'
@@ -13,10 +13,15 @@
 # limitations under the License.
 """Tests for the cloudlib.storage module."""
 
+import base64
+import hashlib
 import os
+import pathlib
 import tempfile
+from unittest import mock
 
 from absl.testing import absltest
+from django_cloud_deploy.cloudlib import client_factory
 from django_cloud_deploy.cloudlib import storage
 from django_cloud_deploy.tests.unit.cloudlib.lib import http_fake
 from googleapiclient import errors
@@ -48,9 +53,31 @@ class ObjectsFake(object):
 
     def __init__(self):
         self.bucket_files = {}
+        self.object_hashes = {}
+        self.deleted_objects = []
+
+    def list(self, bucket, prefix, fields, pageToken=None):
+        del fields, pageToken
+        items = [{
+            'name': name,
+            'md5Hash': md5_hash
+        } for name, md5_hash in self.object_hashes.get(bucket, {}).items()
+                 if name.startswith(prefix)]
+        return http_fake.HttpRequestFake({'items': items})
+
+    def delete(self, bucket, object):
+        self.deleted_objects.append(object)
+        self.object_hashes.get(bucket, {}).pop(object, None)
+        return http_fake.HttpRequestFake({})
 
     def insert(self, bucket, body, media_body):
         del media_body
+        if 'no_permission' in bucket:
+            return http_fake.HttpRequestFake(
+                errors.HttpError(http_fake.HttpResponseFake(403),
+                                 b'permission denied'))
+        elif 'invalid' in body['name']:
+            return http_fake.HttpRequestFake({'invalid': 'response'})
         if bucket not in self.bucket_files:
             self.bucket_files[bucket] = []
         self.bucket_files[bucket].append(body['name'])
@@ -120,6 +147,14 @@ class StorageClientTest(absltest.TestCase):
         self._storage_client = (storage.StorageClient(
             self._storage_service_fake))
 
+    @mock.patch('googleapiclient.discovery.build')
+    def test_from_credentials_thread_safe_http(self, mock_build):
+        # Files are uploaded from several threads, so the storage service
+        # must use an http object with one connection per thread.
+        storage.StorageClient.from_credentials(mock.Mock())
+        http = mock_build.call_args[1]['http']
+        self.assertIsInstance(http, client_factory.ThreadLocalAuthorizedHttp)
+
     def test_create_bucket_success(self):
         self._storage_client.create_bucket(PROJECT_ID, BUCKET_NAME)
         self.assertIn(BUCKET_NAME, self._storage_service_fake.buckets().buckets)
@@ -190,3 +225,136 @@ class StorageClientTest(absltest.TestCase):
             self.assertIn(
                 file2_gcs_path,
                 self._storage_service_fake.objects().bucket_files[BUCKET_NAME])
+
+    def _create_static_files(self, directory, file_names):
+        for file_name in file_names:
+            with open(os.path.join(directory, file_name), 'w') as tmp_file:
+                tmp_file.write(file_name)
+
+    def test_upload_static_content_concurrently(self):
+        file_names = ['file{}'.format(i) for i in range(50)]
+        with tempfile.TemporaryDirectory() as tmp_dir_root:
+            self._create_static_files(tmp_dir_root, file_names)
+            self._storage_client.upload_content(BUCKET_NAME,
+                                                tmp_dir_root,
+                                                'static',
+                                                concurrency=8)
+        self.assertCountEqual(
+            self._storage_service_fake.objects().bucket_files[BUCKET_NAME],
+            ['static/' + file_name for file_name in file_names])
+
+    def test_upload_static_content_no_permission(self):
+        with tempfile.TemporaryDirectory() as tmp_dir_root:
+            self._create_static_files(tmp_dir_root, ['file1', 'file2'])
+            with self.assertRaisesRegex(storage.CloudStorageError,
+                                        'do not have permission'):
+                self._storage_client.upload_content('bucket_no_permission',
+                                                    tmp_dir_root, 'static')
+
+    def test_upload_static_content_aggregate_errors(self):
+        with tempfile.TemporaryDirectory() as tmp_dir_root:
+            self._create_static_files(tmp_dir_root,
+                                      ['invalid1', 'invalid2', 'valid'])
+            with self.assertRaisesRegex(storage.CloudStorageError,
+                                        'Failed to upload 2 files'):
+                self._storage_client.upload_content(BUCKET_NAME, tmp_dir_root,
+                                                    'static')
+
+    def test_upload_string(self):
+        with mock.patch.object(self._storage_service_fake.objects(),
+                               'insert',
+                               wraps=self._storage_service_fake.objects().
+                               insert) as insert:
+            self._storage_client.upload_string(BUCKET_NAME,
+                                               'secrets/cloudsql.json',
+                                               '{"username": "admin"}',
+                                               mimetype='application/json')
+        self.assertEqual(
+            self._storage_service_fake.objects().bucket_files[BUCKET_NAME],
+            ['secrets/cloudsql.json'])
+        media_body = insert.call_args[1]['media_body']
+        self.assertEqual(media_body.mimetype(), 'application/json')
+        self.assertEqual(media_body.getbytes(0, media_body.size()),
+                         b'{"username": "admin"}')
+
+    def test_upload_string_no_permission(self):
+        with self.assertRaisesRegex(storage.CloudStorageError,
+                                    'do not have permission'):
+            self._storage_client.upload_string('bucket_no_permission',
+                                               'secrets/cloudsql.json', '{}')
+
+    @mock.patch.object(storage.test_utils, 'override_settings')
+    @mock.patch.object(storage.management, 'call_command')
+    def test_collect_static_content(self, mock_call_command,
+                                    mock_override_settings):
+        mock_settings = mock.Mock(configured=True,
+                                  BASE_DIR=pathlib.Path('/fake/project'),
+                                  STATIC_ROOT='static')
+        cwd = os.getcwd()
+        with mock.patch.object(storage, 'settings', mock_settings):
+            self._storage_client.collect_static_content()
+        self.assertEqual(os.getcwd(), cwd)
+        mock_override_settings.assert_called_once_with(
+            STATIC_ROOT='/fake/project/static')
+        mock_call_command.assert_called_once_with('collectstatic',
+                                                  verbosity=0,
+                                                  interactive=False)
+
+    @mock.patch.object(storage.test_utils, 'override_settings')
+    @mock.patch.object(storage.management, 'call_command')
+    def test_collect_static_content_absolute_static_root(
+            self, mock_call_command, mock_override_settings):
+        mock_settings = mock.Mock(configured=True,
+                                  BASE_DIR='/fake/project',
+                                  STATIC_ROOT='/var/www/static')
+        with mock.patch.object(storage, 'settings', mock_settings):
+            self._storage_client.collect_static_content()
+        mock_override_settings.assert_called_once_with(
+            STATIC_ROOT='/var/www/static')
+        mock_call_command.assert_called_once()
+
+    @mock.patch.object(storage.test_utils, 'override_settings')
+    @mock.patch.object(storage.management, 'call_command')
+    def test_collect_static_content_fail(self, mock_call_command,
+                                         mock_override_settings):
+        del mock_override_settings
+        mock_settings = mock.Mock(configured=True,
+                                  BASE_DIR='/fake/project',
+                                  STATIC_ROOT=None)
+        mock_call_command.side_effect = Exception('No STATIC_ROOT')
+        with mock.patch.object(storage, 'settings', mock_settings):
+            with self.assertRaises(storage.crash_handling.UserError):
+                self._storage_client.collect_static_content()
+
+    def test_sync_static_content_uploads_changed_files(self):
+        with tempfile.TemporaryDirectory() as tmp_dir_root:
+            self._create_static_files(tmp_dir_root,
+                                      ['unchanged', 'changed', 'new'])
+            unchanged_hash = base64.standard_b64encode(
+                hashlib.md5(b'unchanged').digest()).decode('utf-8')
+            self._storage_service_fake.objects().object_hashes[BUCKET_NAME] = {
+                'static/unchanged': unchanged_hash,
+                'static/changed': 'outdated_hash',
+                'static/stale': 'stale_hash',
+            }
+            uploaded, deleted = self._storage_client.sync_content(
+                BUCKET_NAME, tmp_dir_root, 'static')
+        self.assertEqual((uploaded, deleted), (2, 0))
+        self.assertCountEqual(
+            self._storage_service_fake.objects().bucket_files[BUCKET_NAME],
+            ['static/changed', 'static/new'])
+        self.assertEqual(self._storage_service_fake.objects().deleted_objects,
+                         [])
+
+    def test_sync_static_content_delete_stale(self):
+        with tempfile.TemporaryDirectory() as tmp_dir_root:
+            self._create_static_files(tmp_dir_root, ['new'])
+            self._storage_service_fake.objects().object_hashes[BUCKET_NAME] = {
+                'static/stale': 'stale_hash',
+                'other/not_synced': 'other_hash',
+            }
+            uploaded, deleted = self._storage_client.sync_content(
+                BUCKET_NAME, tmp_dir_root, 'static', delete_stale=True)
+        self.assertEqual((uploaded, deleted), (1, 1))
+        self.assertEqual(self._storage_service_fake.objects().deleted_objects,
+                         ['static/stale'])
@@ -0,0 +1,139 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Unit test for django_cloud_deploy/django_cloud_deploy.py."""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from typing import Any, Dict, List
+
+from absl.testing import absltest
+
+import django_cloud_deploy
+
+# Modules which are slow to import, and only needed by some subcommands.
+_HEAVY_MODULES = frozenset([
+    'django',
+    'docker',
+    'googleapiclient',
+    'jinja2',
+    'kubernetes',
+])
+
+# The time "django-cloud-deploy --help" may spend importing the entry point. It
+# is well above the expected time so that the test is not flaky on slow
+# machines.
+_HELP_IMPORT_TIME_BUDGET_SECONDS = 1.0
+
+# Runs the entry point and writes the modules it imported, and how long
+# importing the entry point took, to the file given as first argument. The
+# file is written at exit, because "--help" and failing commands exit early.
+_RUN_ENTRY_POINT = """
+import atexit
+import json
+import sys
+import time
+
+output_path = sys.argv[1]
+sys.argv = ['django-cloud-deploy'] + sys.argv[2:]
+start_time = time.perf_counter()
+from django_cloud_deploy import django_cloud_deploy
+import_seconds = time.perf_counter() - start_time
+
+
+def write_output():
+    with open(output_path, 'w') as output_file:
+        json.dump({'modules': sorted(sys.modules),
+                   'import_seconds': import_seconds}, output_file)
+
+
+atexit.register(write_output)
+django_cloud_deploy.main()
+"""
+
+
+def _run_entry_point(argv: List[str]) -> Dict[str, Any]:
+    """Run the entry point in a new python process.
+
+    Args:
+        argv: The command line arguments, without the program name.
+
+    Returns:
+        A dict with the names of the modules imported by the process in
+        "modules", and the seconds spent importing the entry point in
+        "import_seconds".
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.path.dirname(
+        os.path.dirname(os.path.abspath(django_cloud_deploy.__file__)))
+    with tempfile.TemporaryDirectory() as temp_dir:
+        output_path = os.path.join(temp_dir, 'output.json')
+        subprocess.run(
+            [sys.executable, '-c', _RUN_ENTRY_POINT, output_path] + argv,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            stdin=subprocess.DEVNULL,
+            env=env,
+            cwd=temp_dir,
+            universal_newlines=True)
+        with open(output_path) as output_file:
+            return json.load(output_file)
+
+
+class ImportTest(absltest.TestCase):
+    """Make sure subcommands only import what they need."""
+
+    def assertNotImported(self, modules: List[str], module_names: List[str]):
+        imported = sorted(
+            name for name in modules
+            if any(name == module_name or name.startswith(module_name + '.')
+                   for module_name in module_names))
+        self.assertEqual(imported, [])
+
+    def test_help(self):
+        output = _run_entry_point(['--help'])
+        self.assertIn('django_cloud_deploy.django_cloud_deploy',
+                      output['modules'])
+        self.assertNotImported(
+            output['modules'],
+            list(_HEAVY_MODULES) + ['django_cloud_deploy.cli'])
+        self.assertLess(output['import_seconds'],
+                        _HELP_IMPORT_TIME_BUDGET_SECONDS)
+
+    def test_subcommand_help(self):
+        output = _run_entry_point(['update', '--help'])
+        self.assertIn('django_cloud_deploy.cli.update', output['modules'])
+        self.assertNotImported(output['modules'], [
+            'django_cloud_deploy.cli.cloudify',
+            'django_cloud_deploy.cli.manage',
+            'django_cloud_deploy.cli.new',
+        ])
+
+    def test_manage(self):
+        # The command fails because the temporary directory it runs in is not
+        # a deployed Django project, after its module is imported.
+        output = _run_entry_point(['manage', 'migrate'])
+        self.assertIn('django_cloud_deploy.cli.manage', output['modules'])
+        self.assertNotImported(output['modules'], [
+            'django',
+            'docker',
+            'kubernetes',
+            'django_cloud_deploy.workflow',
+        ])
+
+
+if __name__ == '__main__':
+    absltest.main()
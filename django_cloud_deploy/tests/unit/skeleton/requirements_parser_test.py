@@ -99,3 +99,24 @@ class RequirementsParserTest(unittest.TestCase):
         for requirement in requirements:
             self.assertIn(requirement, results)
         self.assertEqual(len(requirements), len(results))
+
+
+    def test_find_requirements_files(self):
+        os.mkdir(os.path.join(self._project_dir, 'requirements'))
+        files = {
+            'requirements.txt': ['-r requirements/base.txt', 'six'],
+            os.path.join('requirements', 'base.txt'):
+            ['-r ../requirements-google.txt', 'Django<=7.8'],
+            'requirements-google.txt': ['-r requirements.txt', 'backoff'],
+        }
+        for relative_path, lines in files.items():
+            with open(os.path.join(self._project_dir, relative_path),
+                      'wt') as f:
+                f.write('\n'.join(lines))
+        results = requirements_parser.find_requirements_files(
+            os.path.join(self._project_dir, 'requirements.txt'))
+        self.assertEqual(results, [
+            os.path.join(self._project_dir, 'requirements.txt'),
+            os.path.join(self._project_dir, 'requirements', 'base.txt'),
+            os.path.join(self._project_dir, 'requirements-google.txt'),
+        ])
@@ -21,6 +21,7 @@ import unittest
 
 from absl.testing import absltest
 from django.core import management
+import yaml
 
 from django_cloud_deploy.skeleton import source_generator
 
@@ -235,6 +236,37 @@ class SettingsFileGeneratorTest(FileGeneratorTest):
         # Test remote settings does not use DEBUG mode
         self.assertEqual(getattr(module, 'DEBUG'), False)
 
+        # Test remote settings reuse database connections
+        database = getattr(module, 'DATABASES')['default']
+        self.assertEqual(database['CONN_MAX_AGE'], 60)
+        self.assertIs(database['CONN_HEALTH_CHECKS'], True)
+        self.assertIs(database['DISABLE_SERVER_SIDE_CURSORS'], False)
+
+        # Test health checks are answered before any other middleware
+        middleware = getattr(module, 'MIDDLEWARE')
+        self.assertEqual(middleware[0],
+                         project_name + '.healthz.HealthCheckMiddleware')
+        self.assertIn('django.contrib.sessions.middleware.SessionMiddleware',
+                      middleware)
+        healthz = importlib.import_module(project_name + '.healthz')
+        self.assertEqual(healthz.HEALTH_CHECK_PATH, '/healthz')
+
+    def test_cloud_settings_conn_max_age(self):
+        project_name = 'test_cloud_settings_conn_max_age'
+        project_id = project_name + 'project_id'
+        cloud_sql_connection_string = ('{}:{}:{}'.format(
+            project_id, 'us-west', 'instance'))
+        self._generator.generate_new(project_id,
+                                     project_name,
+                                     self._project_dir,
+                                     cloud_sql_connection_string,
+                                     conn_max_age=0)
+
+        sys.path.append(self._project_dir)
+        module = importlib.import_module(project_name + '.cloud_settings')
+        database = getattr(module, 'DATABASES')['default']
+        self.assertEqual(database['CONN_MAX_AGE'], 0)
+
     def test_cloud_settings_gae(self):
         project_name = 'test_cloud_settings_gke'
         project_id = project_name + 'project_id'
@@ -297,7 +329,8 @@ class SettingsFileGeneratorTest(FileGeneratorTest):
                                                cloud_sql_connection_string,
                                                django_settings_path)
 
-        expected_settings_files = ('settings.py', 'cloud_settings.py')
+        expected_settings_files = ('settings.py', 'cloud_settings.py',
+                                   'healthz.py')
         files_list = os.listdir(os.path.join(self._project_dir, project_name))
         self.assertContainsSubset(expected_settings_files, files_list)
 
@@ -333,6 +366,12 @@ class SettingsFileGeneratorTest(FileGeneratorTest):
         # Test cloud settings does not use DEBUG mode
         self.assertEqual(getattr(module, 'DEBUG'), False)
 
+        # Test cloud settings answer health checks with the generated
+        # middleware
+        self.assertEqual(
+            getattr(module, 'MIDDLEWARE')[0],
+            project_name + '.healthz.HealthCheckMiddleware')
+
     def test_cloud_settings_inherit_correct_settings(self):
         project_name = 'test_generate_from_existing_settings'
         project_id = project_name + 'project_id'
@@ -375,7 +414,7 @@ class DockerfileGeneratorTest(FileGeneratorTest):
             dockerfile_content = dockerfile.read()
 
             # Test using python3 to create virtualenv
-            self.assertIn('virtualenv -p python3', dockerfile_content)
+            self.assertIn('python3 -m venv', dockerfile_content)
 
             # Test using remote settings when deployed on GKE
             self.assertIn('cloud_settings', dockerfile_content)
@@ -393,6 +432,161 @@ class DockerfileGeneratorTest(FileGeneratorTest):
         self.assertIn('Dockerfile', files_list)
         self.assertIn('.dockerignore', files_list)
 
+    def _load_gunicorn_config(self, file_name):
+        config = {}
+        with open(os.path.join(self._project_dir, file_name)) as config_file:
+            exec(config_file.read(), config)
+        return config
+
+    def test_gunicorn_config(self):
+        self._generator.generate_new('polls', self._project_dir)
+        with open(os.path.join(self._project_dir, 'Dockerfile')) as dockerfile:
+            self.assertIn('gunicorn --config gunicorn.conf.py polls.wsgi',
+                          dockerfile.read())
+
+        config = self._load_gunicorn_config('gunicorn.conf.py')
+        # Sized for the default CPU limit of 1 core.
+        self.assertEqual(config['workers'], 3)
+        self.assertEqual(config['worker_class'], 'gthread')
+        self.assertEqual(config['threads'], 4)
+        self.assertEqual(config['keepalive'], 5)
+        self.assertEqual(config['max_requests'], 1000)
+        self.assertEqual(config['max_requests_jitter'], 100)
+        self.assertIs(config['preload_app'], True)
+
+    def test_gunicorn_config_sized_from_cpu_limit(self):
+        self._generator.generate_new('polls',
+                                     self._project_dir,
+                                     cpu_limit='2500m')
+        config = self._load_gunicorn_config('gunicorn.conf.py')
+        self.assertEqual(config['workers'], 6)
+
+    def test_customized_gunicorn_config(self):
+        gunicorn_options = source_generator.GunicornOptions(
+            workers=7, worker_class='sync', preload_app=False)
+        self._generator.generate_new('polls',
+                                     self._project_dir,
+                                     gunicorn_options=gunicorn_options)
+        config = self._load_gunicorn_config('gunicorn.conf.py')
+        self.assertEqual(config['workers'], 7)
+        self.assertEqual(config['worker_class'], 'sync')
+        self.assertIs(config['preload_app'], False)
+        self.assertEqual(config['max_requests'], 1000)
+
+    def test_update_cpu_limit(self):
+        gunicorn_options = source_generator.GunicornOptions(worker_class='sync')
+        self._generator.generate_new('polls',
+                                     self._project_dir,
+                                     gunicorn_options=gunicorn_options)
+        self._generator.update_cpu_limit('polls', self._project_dir, '2',
+                                         gunicorn_options)
+        config = self._load_gunicorn_config('gunicorn.conf.py')
+        self.assertEqual(config['workers'], 5)
+        self.assertEqual(config['worker_class'], 'sync')
+
+    def test_dependencies_installed_before_source_copied(self):
+        self._generator.generate_new('polls', self._project_dir)
+        with open(os.path.join(self._project_dir, 'Dockerfile')) as dockerfile:
+            dockerfile_content = dockerfile.read()
+        builder_stage, runtime_stage = (
+            dockerfile_content.split('AS builder')[1].split('\nFROM '))
+        self.assertLess(builder_stage.index('COPY requirements.txt'),
+                        builder_stage.index('pip install'))
+        self.assertIn('COPY requirements-google.txt', builder_stage)
+        # Only the installed dependencies are shipped, before the source.
+        self.assertNotIn('pip install', runtime_stage)
+        self.assertNotIn('wheels', runtime_stage)
+        self.assertLess(runtime_stage.index('COPY --from=builder /env /env'),
+                        runtime_stage.index('ADD . /app'))
+
+    def test_generate_from_existing_copies_user_requirements(self):
+        os.mkdir(os.path.join(self._project_dir, 'requirements'))
+        with open(os.path.join(self._project_dir, 'requirements.txt'),
+                  'wt') as f:
+            f.write('-r requirements/base.txt\n-r requirements-google.txt')
+        with open(os.path.join(self._project_dir, 'requirements', 'base.txt'),
+                  'wt') as f:
+            f.write('six')
+        with open(os.path.join(self._project_dir, 'requirements-google.txt'),
+                  'wt') as f:
+            f.write('Django')
+        self._generator.generate_from_existing('polls', self._project_dir)
+        with open(os.path.join(self._project_dir, 'Dockerfile')) as dockerfile:
+            dockerfile_content = dockerfile.read()
+        self.assertIn('COPY requirements/base.txt /app/requirements/base.txt',
+                      dockerfile_content)
+        self.assertIn('COPY requirements-google.txt', dockerfile_content)
+
+
+class AppEngineFileGeneratorTest(FileGeneratorTest):
+    """Unit test for source_generator._AppEngineFileGenerator."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls._generator = source_generator._AppEngineFileGenerator()
+
+    def test_gunicorn_config(self):
+        self._generator.generate_new('polls', self._project_dir)
+        with open(os.path.join(self._project_dir, 'app.yaml')) as app_yaml:
+            app_yaml_content = app_yaml.read()
+        self.assertIn('instance_class: F2', app_yaml_content)
+        self.assertIn('gunicorn --config gunicorn-appengine.conf.py main:app',
+                      app_yaml_content)
+
+        config = {}
+        config_path = os.path.join(self._project_dir,
+                                   'gunicorn-appengine.conf.py')
+        with open(config_path) as config_file:
+            exec(config_file.read(), config)
+        # The number of workers recommended by App Engine for F2 instances.
+        self.assertEqual(config['workers'], 4)
+        self.assertEqual(config['worker_class'], 'gthread')
+
+    def test_instance_class(self):
+        self._generator.generate_new('polls',
+                                     self._project_dir,
+                                     instance_class='F4')
+        with open(os.path.join(self._project_dir, 'app.yaml')) as app_yaml:
+            self.assertIn('instance_class: F4', app_yaml.read())
+
+        config = {}
+        config_path = os.path.join(self._project_dir,
+                                   'gunicorn-appengine.conf.py')
+        with open(config_path) as config_file:
+            exec(config_file.read(), config)
+        # The number of workers recommended by App Engine for F4 instances.
+        self.assertEqual(config['workers'], 8)
+
+    def test_unsupported_instance_class(self):
+        with self.assertRaises(ValueError):
+            self._generator.generate_new('polls',
+                                         self._project_dir,
+                                         instance_class='B8')
+        self.assertFalse(
+            os.path.exists(os.path.join(self._project_dir, 'app.yaml')))
+
+    def test_update_instance_class(self):
+        self._generator.generate_new('polls',
+                                     self._project_dir,
+                                     service_name='polls-service')
+        self._generator.update_instance_class(
+            'polls', self._project_dir, 'F1',
+            source_generator.GunicornOptions(threads=8))
+        with open(os.path.join(self._project_dir, 'app.yaml')) as app_yaml:
+            app_yaml_content = app_yaml.read()
+        self.assertIn('instance_class: F1', app_yaml_content)
+        self.assertNotIn('instance_class: F2', app_yaml_content)
+        self.assertIn('service: polls-service', app_yaml_content)
+
+        config = {}
+        config_path = os.path.join(self._project_dir,
+                                   'gunicorn-appengine.conf.py')
+        with open(config_path) as config_file:
+            exec(config_file.read(), config)
+        # The number of workers recommended by App Engine for F1 instances.
+        self.assertEqual(config['workers'], 2)
+        self.assertEqual(config['threads'], 8)
+
 
 class DependencyFileGeneratorTest(FileGeneratorTest):
 
@@ -642,6 +836,246 @@ class YAMLFileGeneratorTest(FileGeneratorTest):
         files_list = os.listdir(self._project_dir)
         self.assertIn(project_name + '.yaml', files_list)
 
+    def _load_yaml_file(self, project_name):
+        yaml_file_path = os.path.join(self._project_dir, project_name + '.yaml')
+        with open(yaml_file_path) as yaml_file:
+            return {
+                data['kind']: data
+                for data in yaml.load_all(yaml_file, Loader=yaml.FullLoader)
+                if data
+            }
+
+    def test_default_scaling(self):
+        project_id = project_name = 'test_default_scaling'
+        self._generator.generate_new(self._project_dir, project_name,
+                                     project_id)
+        manifests = self._load_yaml_file(project_name)
+
+        deployment_spec = manifests['Deployment']['spec']
+        # Replicas are managed by the autoscaler.
+        self.assertNotIn('replicas', deployment_spec)
+        app_container = deployment_spec['template']['spec']['containers'][0]
+        self.assertEqual(
+            app_container['resources'], {
+                'requests': {
+                    'cpu': '250m',
+                    'memory': '256Mi'
+                },
+                'limits': {
+                    'cpu': '1',
+                    'memory': '512Mi'
+                }
+            })
+
+        autoscaler_spec = manifests['HorizontalPodAutoscaler']['spec']
+        self.assertEqual(autoscaler_spec['scaleTargetRef']['name'],
+                         project_name)
+        self.assertEqual(autoscaler_spec['minReplicas'], 1)
+        self.assertEqual(autoscaler_spec['maxReplicas'], 3)
+        self.assertEqual(autoscaler_spec['targetCPUUtilizationPercentage'],
+                         70)
+
+    def test_rolling_update_strategy(self):
+        project_id = project_name = 'test_rolling_update_strategy'
+        self._generator.generate_new(self._project_dir, project_name,
+                                     project_id)
+        manifests = self._load_yaml_file(project_name)
+
+        # Old pods keep serving until new ones are available.
+        self.assertEqual(manifests['Deployment']['spec']['strategy'], {
+            'type': 'RollingUpdate',
+            'rollingUpdate': {
+                'maxSurge': 1,
+                'maxUnavailable': 0
+            }
+        })
+
+    def test_health_check_probes(self):
+        project_id = project_name = 'test_health_check_probes'
+        self._generator.generate_new(self._project_dir, project_name,
+                                     project_id)
+        manifests = self._load_yaml_file(project_name)
+
+        app_container = manifests['Deployment']['spec']['template']['spec'][
+            'containers'][0]
+        for probe in ('readinessProbe', 'livenessProbe'):
+            self.assertEqual(app_container[probe]['httpGet'], {
+                'path': '/healthz',
+                'port': 8080
+            })
+
+    def test_no_pgbouncer_by_default(self):
+        project_id = project_name = 'test_no_pgbouncer_by_default'
+        self._generator.generate_new(self._project_dir, project_name,
+                                     project_id)
+        manifests = self._load_yaml_file(project_name)
+
+        containers = manifests['Deployment']['spec']['template']['spec'][
+            'containers']
+        self.assertEqual([container['name'] for container in containers],
+                         [project_name + '-app', 'cloudsql-proxy'])
+        env_names = [env['name'] for env in containers[0]['env']]
+        self.assertNotIn('DATABASE_PORT', env_names)
+
+    def test_pgbouncer(self):
+        project_id = project_name = 'test_pgbouncer'
+        self._generator.generate_new(
+            self._project_dir,
+            project_name,
+            project_id,
+            pgbouncer_options=source_generator.PgBouncerOptions(pool_size=5))
+        manifests = self._load_yaml_file(project_name)
+
+        containers = {
+            container['name']: container for container in
+            manifests['Deployment']['spec']['template']['spec']['containers']
+        }
+        app_env = {
+            env['name']: env.get('value')
+            for env in containers[project_name + '-app']['env']
+        }
+        self.assertEqual(app_env['DATABASE_PORT'], '6432')
+        self.assertEqual(app_env['DATABASE_TRANSACTION_POOLING'], 'true')
+        pgbouncer_env = {
+            env['name']: env.get('value')
+            for env in containers['pgbouncer']['env']
+        }
+        self.assertEqual(pgbouncer_env['LISTEN_PORT'], '6432')
+        self.assertEqual(pgbouncer_env['DB_PORT'], '5432')
+        self.assertEqual(pgbouncer_env['POOL_MODE'], 'transaction')
+        self.assertEqual(pgbouncer_env['DEFAULT_POOL_SIZE'], '5')
+        self.assertEqual(pgbouncer_env['MAX_CLIENT_CONN'], '100')
+
+    def test_customized_scaling(self):
+        project_id = project_name = 'test_customized_scaling'
+        scaling_options = source_generator.ScalingOptions(
+            min_replicas=2, max_replicas=10, memory_limit='1Gi')
+        self._generator.generate_new(self._project_dir,
+                                     project_name,
+                                     project_id,
+                                     scaling_options=scaling_options)
+        manifests = self._load_yaml_file(project_name)
+
+        containers = manifests['Deployment']['spec']['template']['spec'][
+            'containers']
+        self.assertEqual(containers[0]['resources']['limits']['memory'], '1Gi')
+        self.assertEqual(containers[0]['resources']['requests']['cpu'], '250m')
+        autoscaler_spec = manifests['HorizontalPodAutoscaler']['spec']
+        self.assertEqual(autoscaler_spec['minReplicas'], 2)
+        self.assertEqual(autoscaler_spec['maxReplicas'], 10)
+        self.assertEqual(autoscaler_spec['targetCPUUtilizationPercentage'],
+                         70)
+
+    def test_update_scaling(self):
+        project_id = project_name = 'test_update_scaling'
+        self._generator.generate_new(self._project_dir, project_name,
+                                     project_id)
+        self._generator.update_scaling(
+            self._project_dir, project_name,
+            source_generator.ScalingOptions(max_replicas=5, cpu_request='500m'))
+        manifests = self._load_yaml_file(project_name)
+
+        containers = manifests['Deployment']['spec']['template']['spec'][
+            'containers']
+        self.assertEqual(containers[0]['resources']['requests'], {
+            'cpu': '500m',
+            'memory': '256Mi'
+        })
+        autoscaler_spec = manifests['HorizontalPodAutoscaler']['spec']
+        self.assertEqual(autoscaler_spec['minReplicas'], 1)
+        self.assertEqual(autoscaler_spec['maxReplicas'], 5)
+        self.assertIn('Service', manifests)
+
+    def test_update_scaling_keeps_comments(self):
+        project_id = project_name = 'test_update_scaling_keeps_comments'
+        self._generator.generate_new(self._project_dir, project_name,
+                                     project_id)
+        yaml_file_path = os.path.join(self._project_dir, project_name + '.yaml')
+        with open(yaml_file_path) as yaml_file:
+            lines = yaml_file.read().splitlines()
+
+        self._generator.update_scaling(
+            self._project_dir, project_name,
+            source_generator.ScalingOptions(min_replicas=2, cpu_limit='2'))
+        with open(yaml_file_path) as yaml_file:
+            new_lines = yaml_file.read().splitlines()
+        # Only the lines of the changed settings differ.
+        self.assertEqual(len(new_lines), len(lines))
+        changed_lines = [(line, new_line)
+                         for line, new_line in zip(lines, new_lines)
+                         if line != new_line]
+        self.assertEqual(changed_lines,
+                         [('            cpu: "1"', '            cpu: "2"'),
+                          ('  minReplicas: 1', '  minReplicas: 2')])
+
+    def test_update_scaling_adds_resources(self):
+        project_id = project_name = 'test_update_scaling_adds_resources'
+        self._generator.generate_new(self._project_dir, project_name,
+                                     project_id)
+        manifests = self._load_yaml_file(project_name)
+        app_container = manifests['Deployment']['spec']['template']['spec'][
+            'containers'][0]
+        del app_container['resources']
+        yaml_file_path = os.path.join(self._project_dir, project_name + '.yaml')
+        with open(yaml_file_path, 'w') as yaml_file:
+            yaml.dump_all(manifests.values(), yaml_file)
+
+        self._generator.update_scaling(
+            self._project_dir, project_name,
+            source_generator.ScalingOptions(cpu_limit='2'))
+        manifests = self._load_yaml_file(project_name)
+        app_container = manifests['Deployment']['spec']['template']['spec'][
+            'containers'][0]
+        self.assertEqual(app_container['resources'], {'limits': {'cpu': '2'}})
+        self.assertEqual(app_container['name'], project_name + '-app')
+
+    def test_update_scaling_adds_autoscaler(self):
+        project_id = project_name = 'test_update_scaling_adds_autoscaler'
+        self._generator.generate_new(self._project_dir, project_name,
+                                     project_id)
+        manifests = self._load_yaml_file(project_name)
+        del manifests['HorizontalPodAutoscaler']
+        yaml_file_path = os.path.join(self._project_dir, project_name + '.yaml')
+        with open(yaml_file_path, 'w') as yaml_file:
+            yaml.dump_all(manifests.values(), yaml_file)
+
+        self._generator.update_scaling(
+            self._project_dir, project_name,
+            source_generator.ScalingOptions(min_replicas=2))
+        autoscaler = self._load_yaml_file(
+            project_name)['HorizontalPodAutoscaler']
+        self.assertEqual(autoscaler['spec']['scaleTargetRef']['name'],
+                         project_name)
+        self.assertEqual(autoscaler['spec']['minReplicas'], 2)
+        self.assertEqual(autoscaler['spec']['maxReplicas'], 3)
+
+    def test_update_scaling_upgrades_deployment_api_version(self):
+        project_id = project_name = 'test_update_scaling_upgrades_api'
+        self._generator.generate_new(self._project_dir, project_name,
+                                     project_id)
+        manifests = self._load_yaml_file(project_name)
+        deployment = manifests['Deployment']
+        deployment['apiVersion'] = 'extensions/v1beta1'
+        del deployment['spec']['selector']
+        manifests['HorizontalPodAutoscaler']['spec']['scaleTargetRef'][
+            'apiVersion'] = 'extensions/v1beta1'
+        yaml_file_path = os.path.join(self._project_dir, project_name + '.yaml')
+        with open(yaml_file_path, 'w') as yaml_file:
+            yaml.dump_all(manifests.values(), yaml_file)
+
+        self._generator.update_scaling(self._project_dir, project_name,
+                                       source_generator.ScalingOptions())
+        manifests = self._load_yaml_file(project_name)
+        deployment = manifests['Deployment']
+        self.assertEqual(deployment['apiVersion'], 'apps/v1')
+        self.assertEqual(deployment['spec']['selector'],
+                         {'matchLabels': {
+                             'app': project_name
+                         }})
+        self.assertEqual(
+            manifests['HorizontalPodAutoscaler']['spec']['scaleTargetRef']
+            ['apiVersion'], 'apps/v1')
+
 
 class DjangoSourceFileGeneratorTest(FileGeneratorTest):
 
@@ -668,6 +1102,30 @@ class DjangoSourceFileGeneratorTest(FileGeneratorTest):
         files_list = os.listdir(os.path.join(project_dir, project_name))
         self.assertContainsSubset(self.SETTINGS_FILES, files_list)
 
+    def test_update_scaling_rejects_other_backend(self):
+        with self.assertRaises(ValueError):
+            self._generator.update_scaling(
+                self._project_dir, 'polls', 'gae',
+                source_generator.ScalingOptions(cpu_limit='2'))
+        with self.assertRaises(ValueError):
+            self._generator.update_scaling(
+                self._project_dir, 'polls', 'gke',
+                source_generator.ScalingOptions(instance_class='F4'))
+
+    @unittest.mock.patch('django.setup')
+    def test_setup_django_environment_closes_connections(self, unused_mock):
+        mock_settings = unittest.mock.Mock(
+            DATABASES={'default': {
+                'NAME': 'fake_db',
+                'CONN_MAX_AGE': 60
+            }})
+        with unittest.mock.patch.object(source_generator, 'settings',
+                                        mock_settings):
+            self._generator.setup_django_environment(
+                self._project_dir, 'fake_db_user', 'fake_db_password',
+                os.path.join(self._project_dir, 'polls', 'settings.py'))
+        self.assertEqual(mock_settings.DATABASES['default']['CONN_MAX_AGE'], 0)
+
     @unittest.mock.patch('subprocess.call')
     def test_generate_all_source_files(self, unused_mock):
         project_id = project_name = 'test_generate_all_source_file'
@@ -0,0 +1,133 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for the workflow._deploygke module."""
+
+from unittest import mock
+
+from absl.testing import absltest
+
+from django_cloud_deploy.workflow import _deploygke
+
+
+def _object(resource_version, ready_replicas=0):
+    obj = mock.Mock()
+    obj.metadata.resource_version = resource_version
+    obj.status.ready_replicas = ready_replicas
+    return obj
+
+
+def _object_list(resource_version, items):
+    object_list = mock.Mock(items=items)
+    object_list.metadata.resource_version = resource_version
+    return object_list
+
+
+class WaitForObjectTest(absltest.TestCase):
+    """Test case for DeploygkeWorkflow._wait_for_object."""
+
+    def setUp(self):
+        patcher = mock.patch('django_cloud_deploy.cloudlib.container.'
+                             'ContainerClient.from_credentials')
+        self.addCleanup(patcher.stop)
+        patcher.start()
+        patcher = mock.patch('kubernetes.watch.Watch')
+        self.addCleanup(patcher.stop)
+        self._watch = patcher.start().return_value
+        self._workflow = _deploygke.DeploygkeWorkflow(mock.Mock())
+        self._list_func = mock.Mock()
+
+    def _wait(self, deadline=10):
+        return self._workflow._wait_for_object(
+            self._list_func, 'app=mysite',
+            lambda obj: obj.status.ready_replicas, 'Ready replicas', deadline)
+
+    def test_ready_when_listed(self):
+        self._list_func.return_value = _object_list('1', [_object('1', 2)])
+        self.assertEqual(self._wait(), 2)
+        self._watch.stream.assert_not_called()
+
+    def test_ready_after_watch_event(self):
+        self._list_func.return_value = _object_list('1', [_object('1')])
+        self._watch.stream.return_value = iter([
+            {
+                'type': 'MODIFIED',
+                'object': _object('2')
+            },
+            {
+                'type': 'MODIFIED',
+                'object': _object('3', 1)
+            },
+        ])
+        self.assertEqual(self._wait(), 1)
+        self._list_func.assert_called_once_with(namespace='default',
+                                                label_selector='app=mysite')
+        self.assertEqual(self._watch.stream.call_args[1]['resource_version'],
+                         '1')
+
+    def test_resume_and_relist(self):
+        self._list_func.side_effect = [
+            _object_list('1', []),
+            _object_list('5', []),
+        ]
+        self._watch.stream.side_effect = [
+            # The server closes the watch, which is resumed.
+            iter([{
+                'type': 'ADDED',
+                'object': _object('2')
+            }]),
+            # The resource version is too old, the objects are listed again.
+            iter([{
+                'type': 'ERROR',
+                'raw_object': {
+                    'code': 410,
+                    'message': 'too old resource version'
+                }
+            }]),
+            iter([{
+                'type': 'MODIFIED',
+                'object': _object('6', 3)
+            }]),
+        ]
+        self.assertEqual(self._wait(), 3)
+        resource_versions = [
+            call[1]['resource_version']
+            for call in self._watch.stream.call_args_list
+        ]
+        self.assertEqual(resource_versions, ['1', '2', '5'])
+
+    def test_deadline(self):
+        self._list_func.return_value = _object_list('1', [_object('1')])
+        self._watch.stream.return_value = iter([])
+        with mock.patch('time.monotonic', side_effect=[0, 0, 11]):
+            with self.assertRaisesRegex(_deploygke.DeployNewAppError,
+                                        'app=mysite'):
+                self._wait()
+        self._watch.stop.assert_called_once_with()
+
+    def test_stop_watch_on_error(self):
+        self._list_func.return_value = _object_list('1', [_object('1')])
+        self._watch.stream.return_value = iter([{
+            'type': 'ERROR',
+            'raw_object': {
+                'code': 403,
+                'message': 'forbidden'
+            }
+        }])
+        with self.assertRaisesRegex(_deploygke.DeployNewAppError, 'forbidden'):
+            self._wait()
+        self._watch.stop.assert_called_once_with()
+
+
+if __name__ == '__main__':
+    absltest.main()
@@ -0,0 +1,66 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for the workflow._enable_service module."""
+
+from unittest import mock
+
+from absl.testing import absltest
+
+from django_cloud_deploy.cloudlib import enable_service
+from django_cloud_deploy.workflow import _enable_service
+
+PROJECT_ID = 'fake_project_id'
+
+
+class EnableRequiredServicesTest(absltest.TestCase):
+    """Test case for enable_required_services."""
+
+    def setUp(self):
+        patcher = mock.patch.object(enable_service.EnableServiceClient,
+                                    'from_credentials')
+        self.addCleanup(patcher.stop)
+        self._client = patcher.start().return_value
+        self._client.list_enabled_services.return_value = [
+            'compute.googleapis.com'
+        ]
+        self._workflow = _enable_service.EnableServiceWorkflow(mock.Mock())
+
+    def test_enable_given_services(self):
+        self._workflow.enable_required_services(PROJECT_ID, [{
+            'title': 'Compute Engine API',
+            'name': 'compute.googleapis.com'
+        }, {
+            'title': 'Cloud SQL API',
+            'name': 'sqladmin.googleapis.com'
+        }])
+        self._client.enable_services_sync.assert_called_once_with(
+            PROJECT_ID, ['sqladmin.googleapis.com'])
+
+    def test_enable_default_services(self):
+        self._workflow.enable_required_services(PROJECT_ID)
+        services = _enable_service.EnableServiceWorkflow.load_services()
+        self._client.enable_services_sync.assert_called_once_with(
+            PROJECT_ID, [
+                service['name']
+                for service in services
+                if service['name'] != 'compute.googleapis.com'
+            ])
+
+    def test_enable_no_services(self):
+        self._workflow.enable_required_services(PROJECT_ID, [])
+        self._client.enable_services_sync.assert_not_called()
+
+
+if __name__ == '__main__':
+    absltest.main()
@@ -0,0 +1,103 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for the workflow._service_account module."""
+
+from unittest import mock
+
+from absl.testing import absltest
+
+from django_cloud_deploy.cloudlib import service_account
+from django_cloud_deploy.workflow import _service_account
+
+PROJECT_ID = 'fake_project_id'
+
+SERVICE_ACCOUNTS = [
+    {
+        'id': 'account1',
+        'name': 'Account 1',
+        'file_name': 'credentials.json',
+        'roles': ['roles/role1', 'roles/role2'],
+    },
+    {
+        'id': 'account2',
+        'name': 'Account 2',
+        'file_name': 'account2.json',
+        'roles': ['roles/role1'],
+    },
+    {
+        'id': 'account1',
+        'name': 'Account 1',
+        'file_name': 'credentials.json',
+        'roles': ['roles/role2', 'roles/role3'],
+    },
+]
+
+
+class CreateServiceAccountsAndKeysTest(absltest.TestCase):
+    """Test case for create_service_accounts_and_keys."""
+
+    def setUp(self):
+        patcher = mock.patch.object(service_account.ServiceAccountClient,
+                                    'from_credentials')
+        self.addCleanup(patcher.stop)
+        self._client = patcher.start().return_value
+        self._client.create_key.side_effect = (
+            lambda project_id, service_account_id: 'key-' + service_account_id)
+        self._workflow = _service_account.ServiceAccountKeyGenerationWorkflow(
+            mock.Mock())
+
+    def test_keys_of_each_service_account(self):
+        keys = self._workflow.create_service_accounts_and_keys(
+            PROJECT_ID, SERVICE_ACCOUNTS)
+        self.assertEqual(keys, {
+            'account1': 'key-account1',
+            'account2': 'key-account2',
+        })
+        self.assertCountEqual(
+            self._client.create_service_account_without_roles.call_args_list,
+            [
+                mock.call(PROJECT_ID, 'account1', 'Account 1'),
+                mock.call(PROJECT_ID, 'account2', 'Account 2'),
+            ])
+        self.assertEqual(self._client.create_key.call_count, 2)
+
+    def test_roles_granted_once(self):
+        self._workflow.create_service_accounts_and_keys(
+            PROJECT_ID, SERVICE_ACCOUNTS)
+        self._client.grant_roles.assert_called_once_with(
+            PROJECT_ID, {
+                'account1': ['roles/role1', 'roles/role2', 'roles/role3'],
+                'account2': ['roles/role1'],
+            })
+
+    def test_key_callback(self):
+        created_keys = []
+        keys = self._workflow.create_service_accounts_and_keys(
+            PROJECT_ID,
+            SERVICE_ACCOUNTS,
+            on_key_created=lambda *args: created_keys.append(args))
+        self.assertCountEqual(created_keys, list(keys.items()))
+
+    def test_creation_failure(self):
+        self._client.create_service_account_without_roles.side_effect = (
+            service_account.ServiceAccountCreationError('invalid id'))
+        with self.assertRaises(service_account.ServiceAccountCreationError):
+            self._workflow.create_service_accounts_and_keys(
+                PROJECT_ID, SERVICE_ACCOUNTS)
+        self._client.grant_roles.assert_not_called()
+        self._client.create_key.assert_not_called()
+
+
+if __name__ == '__main__':
+    absltest.main()
@@ -0,0 +1,103 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for the workflow._step_graph module."""
+
+import threading
+
+from absl.testing import absltest
+
+from django_cloud_deploy.workflow import _step_graph
+
+
+class StepGraphTest(absltest.TestCase):
+    """Test case for _step_graph.StepGraph."""
+
+    def test_run_passes_values_between_steps(self):
+        graph = _step_graph.StepGraph()
+        graph.add_step('double', lambda x: x * 2, inputs=['x'], outputs=['y'])
+        graph.add_step('add',
+                       lambda x, y: x + y,
+                       inputs=['x', 'y'],
+                       outputs=['z'])
+        values = graph.run({'x': 1})
+        self.assertEqual(values, {'x': 1, 'y': 2, 'z': 3})
+
+    def test_run_multiple_outputs(self):
+        graph = _step_graph.StepGraph()
+        graph.add_step('split', lambda: (1, 2), outputs=['a', 'b'])
+        values = graph.run()
+        self.assertEqual(values, {'a': 1, 'b': 2})
+
+    def test_independent_steps_run_concurrently(self):
+        # Both steps can only finish when the other one is running at the
+        # same time.
+        barrier = threading.Barrier(2, timeout=5)
+        graph = _step_graph.StepGraph()
+        graph.add_step('first', barrier.wait, outputs=['first'])
+        graph.add_step('second', barrier.wait, outputs=['second'])
+        values = graph.run()
+        self.assertIn('first', values)
+        self.assertIn('second', values)
+
+    def test_dependent_steps_run_in_order(self):
+        calls = []
+        graph = _step_graph.StepGraph()
+        graph.add_step('second',
+                       lambda first: calls.append('second'),
+                       inputs=['first'],
+                       outputs=['second'])
+        graph.add_step('first', lambda: calls.append('first'),
+                       outputs=['first'])
+        graph.run()
+        self.assertEqual(calls, ['first', 'second'])
+
+    def test_error_stops_later_steps(self):
+        calls = []
+
+        def fail():
+            raise ValueError('fail')
+
+        graph = _step_graph.StepGraph()
+        graph.add_step('fail', fail, outputs=['a'])
+        graph.add_step('after',
+                       lambda a: calls.append('after'),
+                       inputs=['a'],
+                       outputs=['b'])
+        with self.assertRaises(ValueError):
+            graph.run()
+        self.assertEqual(calls, [])
+
+    def test_missing_input(self):
+        graph = _step_graph.StepGraph()
+        graph.add_step('step', lambda a: a, inputs=['a'], outputs=['b'])
+        with self.assertRaises(_step_graph.StepGraphError):
+            graph.run()
+
+    def test_duplicate_output(self):
+        graph = _step_graph.StepGraph()
+        graph.add_step('first', lambda: 1, outputs=['a'])
+        graph.add_step('second', lambda: 2, outputs=['a'])
+        with self.assertRaises(_step_graph.StepGraphError):
+            graph.run()
+
+    def test_cycle(self):
+        graph = _step_graph.StepGraph()
+        graph.add_step('first', lambda b: b, inputs=['b'], outputs=['a'])
+        graph.add_step('second', lambda a: a, inputs=['a'], outputs=['b'])
+        with self.assertRaises(_step_graph.StepGraphError):
+            graph.run()
+
+
+if __name__ == '__main__':
+    absltest.main()
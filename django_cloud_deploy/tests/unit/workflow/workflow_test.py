@@ -0,0 +1,143 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Tests for the workflow module."""
+
+import json
+from unittest import mock
+
+from absl.testing import absltest
+
+from django_cloud_deploy import workflow
+from django_cloud_deploy.cli import io
+
+PROJECT_ID = 'fake_project_id'
+
+SECRETS_BUCKET_NAME = 'secrets-fake_project_id'
+
+REQUIRED_SERVICE_ACCOUNTS = {
+    'cloud_sql': [{
+        'id': 'account1',
+        'name': 'Account 1',
+        'file_name': 'credentials.json',
+        'roles': ['roles/role1'],
+    }],
+    'django': [{
+        'id': 'account2',
+        'name': 'Account 2',
+        'file_name': 'account2.json',
+        'roles': ['roles/role2'],
+    }],
+}
+
+EXPECTED_SECRETS = {
+    'cloudsql': {
+        'username': 'user',
+        'password': 'password'
+    },
+    'account1': {
+        'credentials.json': 'key-account1'
+    },
+    'account2': {
+        'account2.json': 'key-account2'
+    },
+}
+
+
+def _create_service_accounts_and_keys(project_id,
+                                      service_accounts,
+                                      on_key_created=None):
+    del project_id
+    keys = {}
+    for s_a in service_accounts:
+        keys[s_a['id']] = 'key-' + s_a['id']
+        if on_key_created:
+            on_key_created(s_a['id'], keys[s_a['id']])
+    return keys
+
+
+class GenerateSecretsTest(absltest.TestCase):
+    """Test case for WorkflowManager._generate_secrets."""
+
+    def setUp(self):
+        self._service_account_workflow = mock.Mock(
+            create_service_accounts_and_keys=mock.Mock(
+                side_effect=_create_service_accounts_and_keys))
+        self._static_content_workflow = mock.Mock()
+        for name, value in [
+            ('_service_account_workflow', self._service_account_workflow),
+            ('_static_content_workflow', self._static_content_workflow),
+        ]:
+            patcher = mock.patch.object(workflow.WorkflowManager,
+                                        name,
+                                        new_callable=mock.PropertyMock,
+                                        return_value=value)
+            self.addCleanup(patcher.stop)
+            patcher.start()
+        self._workflow_manager = workflow.WorkflowManager(mock.Mock())
+
+    def test_generate_secrets(self):
+        secrets = self._workflow_manager._generate_secrets(
+            PROJECT_ID, 'user', 'password', REQUIRED_SERVICE_ACCOUNTS)
+        self.assertEqual(secrets, EXPECTED_SECRETS)
+        self._static_content_workflow.create_secret_bucket.assert_not_called()
+        self._static_content_workflow.upload_secret.assert_not_called()
+
+    def test_generate_and_upload_secrets(self):
+        secrets = self._workflow_manager._generate_secrets(
+            PROJECT_ID, 'user', 'password', REQUIRED_SERVICE_ACCOUNTS,
+            SECRETS_BUCKET_NAME)
+        self.assertEqual(secrets, EXPECTED_SECRETS)
+        create_secret_bucket = (
+            self._static_content_workflow.create_secret_bucket)
+        create_secret_bucket.assert_called_once_with(PROJECT_ID,
+                                                     SECRETS_BUCKET_NAME)
+        upload_secret = self._static_content_workflow.upload_secret
+        uploaded = {
+            args[1]: json.loads(args[2])
+            for args, _ in upload_secret.call_args_list
+        }
+        self.assertEqual(uploaded, EXPECTED_SECRETS)
+
+
+class StepProgressTest(absltest.TestCase):
+    """Test case for WorkflowManager._step_progress."""
+
+    def setUp(self):
+        self._workflow_manager = workflow.WorkflowManager(mock.Mock())
+        self._console_io = io.TestIO()
+        self._workflow_manager._console_io = self._console_io
+
+    def test_step_progress(self):
+        with self._workflow_manager._step_progress(4, 'Database Set Up'):
+            self.assertEqual(self._console_io.tell_calls,
+                             [('[4/9]: Database Set Up started.',)])
+        self.assertLen(self._console_io.tell_calls, 2)
+        self.assertRegex(self._console_io.tell_calls[1][0],
+                         r'^\[4/9\]: Database Set Up finished in [\d.]+ '
+                         r'seconds\.$')
+
+    def test_step_progress_failure(self):
+        with self.assertRaises(ValueError):
+            with self._workflow_manager._step_progress(4, 'Database Set Up'):
+                raise ValueError()
+        self.assertLen(self._console_io.tell_calls, 2)
+        self.assertEqual(self._console_io.tell_calls[0],
+                         ('[4/9]: Database Set Up started.',))
+        self.assertRegex(self._console_io.tell_calls[1][0],
+                         r'^\[4/9\]: Database Set Up failed after [\d.]+ '
+                         r'seconds\.$')
+
+
+if __name__ == '__main__':
+    absltest.main()
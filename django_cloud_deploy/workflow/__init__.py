@@ -13,11 +13,15 @@
 # limitations under the License.
 """A module to manage workflow for deployment of Django apps."""
 
+import collections
+from concurrent import futures
+import contextlib
 import json
 import os
-import shutil
 import socket
-from typing import Any, Dict, List, Optional, Tuple
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from django.conf import settings
 from django_cloud_deploy import config
@@ -30,6 +34,7 @@ from django_cloud_deploy.workflow import deploy_workflow
 from django_cloud_deploy.workflow import _project
 from django_cloud_deploy.workflow import _service_account
 from django_cloud_deploy.workflow import _static_content_serve
+from django_cloud_deploy.workflow import _step_graph
 from django_cloud_deploy.workflow import _file_bucket
 from django_cloud_deploy.utils import webbrowser
 
@@ -56,24 +61,124 @@ class WorkflowManager(object):
     _TOTAL_NEW_STEPS = 9
     _TOTAL_UPDATE_STEPS = 3
 
+    # The maximum number of secrets uploaded to the secrets bucket at the same
+    # time on GAE.
+    _MAX_CONCURRENT_SECRET_UPLOADS = 8
+
     DEFAULT_GAE_SERVICE_NAME = 'default'
 
     def __init__(self, credentials: credentials.Credentials):
-        self._source_generator = source_generator.DjangoSourceFileGenerator()
-        self._billing_client = billing.BillingClient.from_credentials(
-            credentials)
-        self._project_workflow = _project.ProjectWorkflow(credentials)
-        self._database_workflow = _database.DatabaseWorkflow(credentials)
-        self.deploy_workflow = deploy_workflow.DeployWorkflow(credentials)
-        self._enable_service_workflow = _enable_service.EnableServiceWorkflow(
-            credentials)
-        self._service_account_workflow = (
-            _service_account.ServiceAccountKeyGenerationWorkflow(credentials))
-        self._static_content_workflow = (
-            _static_content_serve.StaticContentServeWorkflow(credentials))
-        self._file_bucket_workflow = (
-            _file_bucket.FileBucketCreationWorkflow(credentials))
+        self._credentials = credentials
         self._console_io = io.ConsoleIO()
+        self._source_generator = source_generator.DjangoSourceFileGenerator()
+
+        # Clients and workflows are created on first use by the properties
+        # below, so each command only builds the API clients it needs. Steps
+        # run concurrently, so each object has a lock making sure it is only
+        # created once.
+        self._lazy_objects = {}
+        self._lazy_locks = collections.defaultdict(threading.Lock)
+        self._lazy_locks_lock = threading.Lock()
+        self._console_lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def _step_progress(self, step: int, title: str):
+        """Report when a step of creating a new project starts and finishes.
+
+        The steps run concurrently, so progress bars would overwrite each
+        other. Instead, a line is shown when a step starts and another one,
+        with its duration, when it finishes or fails.
+
+        Args:
+            step: The number of the step.
+            title: What the step does.
+
+        Yields:
+            None
+        """
+        header = '[{}/{}]: {}'.format(step, self._TOTAL_NEW_STEPS, title)
+        with self._console_lock:
+            self._console_io.tell('{} started.'.format(header))
+        start_time = time.time()
+        outcome = 'failed after'
+        try:
+            yield
+            outcome = 'finished in'
+        finally:
+            with self._console_lock:
+                self._console_io.tell('{} {} {:.1f} seconds.'.format(
+                    header, outcome,
+                    time.time() - start_time))
+
+    def _get_lazy_object(self, name: str, factory: Callable[[], Any]) -> Any:
+        """Get an object, creating it on first use.
+
+        Args:
+            name: Name of the object.
+            factory: Function creating the object. Only called the first time
+                an object with this name is requested.
+
+        Returns:
+            The object created by the first call with this name.
+        """
+        with self._lazy_locks_lock:
+            lock = self._lazy_locks[name]
+        with lock:
+            if name not in self._lazy_objects:
+                self._lazy_objects[name] = factory()
+            return self._lazy_objects[name]
+
+    @property
+    def _billing_client(self) -> billing.BillingClient:
+        return self._get_lazy_object(
+            'billing_client',
+            lambda: billing.BillingClient.from_credentials(self._credentials))
+
+    @property
+    def _project_workflow(self) -> _project.ProjectWorkflow:
+        return self._get_lazy_object(
+            'project_workflow',
+            lambda: _project.ProjectWorkflow(self._credentials))
+
+    @property
+    def _database_workflow(self) -> _database.DatabaseWorkflow:
+        return self._get_lazy_object(
+            'database_workflow',
+            lambda: _database.DatabaseWorkflow(self._credentials))
+
+    @property
+    def deploy_workflow(self) -> deploy_workflow.DeployWorkflow:
+        return self._get_lazy_object(
+            'deploy_workflow', lambda: deploy_workflow.DeployWorkflow(
+                self._credentials, self._console_io))
+
+    @property
+    def _enable_service_workflow(self) -> _enable_service.EnableServiceWorkflow:
+        return self._get_lazy_object(
+            'enable_service_workflow',
+            lambda: _enable_service.EnableServiceWorkflow(self._credentials))
+
+    @property
+    def _service_account_workflow(
+            self) -> _service_account.ServiceAccountKeyGenerationWorkflow:
+        return self._get_lazy_object(
+            'service_account_workflow',
+            lambda: _service_account.ServiceAccountKeyGenerationWorkflow(
+                self._credentials))
+
+    @property
+    def _static_content_workflow(
+            self) -> _static_content_serve.StaticContentServeWorkflow:
+        return self._get_lazy_object(
+            'static_content_workflow',
+            lambda: _static_content_serve.StaticContentServeWorkflow(
+                self._credentials))
+
+    @property
+    def _file_bucket_workflow(self) -> _file_bucket.FileBucketCreationWorkflow:
+        return self._get_lazy_object(
+            'file_bucket_workflow',
+            lambda: _file_bucket.FileBucketCreationWorkflow(self._credentials))
 
     def create_and_deploy_new_project(
             self,
@@ -102,7 +207,13 @@ class WorkflowManager(object):
             cloud_sql_proxy_path: str = 'cloud_sql_proxy',
             backend: str = 'gke',
             open_browser: bool = True,
-            deploy_existing_django_project: bool = False):
+            deploy_existing_django_project: bool = False,
+            scaling_options: Optional[source_generator.ScalingOptions] = None,
+            gunicorn_options: Optional[
+                source_generator.GunicornOptions] = None,
+            pgbouncer_options: Optional[
+                source_generator.PgBouncerOptions] = None,
+            conn_max_age: Optional[int] = None):
         """Workflow of deploying a newly generated Django app to GKE.
 
         Args:
@@ -161,6 +272,18 @@ class WorkflowManager(object):
                 at the end.
             deploy_existing_django_project: Whether this method is used to
                 deploy an existing django project or not.
+            scaling_options: Resources and autoscaling settings of the app,
+                including the App Engine instance class. By default the
+                settings of source_generator.ScalingOptions.DEFAULTS are used.
+            gunicorn_options: Settings of the gunicorn server running the app.
+                By default the number of workers is sized from the CPU
+                available to the app.
+            pgbouncer_options: Settings of a PgBouncer sidecar pooling the
+                database connections of the app on GKE. No PgBouncer is used
+                if not set.
+            conn_max_age: Seconds the deployed app keeps database connections
+                open to reuse them. By default the value of
+                source_generator.DjangoSourceFileGenerator is used.
 
         Returns:
             The url of the deployed Django app.
@@ -186,121 +309,183 @@ class WorkflowManager(object):
 
         cloud_sql_proxy_port = portpicker.pick_unused_port()
 
-        self._console_io.tell('[1/{}]: Create GCP Project'.format(
-            self._TOTAL_NEW_STEPS))
-        self._project_workflow.create_project(project_name, project_id,
-                                              project_creation_mode)
-
-        self._console_io.tell('[2/{}]: Billing Set Up'.format(
-            self._TOTAL_NEW_STEPS))
-        if not self._billing_client.check_billing_enabled(project_id):
-            self._billing_client.enable_project_billing(project_id,
-                                                        billing_account_name)
-
-        self._console_io.tell('[3/{}]: Django Source Generation'.format(
-            self._TOTAL_NEW_STEPS))
         # Source generation requires service account ids.
         required_service_accounts = (
             required_service_accounts or
             self._service_account_workflow.load_service_accounts())
         cloud_sql_secrets, django_secrets = self._load_secret_names(
             required_service_accounts)
-        if deploy_existing_django_project:
-            self._source_generator.generate_from_existing(
-                project_id=project_id,
-                project_name=django_project_name,
-                project_dir=django_directory_path,
-                database_user=database_username,
-                database_password=database_password,
-                django_requirements_path=django_requirements_path,
-                django_settings_path=django_settings_path,
-                instance_name=database_instance_name,
-                database_name=database_name,
-                cloud_sql_proxy_port=cloud_sql_proxy_port,
-                cloud_storage_bucket_name=cloud_storage_bucket_name,
-                file_storage_bucket_name=file_storage_bucket_name,
-                cloudsql_secrets=cloud_sql_secrets,
-                django_secrets=django_secrets,
-                service_name=appengine_service_name,
-                image_tag=image_name)
-        else:
-            self._source_generator.generate_new(
-                project_id=project_id,
-                project_name=django_project_name,
-                app_name=django_app_name,
-                project_dir=django_directory_path,
-                database_user=database_username,
-                database_password=database_password,
-                instance_name=database_instance_name,
-                database_name=database_name,
-                cloud_sql_proxy_port=cloud_sql_proxy_port,
-                cloud_storage_bucket_name=cloud_storage_bucket_name,
-                file_storage_bucket_name=file_storage_bucket_name,
-                cloudsql_secrets=cloud_sql_secrets,
-                django_secrets=django_secrets,
-                service_name=appengine_service_name,
-                image_tag=image_name)
-
-        with self._console_io.progressbar(
-                300, '[4/{}]: Database Set Up'.format(self._TOTAL_NEW_STEPS)):
-            self._database_workflow.create_and_setup_database(
-                project_dir=django_directory_path,
-                project_id=project_id,
-                instance_name=database_instance_name,
-                database_name=database_name,
-                database_password=database_password,
-                superuser_name=django_superuser_name,
-                superuser_email=django_superuser_email,
-                superuser_password=django_superuser_password,
-                database_user=database_username,
-                cloud_sql_proxy_path=cloud_sql_proxy_path,
-                region=region,
-                port=cloud_sql_proxy_port)
-
-        with self._console_io.progressbar(
-                180, '[5/{}]: Enable Services'.format(self._TOTAL_NEW_STEPS)):
-            if required_services is None:
-                required_services = (
-                    self._enable_service_workflow.load_services())
-            self._enable_service_workflow.enable_required_services(
-                project_id, required_services)
-
-        static_content_dir = settings.STATIC_ROOT
-        with self._console_io.progressbar(
-                300, '[6/{}]: Static Content Serve Set Up'.format(
-                    self._TOTAL_NEW_STEPS)):
-            self._static_content_workflow.serve_static_content(
-                project_id, cloud_storage_bucket_name, static_content_dir)
-
-        self._console_io.tell('[7/{}]: File Bucket Creation'.format(
-            self._TOTAL_NEW_STEPS))
-        self._file_bucket_workflow.create_file_bucket(project_id,
-                                                      file_storage_bucket_name)
-
-        self._console_io.tell(
-            '[8/{}]: Create Service Account Necessary For Deployment'.format(
-                self._TOTAL_NEW_STEPS))
-        secrets = self._generate_secrets(project_id, database_username,
-                                         database_password,
-                                         required_service_accounts)
 
-        if backend == 'gke':
-            with self._console_io.progressbar(
-                    1200, '[9/{}]: Deployment'.format(self._TOTAL_NEW_STEPS)):
-                app_url = self.deploy_workflow.deploy_gke_app(
+        # Most steps below only wait on long running operations of different
+        # GCP services. They are run as a graph so that steps without data
+        # dependencies on each other can overlap.
+        def create_project():
+            with self._step_progress(1, 'Create GCP Project'):
+                self._project_workflow.create_project(project_name, project_id,
+                                                      project_creation_mode)
+
+        def set_up_billing(project):
+            del project
+            with self._step_progress(2, 'Billing Set Up'):
+                if not self._billing_client.check_billing_enabled(project_id):
+                    self._billing_client.enable_project_billing(
+                        project_id, billing_account_name)
+
+        def generate_source():
+            with self._step_progress(3, 'Django Source Generation'):
+                if deploy_existing_django_project:
+                    self._source_generator.generate_from_existing(
+                        project_id=project_id,
+                        project_name=django_project_name,
+                        project_dir=django_directory_path,
+                        database_user=database_username,
+                        database_password=database_password,
+                        django_requirements_path=django_requirements_path,
+                        django_settings_path=django_settings_path,
+                        instance_name=database_instance_name,
+                        database_name=database_name,
+                        cloud_sql_proxy_port=cloud_sql_proxy_port,
+                        cloud_storage_bucket_name=cloud_storage_bucket_name,
+                        file_storage_bucket_name=file_storage_bucket_name,
+                        cloudsql_secrets=cloud_sql_secrets,
+                        django_secrets=django_secrets,
+                        service_name=appengine_service_name,
+                        image_tag=image_name,
+                        scaling_options=scaling_options,
+                        gunicorn_options=gunicorn_options,
+                        pgbouncer_options=pgbouncer_options,
+                        conn_max_age=conn_max_age)
+                else:
+                    self._source_generator.generate_new(
+                        project_id=project_id,
+                        project_name=django_project_name,
+                        app_name=django_app_name,
+                        project_dir=django_directory_path,
+                        database_user=database_username,
+                        database_password=database_password,
+                        instance_name=database_instance_name,
+                        database_name=database_name,
+                        cloud_sql_proxy_port=cloud_sql_proxy_port,
+                        cloud_storage_bucket_name=cloud_storage_bucket_name,
+                        file_storage_bucket_name=file_storage_bucket_name,
+                        cloudsql_secrets=cloud_sql_secrets,
+                        django_secrets=django_secrets,
+                        service_name=appengine_service_name,
+                        image_tag=image_name,
+                        scaling_options=scaling_options,
+                        gunicorn_options=gunicorn_options,
+                        pgbouncer_options=pgbouncer_options,
+                        conn_max_age=conn_max_age)
+
+        def set_up_database(billing, source):
+            del billing, source
+            with self._step_progress(4, 'Database Set Up'):
+                self._database_workflow.create_and_setup_database(
+                    project_dir=django_directory_path,
+                    project_id=project_id,
+                    instance_name=database_instance_name,
+                    database_name=database_name,
+                    database_password=database_password,
+                    superuser_name=django_superuser_name,
+                    superuser_email=django_superuser_email,
+                    superuser_password=django_superuser_password,
+                    database_user=database_username,
+                    cloud_sql_proxy_path=cloud_sql_proxy_path,
+                    region=region,
+                    port=cloud_sql_proxy_port)
+                return self._database_workflow.get_latest_migrations()
+
+        def enable_services(billing):
+            del billing
+            with self._step_progress(5, 'Enable Services'):
+                services = required_services
+                if services is None:
+                    services = self._enable_service_workflow.load_services()
+                self._enable_service_workflow.enable_required_services(
+                    project_id, services)
+
+        def serve_static_content(billing, source):
+            del billing, source
+            with self._step_progress(6, 'Static Content Serve Set Up'):
+                self._static_content_workflow.serve_static_content(
+                    project_id, cloud_storage_bucket_name,
+                    settings.STATIC_ROOT)
+
+        def create_file_bucket(billing):
+            del billing
+            with self._step_progress(7, 'File Bucket Creation'):
+                self._file_bucket_workflow.create_file_bucket(
+                    project_id, file_storage_bucket_name)
+
+        def generate_secrets(billing):
+            del billing
+            secrets_bucket_name = None
+            if backend == 'gae':
+                secrets_bucket_name = 'secrets-{}'.format(project_id)
+            with self._step_progress(
+                    8, 'Create Service Account Necessary For Deployment'):
+                return self._generate_secrets(project_id, database_username,
+                                              database_password,
+                                              required_service_accounts,
+                                              secrets_bucket_name)
+
+        def deploy(database, services, static_content, file_bucket, secrets):
+            del database, services, static_content, file_bucket
+            if backend == 'gke':
+                # Docker build and push progress is reported line by line, so
+                # no progress bar is shown for this step.
+                self._console_io.tell('[9/{}]: Deployment'.format(
+                    self._TOTAL_NEW_STEPS))
+                return self.deploy_workflow.deploy_gke_app(
                     project_id, cluster_name, django_directory_path,
                     django_project_name, image_name, secrets)
-        else:
-            self._upload_secrets_to_bucket(project_id, secrets)
 
-            # If the app engine service name is not equal to 'default, then this
-            # function is running in E2E test. In E2E test, a GAE application is
-            # already created.
+            # If the app engine service name is not equal to 'default, then
+            # this function is running in E2E test. In E2E test, a GAE
+            # application is already created.
             is_new = appengine_service_name == self.DEFAULT_GAE_SERVICE_NAME
             with self._console_io.progressbar(
                     300, '[9/{}]: Deployment'.format(self._TOTAL_NEW_STEPS)):
-                app_url = self.deploy_workflow.deploy_gae_app(
+                return self.deploy_workflow.deploy_gae_app(
                     project_id, django_directory_path, is_new=is_new)
+
+        graph = _step_graph.StepGraph()
+        graph.add_step('create_project', create_project, outputs=['project'])
+        graph.add_step('set_up_billing',
+                       set_up_billing,
+                       inputs=['project'],
+                       outputs=['billing'])
+        graph.add_step('generate_source', generate_source, outputs=['source'])
+        graph.add_step('set_up_database',
+                       set_up_database,
+                       inputs=['billing', 'source'],
+                       outputs=['database'])
+        graph.add_step('enable_services',
+                       enable_services,
+                       inputs=['billing'],
+                       outputs=['services'])
+        graph.add_step('serve_static_content',
+                       serve_static_content,
+                       inputs=['billing', 'source'],
+                       outputs=['static_content'])
+        graph.add_step('create_file_bucket',
+                       create_file_bucket,
+                       inputs=['billing'],
+                       outputs=['file_bucket'])
+        graph.add_step('generate_secrets',
+                       generate_secrets,
+                       inputs=['billing'],
+                       outputs=['secrets'])
+        graph.add_step('deploy',
+                       deploy,
+                       inputs=[
+                           'database', 'services', 'static_content',
+                           'file_bucket', 'secrets'
+                       ],
+                       outputs=['app_url'])
+        values = graph.run()
+        app_url = values['app_url']
+
         self._static_content_workflow.set_cors_policy(cloud_storage_bucket_name,
                                                       app_url)
         # Create configuration file to save information needed in "update"
@@ -315,6 +500,18 @@ class WorkflowManager(object):
             'database_instance_name': database_instance_name,
             'backend': backend,
             'django_settings_path': relative_settings_path,
+            # The update command skips the database migration while these
+            # are still the latest migrations.
+            'migrated_migrations': values['database'],
+            # The gunicorn configuration is generated again with these
+            # settings when the update command changes the CPU of the app.
+            'gunicorn_options': {
+                name: value
+                for name, value in vars(gunicorn_options or
+                                        source_generator.GunicornOptions()
+                                       ).items()
+                if value is not None
+            },
         }
         self._save_config(django_directory_path, attributes)
         self._console_io.tell('Your app is running at {}.'.format(app_url))
@@ -330,7 +527,9 @@ class WorkflowManager(object):
                        database_instance_name: Optional[str] = None,
                        cloud_sql_proxy_path: str = 'cloud_sql_proxy',
                        region: str = 'us-west1',
-                       open_browser: bool = True):
+                       open_browser: bool = True,
+                       scaling_options: Optional[
+                           source_generator.ScalingOptions] = None):
         """Workflow of updating a deployed Django app.
 
         Args:
@@ -344,10 +543,18 @@ class WorkflowManager(object):
             region: Where the service is hosted.
             open_browser: Whether we open the browser to show the deployed app
                 at the end.
+            scaling_options: Resources and autoscaling settings to change.
+                Settings left as None are not changed. On GKE the yaml file
+                and, when the CPU limit changes, the gunicorn configuration
+                are generated again. On App Engine app.yaml and the gunicorn
+                configuration are generated again when the instance class
+                changes.
 
         Raises:
             InvalidConfigError: When failed to read required information in the
                 configuration file.
+            ValueError: When some scaling options do not apply to the backend
+                of the app.
         """
 
         config_obj = config.Configuration(django_directory_path)
@@ -369,6 +576,16 @@ class WorkflowManager(object):
                 'information to update a Django project.'.format(
                     django_directory_path))
 
+        # Generated files are changed before anything is deployed, so options
+        # which do not apply to the backend fail early.
+        if scaling_options:
+            gunicorn_options = source_generator.GunicornOptions(
+                **(config_obj.get('gunicorn_options') or {}))
+            self._source_generator.update_scaling(django_directory_path,
+                                                  django_project_name, backend,
+                                                  scaling_options,
+                                                  gunicorn_options)
+
         # A bunch of variables necessary for deployment we hardcode for user.
         database_username = 'postgres'
         cloud_storage_bucket_name = project_id
@@ -385,16 +602,54 @@ class WorkflowManager(object):
                                                         cloud_sql_proxy_port)
 
         static_content_dir = settings.STATIC_ROOT
-        with self._console_io.progressbar(
-                120,
-                '[1/{}]: Database Migration'.format(self._TOTAL_UPDATE_STEPS)):
-            self._database_workflow.migrate_database(
-                project_dir=django_directory_path,
-                project_id=project_id,
-                instance_name=database_instance_name,
-                cloud_sql_proxy_path=cloud_sql_proxy_path,
-                region=region,
-                port=cloud_sql_proxy_port)
+        # Migration progress is streamed to the console line by line, so no
+        # progress bar is shown for this step.
+        self._console_io.tell('[1/{}]: Database Migration'.format(
+            self._TOTAL_UPDATE_STEPS))
+        # Whether migrations are pending can only be told by the database. But
+        # when the latest migrations are the ones applied by the last
+        # deployment, nothing is pending and cloud sql proxy is not started.
+        latest_migrations = self._database_workflow.get_latest_migrations()
+        if latest_migrations == config_obj.get('migrated_migrations'):
+            self._console_io.tell(
+                '    No pending migrations. Skipping database migration.')
+        else:
+            # All database operations of the update share this cloud sql
+            # proxy process.
+            with self._database_workflow.with_cloud_sql_proxy(
+                    project_id=project_id,
+                    instance_name=database_instance_name,
+                    cloud_sql_proxy_path=cloud_sql_proxy_path,
+                    region=region,
+                    port=cloud_sql_proxy_port):
+                pending_migrations = (
+                    self._database_workflow.get_pending_migrations())
+                if not pending_migrations:
+                    self._console_io.tell(
+                        '    No pending migrations. Skipping database '
+                        'migration.')
+                else:
+                    self._console_io.tell('    Applying {} migrations.'.format(
+                        len(pending_migrations)))
+                    start_time = time.time()
+                    migration_output = io.LineWriter(self._console_io,
+                                                     prefix='    ')
+                    try:
+                        self._database_workflow.migrate_database(
+                            project_dir=django_directory_path,
+                            stdout=migration_output)
+                    finally:
+                        migration_output.close()
+                    self._console_io.tell(
+                        '    Applied {} migrations in {:.1f} seconds.'.format(
+                            len(pending_migrations),
+                            time.time() - start_time))
+            # "makemigrations" might have added migration files.
+            self._save_config(
+                django_directory_path, {
+                    'migrated_migrations':
+                    self._database_workflow.get_latest_migrations()
+                })
 
         with self._console_io.progressbar(
                 120, '[2/{}]: Static Content Update'.format(
@@ -402,14 +657,16 @@ class WorkflowManager(object):
             self._static_content_workflow.update_static_content(
                 cloud_storage_bucket_name, static_content_dir)
 
-        with self._console_io.progressbar(
-                180,
-                '[3/{}]: Update Deployment'.format(self._TOTAL_UPDATE_STEPS)):
-            if backend == 'gke':
-                app_url = self.deploy_workflow.update_gke_app(
-                    project_id, cluster_name, django_directory_path,
-                    django_project_name, image_name)
-            else:
+        if backend == 'gke':
+            self._console_io.tell('[3/{}]: Update Deployment'.format(
+                self._TOTAL_UPDATE_STEPS))
+            app_url = self.deploy_workflow.update_gke_app(
+                project_id, cluster_name, django_directory_path,
+                django_project_name, image_name)
+        else:
+            with self._console_io.progressbar(
+                    180, '[3/{}]: Update Deployment'.format(
+                        self._TOTAL_UPDATE_STEPS)):
                 app_url = self.deploy_workflow.deploy_gae_app(
                     project_id, django_directory_path, is_new=False)
         self._console_io.tell('Your app is running at {}.'.format(app_url))
@@ -436,10 +693,12 @@ class WorkflowManager(object):
         config_obj.save()
 
     def _generate_secrets(
-            self, project_id: str, database_username: str,
+            self,
+            project_id: str,
+            database_username: str,
             database_password: str,
-            required_service_accounts: Dict[str, List[Dict[str, Any]]]
-    ) -> Dict[str, Any]:
+            required_service_accounts: Dict[str, List[Dict[str, Any]]],
+            secrets_bucket_name: Optional[str] = None) -> Dict[str, Any]:
         """Generate Kubernetes secrets required for deployment.
 
         Args:
@@ -447,6 +706,9 @@ class WorkflowManager(object):
             database_username: Name of the default database user.
             database_password: The password for the default database user.
             required_service_accounts: Service accounts needed by deployment.
+            secrets_bucket_name: The bucket to upload the secrets to, for
+                deployments on GAE. It is created if it does not exist. Each
+                secret is uploaded as soon as it is generated.
 
         Returns:
             All secrets necessary for deployment. For example:
@@ -469,15 +731,75 @@ class WorkflowManager(object):
             self._generate_base_secrets(database_username, database_password)
         }
 
-        for _, container_secrets in required_service_accounts.items():
-            for s_a in container_secrets:
-                key_data = (self._service_account_workflow.
-                            create_service_account_and_key(
-                                project_id, s_a['id'], s_a['name'],
-                                s_a['roles']))
-                secrets[s_a['id']] = {s_a['file_name']: key_data}
+        service_accounts = [
+            s_a for container_secrets in required_service_accounts.values()
+            for s_a in container_secrets
+        ]
+        file_names = {s_a['id']: s_a['file_name'] for s_a in service_accounts}
+        if not secrets_bucket_name:
+            keys = (self._service_account_workflow.
+                    create_service_accounts_and_keys(project_id,
+                                                     service_accounts))
+        else:
+            keys = self._generate_and_upload_keys(project_id, service_accounts,
+                                                  secrets['cloudsql'],
+                                                  secrets_bucket_name)
+        for service_account_id, key_data in keys.items():
+            secrets[service_account_id] = {
+                file_names[service_account_id]: key_data
+            }
         return secrets
 
+    def _generate_and_upload_keys(self, project_id: str,
+                                  service_accounts: List[Dict[str, Any]],
+                                  base_secrets: Dict[str, str],
+                                  secrets_bucket_name: str) -> Dict[str, str]:
+        """Create service account keys and upload the secrets to a bucket.
+
+        The bucket is created while the service accounts are, and the secret
+        of each service account is uploaded as soon as its key is created.
+
+        Args:
+            project_id: The unique id for your Google Cloud Platform project.
+            service_accounts: Service accounts needed by deployment.
+            base_secrets: The secrets not related to service accounts. They
+                are uploaded as the "cloudsql" secret.
+            secrets_bucket_name: The bucket to upload the secrets to.
+
+        Returns:
+            The key content of each service account, keyed by service account
+            id.
+        """
+        file_names = {s_a['id']: s_a['file_name'] for s_a in service_accounts}
+        with futures.ThreadPoolExecutor(
+                max_workers=self._MAX_CONCURRENT_SECRET_UPLOADS) as executor:
+            bucket_future = executor.submit(
+                self._static_content_workflow.create_secret_bucket, project_id,
+                secrets_bucket_name)
+
+            def upload_secret(secret_name: str, secret: Dict[str, str]):
+                bucket_future.result()
+                self._static_content_workflow.upload_secret(
+                    secrets_bucket_name, secret_name, json.dumps(secret))
+
+            upload_futures = [
+                executor.submit(upload_secret, 'cloudsql', base_secrets)
+            ]
+
+            def on_key_created(service_account_id: str, key_data: str):
+                secret = {file_names[service_account_id]: key_data}
+                upload_futures.append(
+                    executor.submit(upload_secret, service_account_id, secret))
+
+            keys = (self._service_account_workflow.
+                    create_service_accounts_and_keys(
+                        project_id,
+                        service_accounts,
+                        on_key_created=on_key_created))
+            for future in upload_futures:
+                future.result()
+        return keys
+
     @staticmethod
     def _generate_base_secrets(database_username: str,
                                database_password: str) -> Dict[str, str]:
@@ -508,38 +830,3 @@ class WorkflowManager(object):
         cloud_sql_secrets = [sa['id'] for sa in cloud_sql_secrets]
         django_secrets = [sa['id'] for sa in django_secrets]
         return cloud_sql_secrets, django_secrets
-
-    def _upload_secrets_to_bucket(self, project_id: str,
-                                  secrets: Dict[str, Any]):
-        """Creates files then uploads to GCP, finally removes the files.
-
-        Args:
-            project_id: Project to upload secret files to.
-            secrets: Contains the information regarding the credentials.
-        """
-        # Create static dir for secrets
-        secrets_dir = '~/.config/django_cloud/{}'.format(project_id)
-        secrets_dir = os.path.abspath(os.path.expanduser(secrets_dir))
-        self._create_files_for_secrets(secrets_dir, secrets)
-        # Upload secrets to gcs bucket
-        secrets_bucket_name = 'secrets-{}'.format(project_id)
-        self._static_content_workflow.serve_secret_content(
-            project_id, secrets_bucket_name, secrets_dir)
-        shutil.rmtree(secrets_dir)
-
-    @staticmethod
-    def _create_files_for_secrets(path: str, secrets: Dict[str, Any]):
-        """Create secret files for GAE that will be uploaded to GCS buckets.
-
-        Generates JSON files that will be used by the django on GAE.
-
-        Args:
-              path: Path to create secret files to be uploaded.
-              secrets: Contains the information regarding the credentials.
-        """
-        os.makedirs(path)
-        for secret, content in secrets.items():
-            filename = '{}.json'.format(secret)
-            file_path = os.path.join(path, filename)
-            with open(file_path, 'w') as file:
-                json.dump(content, file)
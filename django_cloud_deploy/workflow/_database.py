@@ -13,7 +13,7 @@
 # limitations under the License.
 """Workflow for managing database of the Django app."""
 
-from typing import Callable, Optional
+from typing import Callable, List, Optional, TextIO
 
 from django_cloud_deploy.cloudlib import database
 
@@ -71,23 +71,24 @@ class DatabaseWorkflow(object):
         self._database_client.set_database_password(project_id, instance_name,
                                                     database_user,
                                                     database_password)
-        self._database_client.migrate_database(project_dir, project_id,
-                                               instance_name,
-                                               cloud_sql_proxy_path, region,
-                                               port)
-        self._database_client.create_super_user(superuser_name, superuser_email,
-                                                superuser_password, project_id,
-                                                instance_name,
-                                                cloud_sql_proxy_path, region,
-                                                port)
+        # Share a single cloud sql proxy process between migration and
+        # superuser creation.
+        with self._database_client.with_cloud_sql_proxy(
+                project_id, instance_name, cloud_sql_proxy_path, region, port):
+            self._database_client.migrate_database(project_dir,
+                                                   project_id,
+                                                   instance_name,
+                                                   cloud_sql_proxy_path,
+                                                   region,
+                                                   port,
+                                                   in_process=True)
+            self._database_client.create_super_user(
+                superuser_name, superuser_email, superuser_password,
+                project_id, instance_name, cloud_sql_proxy_path, region, port)
 
     def migrate_database(self,
                          project_dir: str,
-                         project_id: str,
-                         instance_name: str,
-                         cloud_sql_proxy_path: str = 'cloud_sql_proxy',
-                         region: str = 'us-west1',
-                         port: Optional[int] = 5432):
+                         stdout: Optional[TextIO] = None):
         """Migrate to Cloud SQL database.
 
         This function is useful for updating a deployed Django app. It should be
@@ -96,20 +97,38 @@ class DatabaseWorkflow(object):
             2. Setup Django environment so that it is using configuration files
                  of the newly generated project.
             3. Created the Cloud SQL instance and database user.
+            4. Entered a with_cloud_sql_proxy context of the database.
 
         Args:
             project_dir: Absolute path of the Django project directory.
-            project_id: GCP project id.
-            instance_name: The Cloud SQL instance name in which you want to
-                    create the super user.
-            cloud_sql_proxy_path: The command to run your cloud sql proxy.
-            region: Where the Cloud SQL instance is in.
-            port: The port being forwarded by cloud sql proxy.
+            stdout: The file to stream the progress of the migration to. By
+                default the progress is not shown.
+        """
+        self._database_client.migrate_database(project_dir,
+                                               in_process=True,
+                                               stdout=stdout)
+
+    def get_pending_migrations(self) -> List[str]:
+        """Get the migrations migrate_database would apply.
+
+        Like migrate_database, this should be called inside a
+        with_cloud_sql_proxy context of the database.
+
+        Returns:
+            Names of the pending migrations, like "polls.0002_question_text".
+        """
+        return self._database_client.get_pending_migrations()
+
+    def get_latest_migrations(self) -> List[str]:
+        """Get the latest migrations of the Django project.
+
+        The database is not needed. When these are the migrations applied by
+        the last migration, there is nothing to migrate.
+
+        Returns:
+            Names of the latest migrations, like "polls.0002_question_text".
         """
-        self._database_client.migrate_database(project_dir, project_id,
-                                               instance_name,
-                                               cloud_sql_proxy_path, region,
-                                               port)
+        return self._database_client.get_latest_migrations()
 
     def with_cloud_sql_proxy(self,
                              project_id: str,
@@ -119,9 +138,11 @@ class DatabaseWorkflow(object):
                              port: int = 5432) -> Callable:
         """A wrapper for database_client.with_cloud_sql_proxy.
 
-        This method is useful in integration tests to check whether cloud
-        database has expected contents. For example, whether superuser is
-        created.
+        Database operations of this workflow called inside the returned
+        context reuse its cloud sql proxy process instead of starting their
+        own. This method is also useful in integration tests to check whether
+        cloud database has expected contents. For example, whether superuser
+        is created.
 
         Args:
             project_id: GCP project id.
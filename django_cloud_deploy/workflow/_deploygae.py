@@ -16,10 +16,11 @@
 import os
 import shutil
 import subprocess
-import time
 from typing import Any, Dict
 
 import backoff
+from django_cloud_deploy.cloudlib import client_factory
+from django_cloud_deploy.cloudlib import operation
 from googleapiclient import discovery
 import yaml
 
@@ -33,11 +34,13 @@ class DeployNewAppError(Exception):
 class DeploygaeWorkflow(object):
     """Workflow to deploy Django app on GAE."""
 
+    _CREATE_APP_EXPECTED_DURATION = 30
+    _CREATE_APP_DEADLINE = 600
+
     def __init__(self, credentials: credentials.Credentials):
-        self._appengine_service = discovery.build('appengine',
-                                                  'v1',
-                                                  credentials=credentials,
-                                                  cache_discovery=False)
+        self._appengine_service = client_factory.build_service(
+            'appengine', 'v1', credentials)
+        self._waiter = operation.OperationWaiter()
 
     def _create_app(self, project_id: str, region: str):
         """Synchronously create an App Engine application in the project."""
@@ -51,16 +54,22 @@ class DeploygaeWorkflow(object):
         # Pool the operation until it is complete or returns an error. See:
         # https://cloud.google.com/appengine/docs/admin-api/creating-an-application
         operation_id = create_response['name'].split('/')[-1]
-        while True:
-            operation = self._appengine_service.apps().operations().get(
+
+        def poll_app_creation():
+            response = self._appengine_service.apps().operations().get(
                 appsId=project_id, operationsId=operation_id).execute()
-            if 'error' in operation:
+            if 'error' in response:
                 raise DeployNewAppError(
                     'Failed to create App Engine app: {}'.format(
-                        operation['error']))
-            elif operation.get('done'):
-                break
-            time.sleep(2)
+                        response['error']))
+            elif response.get('done'):
+                return response
+            return None
+
+        self._waiter.wait(poll_app_creation,
+                          'Creation of App Engine app',
+                          deadline=self._CREATE_APP_DEADLINE,
+                          expected_duration=self._CREATE_APP_EXPECTED_DURATION)
 
     @staticmethod
     @backoff.on_predicate(
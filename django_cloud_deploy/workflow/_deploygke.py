@@ -14,11 +14,13 @@
 """Workflow for deploying a Django app to GKE."""
 
 import base64
+from concurrent import futures
 import os
-from typing import Dict
+import time
+from typing import Any, Callable, Dict, Optional
 import urllib.parse
 
-import backoff
+from django_cloud_deploy.cli import io
 from django_cloud_deploy.cloudlib import container
 import kubernetes
 import yaml
@@ -34,10 +36,32 @@ class DeployNewAppError(Exception):
 class DeploygkeWorkflow(object):
     """A class to control the workflow for deploying an Django app to GKE."""
 
-    def __init__(self, credentials: credentials.Credentials):
+    # Seconds to wait for the deployment and the load balancer of the service.
+    _DEPLOYMENT_READY_DEADLINE = 900
+    _SERVICE_READY_DEADLINE = 900
+
+    # Seconds before the server closes a watch request. Watches are resumed
+    # after that, this only bounds how long a single request can hang.
+    _WATCH_TIMEOUT = 60
+
+    def __init__(self,
+                 credentials: credentials.Credentials,
+                 console_io: Optional[io.IO] = None):
+        """Constructor of the class.
+
+        Args:
+            credentials: The credentials to access GCP.
+            console_io: Where to report the progress of docker image builds
+                and pushes. By default progress is not reported.
+        """
         self._container_client = container.ContainerClient.from_credentials(
             credentials)
         self._credentials = credentials
+        self._console_io = console_io
+
+    def _report_progress(self, message: str):
+        if self._console_io:
+            self._console_io.tell('    ' + message)
 
     def deploy_new_app_sync(self,
                             project_id: str,
@@ -47,7 +71,8 @@ class DeploygkeWorkflow(object):
                             image_name: str,
                             secrets: Dict[str, Dict[str, str]],
                             region: str = 'us-west1',
-                            zone: str = 'us-west1-a') -> str:
+                            zone: str = 'us-west1-a',
+                            pipelined: bool = True) -> str:
         """Deploy a Django app to gke.
 
         Args:
@@ -60,6 +85,9 @@ class DeploygkeWorkflow(object):
             region: Where do you want to host the cluster.
             zone: Name of the Google Compute Engine zone in which the cluster
                 resides.
+            pipelined: Whether to create the cluster in the background while
+                the docker image is built and pushed. Both take minutes, so
+                this saves most of the time of the shorter one.
 
         Raises:
             DeployNewAppError: If unable to deploy the app.
@@ -68,17 +96,39 @@ class DeploygkeWorkflow(object):
             The url of the deployed Django app.
         """
 
-        self._container_client.create_cluster_sync(project_id, cluster_name,
-                                                   region, zone)
-        self._container_client.build_docker_image(image_name, app_directory)
-        self._container_client.push_docker_image(image_name)
+        if pipelined:
+            with futures.ThreadPoolExecutor(max_workers=1) as executor:
+                cluster_future = executor.submit(
+                    self._container_client.create_cluster_sync, project_id,
+                    cluster_name, region, zone)
+                image = self._container_client.build_and_push_docker_image(
+                    image_name, app_directory, self._report_progress)
+                # The cluster must be running before we can access it.
+                if not cluster_future.done():
+                    self._report_progress(
+                        'Waiting for cluster "{}" to be ready.'.format(
+                            cluster_name))
+                cluster_future.result()
+        else:
+            self._container_client.create_cluster_sync(project_id,
+                                                       cluster_name, region,
+                                                       zone)
+            image = self._container_client.build_and_push_docker_image(
+                image_name, app_directory, self._report_progress)
+        deployment_data = None
+        service_data = None
         yaml_file_path = os.path.join(app_directory, app_name + '.yaml')
         with open(yaml_file_path) as yaml_file:
-            for data in yaml.load_all(yaml_file, Loader=yaml.FullLoader):
-                if data['kind'] == 'Deployment':
-                    deployment_data = data
-                elif data['kind'] == 'Service':
-                    service_data = data
+            manifests = [
+                data for data in yaml.load_all(yaml_file,
+                                               Loader=yaml.FullLoader)
+                if data
+            ]
+        for data in manifests:
+            if data['kind'] == 'Deployment':
+                deployment_data = data
+            elif data['kind'] == 'Service':
+                service_data = data
 
         # This happens if the generated Django app does not have a valid yaml
         # file.
@@ -86,6 +136,7 @@ class DeploygkeWorkflow(object):
             raise DeployNewAppError(
                 ('Invalid kubernetes configuration file for Django app '
                  '"{}" in "{}"').format(app_name, app_directory))
+        self._set_container_image(deployment_data, image_name, image)
         kube_config = self._container_client.create_kubernetes_configuration(
             self._credentials, project_id, cluster_name, zone)
         for secret_name, secret in secrets.items():
@@ -96,16 +147,20 @@ class DeploygkeWorkflow(object):
                 # Kubernetes api only accepts base64 encoded strings.
                 # See https://github.com/kubernetes-client/python/blob/master/kubernetes/docs/V1Secret.md  # noqa: E501
                 secret[key] = base64.standard_b64encode(value).decode('utf-8')
-            secret_data = kubernetes.client.V1Secret(
-                api_version='v1',
-                data=secret,
-                kind='Secret',
-                metadata={'name': secret_name})
-            self._container_client.create_secret(secret_data, kube_config)
-        self._container_client.create_deployment(deployment_data, kube_config)
+            manifests.append({
+                'apiVersion': 'v1',
+                'kind': 'Secret',
+                'metadata': {
+                    'name': secret_name
+                },
+                'data': secret
+            })
+
+        # Objects which already exist with the same definition are left
+        # untouched, so deploying again is cheap and does not fail.
+        self._container_client.apply_manifests(manifests, kube_config)
         self._wait_for_deployment_ready(kube_config, app_name)
-        self._container_client.create_service(service_data, kube_config)
-        ingress_url = self._get_ingress_url(kube_config)
+        ingress_url = self._get_ingress_url(kube_config, app_name)
         return ingress_url
 
     def update_app_sync(self,
@@ -132,13 +187,19 @@ class DeploygkeWorkflow(object):
         Returns:
             The url of the deployed Django app.
         """
-        self._container_client.build_docker_image(image_name, app_directory)
-        self._container_client.push_docker_image(image_name)
+        image = self._container_client.build_and_push_docker_image(
+            image_name, app_directory, self._report_progress)
         yaml_file_path = os.path.join(app_directory, app_name + '.yaml')
         with open(yaml_file_path) as yaml_file:
-            for data in yaml.load_all(yaml_file, Loader=yaml.FullLoader):
-                if data['kind'] == 'Deployment':
-                    deployment_data = data
+            manifests = [
+                data for data in yaml.load_all(yaml_file,
+                                               Loader=yaml.FullLoader)
+                if data
+            ]
+        deployment_data = None
+        for data in manifests:
+            if data['kind'] == 'Deployment':
+                deployment_data = data
 
         # This happens if the generated Django app does not have a valid yaml
         # file.
@@ -146,42 +207,70 @@ class DeploygkeWorkflow(object):
             raise DeployNewAppError(
                 ('Invalid kubernetes configuration file for Django app '
                  '"{}" in "{}"').format(app_name, app_directory))
+        self._set_container_image(deployment_data, image_name, image)
         kube_config = self._container_client.create_kubernetes_configuration(
             self._credentials, project_id, cluster_name, zone)
-        self._container_client.update_deployment(deployment_data, kube_config)
-        self._wait_for_deployment_ready(kube_config, app_name)
-        ingress_url = self._get_ingress_url(kube_config)
+
+        # Image tags are content addressed, so the deployment only changes
+        # when the source code or its resources changed. Other objects of the
+        # yaml file, like the autoscaler, are updated as well.
+        applied = self._container_client.apply_manifests(
+            manifests, kube_config)
+        deployment_name = deployment_data['metadata']['name']
+        if 'Deployment/' + deployment_name in applied:
+            self._container_client.wait_for_rollout(deployment_name,
+                                                    kube_config)
+        ingress_url = self._get_ingress_url(kube_config, app_name)
         return ingress_url
 
-    def _get_ingress_url(self,
-                         kube_config: kubernetes.client.Configuration) -> str:
+    @staticmethod
+    def _set_container_image(deployment_data: Dict[str, Any], image_name: str,
+                             image: str):
+        """Make the containers of a deployment run the given image.
+
+        Args:
+            deployment_data: Definition of the deployment loaded from the
+                generated yaml file.
+            image_name: Docker image name without tag used in the yaml file.
+            image: The tagged image to run instead.
+        """
+        containers = deployment_data['spec']['template']['spec']['containers']
+        for container_data in containers:
+            container_image = container_data['image']
+            if (container_image == image_name or
+                    container_image.startswith(image_name + ':')):
+                container_data['image'] = image
+
+    def _get_ingress_url(self, kube_config: kubernetes.client.Configuration,
+                         app_name: str) -> str:
         """Returns the URL that can be used to access the app.
 
         Args:
             kube_config: A kubernetes configuration which has access to the
                 given cluster.
+            app_name: Name of the Django app.
+
+        Raises:
+            DeployNewAppError: If the service does not get an external
+                address before the deadline.
 
         Returns:
             Url of the deployed Django app.
         """
 
-        api_client = kubernetes.client.ApiClient(kube_config)
-        api = kubernetes.client.CoreV1Api(api_client)
-        return self._try_get_ingress_url(api)
-
-    @backoff.on_predicate(backoff.constant, interval=0.5, logger=None)
-    def _try_get_ingress_url(self, api: kubernetes.client.CoreV1Api) -> str:
-        """Return Ingress url when service is ready."""
-        items = api.list_service_for_all_namespaces().items
-        for item in items:
-            ingress = item.status.load_balancer.ingress
+        def get_ingress_url(service):
+            ingress = service.status.load_balancer.ingress
             if ingress:
                 return 'http://{}/'.format(ingress[0].hostname or ingress[0].ip)
+            return None
 
-        # @backoff.on_predicate(backoff.constant) will keep running this method
-        # until it gets a non-falsey result. Return value of '' means that the
-        # service is not ready yet.
-        return ''
+        api_client = self._container_client.get_api_client(kube_config)
+        api = kubernetes.client.CoreV1Api(api_client)
+        return self._wait_for_object(api.list_namespaced_service,
+                                     '='.join(['app', app_name]),
+                                     get_ingress_url,
+                                     'External address of service',
+                                     self._SERVICE_READY_DEADLINE)
 
     def _wait_for_deployment_ready(self,
                                    kube_config: kubernetes.client.Configuration,
@@ -192,25 +281,94 @@ class DeploygkeWorkflow(object):
             kube_config: A kubernetes configuration which has access to the
                 given cluster.
             app_name: Name of the Django app.
+
+        Raises:
+            DeployNewAppError: If no replica of the deployment is ready before
+                the deadline.
+        """
+
+        api_client = self._container_client.get_api_client(kube_config)
+        api = kubernetes.client.AppsV1Api(api_client)
+        self._wait_for_object(
+            api.list_namespaced_deployment, '='.join(['app', app_name]),
+            lambda deployment: deployment.status.ready_replicas,
+            'Ready replicas of deployment', self._DEPLOYMENT_READY_DEADLINE)
+
+    def _wait_for_object(self,
+                         list_func: Callable[..., Any],
+                         label_selector: str,
+                         get_result: Callable[[Any], Any],
+                         description: str,
+                         deadline: float,
+                         namespace: str = 'default') -> Any:
+        """Watch Kubernetes objects until one of them reaches a state.
+
+        The objects are listed once, then changes are received through a
+        watch stream starting at the resourceVersion of the list. The watch
+        is resumed from the last seen resourceVersion when the server closes
+        it, and the objects are listed again if that version is too old.
+
+        Args:
+            list_func: The API function listing the objects in a namespace,
+                like CoreV1Api.list_namespaced_service.
+            label_selector: Only watch objects with these labels.
+            get_result: A function returning a non-falsey value when the
+                object passed to it reached the expected state.
+            description: What is waited for. Used in error messages.
+            deadline: Seconds to wait before giving up.
+            namespace: Namespace of the objects.
+
+        Raises:
+            DeployNewAppError: If no object reaches the state before the
+                deadline.
+
+        Returns:
+            The first non-falsey value returned by get_result.
         """
+        start_time = time.monotonic()
+        resource_version = None
+        last_seen = None
+        watch = kubernetes.watch.Watch()
+        try:
+            while True:
+                remaining = deadline - (time.monotonic() - start_time)
+                if remaining <= 0:
+                    raise DeployNewAppError(
+                        ('{} with labels "{}" not ready after {} seconds. Last '
+                         'seen state: {}').format(description, label_selector,
+                                                  deadline, last_seen))
+                if resource_version is None:
+                    object_list = list_func(namespace=namespace,
+                                            label_selector=label_selector)
+                    for obj in object_list.items:
+                        last_seen = obj.status
+                        result = get_result(obj)
+                        if result:
+                            return result
+                    resource_version = object_list.metadata.resource_version
 
-        api_client = kubernetes.client.ApiClient(kube_config)
-        api = kubernetes.client.ExtensionsV1beta1Api(api_client)
-        label_selector = '='.join(['app', app_name])
-        self._try_get_ready_replicas(api, label_selector)
-
-    @backoff.on_predicate(backoff.constant, interval=0.5, logger=None)
-    def _try_get_ready_replicas(self,
-                                api: kubernetes.client.ExtensionsV1beta1Api,
-                                label_selector: str) -> int:
-        """Return ready replicas when deployment is ready."""
-        items = api.list_deployment_for_all_namespaces(
-            label_selector=label_selector).items
-        for item in items:
-            if item.status.ready_replicas:
-                return item.status.ready_replicas
-
-        # @backoff.on_predicate(backoff.constant) will keep running this method
-        # until it gets a non-falsey result. Return value of 0 means that the
-        # deployment is not ready yet.
-        return 0
+                for event in watch.stream(
+                        list_func,
+                        namespace=namespace,
+                        label_selector=label_selector,
+                        resource_version=resource_version,
+                        timeout_seconds=int(
+                            min(remaining, self._WATCH_TIMEOUT)) + 1):
+                    if event['type'] == 'ERROR':
+                        status = event['raw_object']
+                        if status.get('code') == 410:
+                            # The resource version is too old. List again.
+                            resource_version = None
+                            break
+                        raise DeployNewAppError(
+                            'Failed to watch {}: {}'.format(
+                                description.lower(), status.get('message')))
+                    obj = event['object']
+                    resource_version = obj.metadata.resource_version
+                    if event['type'] in ('ADDED', 'MODIFIED'):
+                        last_seen = obj.status
+                        result = get_result(obj)
+                        if result:
+                            return result
+        finally:
+            watch.stop()
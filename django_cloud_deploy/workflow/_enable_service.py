@@ -45,12 +45,22 @@ class EnableServiceWorkflow(object):
                             "name": "compute.googleapis.com"
                         },
                     ]
+                If not given, the services listed in data/services.json are
+                enabled.
         """
 
-        services = services or EnableServiceWorkflow.load_services()
-        for service in services:
-            self._enable_service_client.enable_service_sync(
-                project_id, service['name'])
+        if services is None:
+            services = EnableServiceWorkflow.load_services()
+        enabled_services = self._enable_service_client.list_enabled_services(
+            project_id)
+        services_to_enable = [
+            service['name']
+            for service in services
+            if service['name'] not in enabled_services
+        ]
+        if services_to_enable:
+            self._enable_service_client.enable_services_sync(
+                project_id, services_to_enable)
 
     @staticmethod
     def load_services() -> List[Dict[str, str]]:
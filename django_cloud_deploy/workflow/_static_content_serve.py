@@ -24,6 +24,9 @@ class StaticContentServeWorkflow(object):
     # The directory in Google Cloud Storage bucket to save static content
     GCS_STATIC_FILE_DIR = 'static'
 
+    # The directory in Google Cloud Storage bucket to save secrets
+    GCS_SECRET_FILE_DIR = 'secrets'
+
     def __init__(self, credentials: credentials.Credentials):
         self._storage_client = (
             storage.StorageClient.from_credentials(credentials))
@@ -50,31 +53,51 @@ class StaticContentServeWorkflow(object):
     def set_cors_policy(self, bucket_name: str, origin: str):
         self._storage_client.set_cors_policy(bucket_name, origin)
 
-    def serve_secret_content(self, project_id: str, bucket_name: str,
-                             secrec_content_dir: str):
-        """Do all the work for serving secret content of the provided project.
-
-        The secret content is served with a Google Cloud Storage Bucket.
+    def create_secret_bucket(self, project_id: str, bucket_name: str):
+        """Create the bucket serving secret content, if it does not exist.
 
         Args:
             project_id: Id of GCP project.
-            bucket_name: Name of the bucket to create and serve secret content.
-            secrec_content_dir: Absolute path of the directory for secret
-                content.
+            bucket_name: Name of the bucket to create.
         """
-
         self._storage_client.create_bucket(project_id, bucket_name)
-        self._storage_client.upload_content(bucket_name, secrec_content_dir,
-                                            'secrets')
 
-    def update_static_content(self, bucket_name: str, static_content_dir: str):
+    def upload_secret(self, bucket_name: str, secret_name: str, content: str):
+        """Upload a single secret to the bucket serving secret content.
+
+        The secret is read by the app from "secrets/<secret_name>.json".
+
+        Args:
+            bucket_name: Name of the bucket serving secret content. It should
+                already exist.
+            secret_name: Name of the secret, like "cloudsql".
+            content: The JSON content of the secret.
+        """
+        object_name = '/'.join(
+            [self.GCS_SECRET_FILE_DIR, '{}.json'.format(secret_name)])
+        self._storage_client.upload_string(bucket_name,
+                                           object_name,
+                                           content,
+                                           mimetype='application/json')
+
+    def update_static_content(self,
+                              bucket_name: str,
+                              static_content_dir: str,
+                              delete_stale: bool = False):
         """Update GCS bucket after user modified the Django app.
 
+        Only static files which are new or changed since the last deployment
+        are uploaded.
+
         Args:
             bucket_name: Name of the bucket to create and serve static content.
             static_content_dir: Absolute path of the directory for static
                 content.
+            delete_stale: Whether to delete static files in the bucket which
+                do not exist in the Django app anymore.
         """
         self._storage_client.collect_static_content()
-        self._storage_client.upload_content(bucket_name, static_content_dir,
-                                            self.GCS_STATIC_FILE_DIR)
+        self._storage_client.sync_content(bucket_name,
+                                          static_content_dir,
+                                          self.GCS_STATIC_FILE_DIR,
+                                          delete_stale=delete_stale)
@@ -0,0 +1,192 @@
+# Copyright 2019 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Run the steps of a workflow concurrently based on their dependencies.
+
+Each step declares the values it needs (inputs) and the values it produces
+(outputs). A step is started on a thread pool as soon as all of its inputs are
+available, so steps without a data dependency on each other run concurrently
+and the total run time approaches the longest chain of dependent steps.
+"""
+
+from concurrent import futures
+from typing import Any, Callable, Dict, Iterable, Optional
+
+
+class StepGraphError(Exception):
+    """Raised when the steps of a graph can not be scheduled."""
+
+
+class Step(object):
+    """A unit of work in a StepGraph."""
+
+    def __init__(self,
+                 name: str,
+                 func: Callable[..., Any],
+                 inputs: Iterable[str] = (),
+                 outputs: Iterable[str] = ()):
+        """Constructor of the class.
+
+        Args:
+            name: Name of the step. Used in error messages.
+            func: The function doing the work of the step. It is called with
+                one keyword argument per input. If the step has a single
+                output, the return value is bound to that output. If it has
+                several outputs, the function should return a tuple with one
+                value per output, in the order the outputs are declared.
+            inputs: Names of the values the step needs before it can start.
+            outputs: Names of the values produced by the step. An output can
+                also be used only as a marker that the step has finished, in
+                which case the function can return None.
+        """
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+
+    def run(self, values: Dict[str, Any]) -> Dict[str, Any]:
+        """Run the step and return the values it produced."""
+        kwargs = {name: values[name] for name in self.inputs}
+        result = self.func(**kwargs)
+        if not self.outputs:
+            return {}
+        if len(self.outputs) == 1:
+            return {self.outputs[0]: result}
+        if not isinstance(result, tuple) or len(result) != len(self.outputs):
+            raise StepGraphError(
+                'Step "{}" should return {} values, got: {!r}'.format(
+                    self.name, len(self.outputs), result))
+        return dict(zip(self.outputs, result))
+
+
+class StepGraph(object):
+    """A set of steps which are run according to their data dependencies.
+
+    Usage:
+        graph = StepGraph()
+        graph.add_step('create_bucket', create_bucket,
+                       inputs=['project_id'], outputs=['bucket'])
+        graph.add_step('upload', upload,
+                       inputs=['bucket'], outputs=['uploaded'])
+        values = graph.run({'project_id': 'my-project'})
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        """Constructor of the class.
+
+        Args:
+            max_workers: The maximum number of steps running at the same time.
+                By default every step which is ready is started.
+        """
+        self._max_workers = max_workers
+        self._steps = []
+
+    def add_step(self,
+                 name: str,
+                 func: Callable[..., Any],
+                 inputs: Iterable[str] = (),
+                 outputs: Iterable[str] = ()):
+        """Add a step to the graph.
+
+        See Step for the meaning of the arguments.
+        """
+        self._steps.append(Step(name, func, inputs, outputs))
+
+    def _validate(self, initial_values: Dict[str, Any]):
+        """Make sure every input can be produced exactly once.
+
+        Args:
+            initial_values: Values available before any step runs.
+
+        Raises:
+            StepGraphError: If an output is produced more than once, an input
+                is never produced, or the steps depend on each other in a
+                cycle.
+        """
+        producers = {name: None for name in initial_values}
+        for step in self._steps:
+            for output in step.outputs:
+                if output in producers:
+                    raise StepGraphError(
+                        'Value "{}" is produced more than once.'.format(output))
+                producers[output] = step
+
+        for step in self._steps:
+            for name in step.inputs:
+                if name not in producers:
+                    raise StepGraphError(
+                        'Input "{}" of step "{}" is never produced.'.format(
+                            name, step.name))
+
+        # Simulate the run without executing anything to detect cycles.
+        available = set(initial_values)
+        remaining = list(self._steps)
+        while remaining:
+            ready = [
+                step for step in remaining
+                if all(name in available for name in step.inputs)
+            ]
+            if not ready:
+                raise StepGraphError(
+                    'Steps {} depend on each other in a cycle.'.format(
+                        ', '.join(step.name for step in remaining)))
+            for step in ready:
+                available.update(step.outputs)
+                remaining.remove(step)
+
+    def run(self, initial_values: Optional[Dict[str, Any]] = None
+           ) -> Dict[str, Any]:
+        """Run all steps, starting each one as soon as its inputs are ready.
+
+        If a step raises an exception, no more steps are started. The steps
+        already running are allowed to finish and then the exception is
+        re-raised unchanged.
+
+        Args:
+            initial_values: Values available before any step runs.
+
+        Returns:
+            All values, including the initial values and the outputs of every
+            step.
+
+        Raises:
+            StepGraphError: If the steps can not be scheduled.
+        """
+        values = dict(initial_values or {})
+        self._validate(values)
+
+        max_workers = self._max_workers or max(len(self._steps), 1)
+        remaining = list(self._steps)
+        running = {}
+        error = None
+        with futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while remaining or running:
+                if error is None:
+                    for step in list(remaining):
+                        if all(name in values for name in step.inputs):
+                            remaining.remove(step)
+                            future = executor.submit(step.run, dict(values))
+                            running[future] = step
+                done, _ = futures.wait(running,
+                                       return_when=futures.FIRST_COMPLETED)
+                for future in done:
+                    del running[future]
+                    try:
+                        values.update(future.result())
+                    except Exception as e:
+                        error = error or e
+                if error is not None and not running:
+                    break
+        if error is not None:
+            raise error
+        return values
@@ -13,8 +13,10 @@
 # limitations under the License.
 """Workflow to to fork between GKE and GAE."""
 
-from typing import Dict
+import threading
+from typing import Dict, Optional
 
+from django_cloud_deploy.cli import io
 from django_cloud_deploy.workflow import _deploygae
 from django_cloud_deploy.workflow import _deploygke
 
@@ -22,8 +24,30 @@ from django_cloud_deploy.workflow import _deploygke
 class DeployWorkflow(object):
     """Workflow to to fork between GKE and GAE."""
 
-    def __init__(self, credentials):
+    def __init__(self, credentials, console_io: Optional[io.IO] = None):
         self.credentials = credentials
+        self._console_io = console_io
+
+        # The workflows of each backend are created on first use and reused.
+        # So deploying on GAE never connects to the docker daemon or builds
+        # the client of the container API.
+        self._gae_workflow = None
+        self._gke_workflow = None
+        self._lock = threading.Lock()
+
+    def _get_gae_workflow(self) -> _deploygae.DeploygaeWorkflow:
+        with self._lock:
+            if self._gae_workflow is None:
+                self._gae_workflow = _deploygae.DeploygaeWorkflow(
+                    self.credentials)
+            return self._gae_workflow
+
+    def _get_gke_workflow(self) -> _deploygke.DeploygkeWorkflow:
+        with self._lock:
+            if self._gke_workflow is None:
+                self._gke_workflow = _deploygke.DeploygkeWorkflow(
+                    self.credentials, self._console_io)
+            return self._gke_workflow
 
     def deploy_gae_app(self,
                        project_id: str,
@@ -45,7 +69,7 @@ class DeployWorkflow(object):
         Returns:
             The url of the deployed Django app.
         """
-        workflow = _deploygae.DeploygaeWorkflow(self.credentials)
+        workflow = self._get_gae_workflow()
         return workflow.deploy_gae_app(project_id, django_directory_path,
                                        region, is_new)
 
@@ -77,7 +101,7 @@ class DeployWorkflow(object):
         Returns:
             The url of the deployed Django app.
         """
-        workflow = _deploygke.DeploygkeWorkflow(self.credentials)
+        workflow = self._get_gke_workflow()
         return workflow.deploy_new_app_sync(project_id, cluster_name,
                                             app_directory, app_name, image_name,
                                             secrets, region, zone)
@@ -106,6 +130,6 @@ class DeployWorkflow(object):
         Returns:
             The url of the deployed Django app.
         """
-        workflow = _deploygke.DeploygkeWorkflow(self.credentials)
+        workflow = self._get_gke_workflow()
         return workflow.update_app_sync(project_id, cluster_name, app_directory,
                                         app_name, image_name, zone)